@@ -0,0 +1,151 @@
+import numpy as np
+
+ALERT_TYPES = ('price_high', 'price_low', 'price_change', 'volume_spike', 'volatility')
+
+# 各警報類型比較的市場數值
+RULE_METRICS = {
+    'price_high': 'price',
+    'price_low': 'price',
+    'price_change': 'change_percent',
+    'volume_spike': 'volume_ratio',
+    'volatility': 'volatility'
+}
+
+def rule_hits(alert_type, values, thresholds):
+    """警報規則：回傳 values 是否達到 thresholds 的布林陣列（NaN 一律不觸發）"""
+    if alert_type == 'price_low':
+        return values <= thresholds
+    if alert_type == 'price_change':
+        return np.abs(values) >= thresholds
+    return values >= thresholds
+
+class AlertIndex:
+    """以欄位式 NumPy 陣列儲存的警報索引
+
+    警報依 alert_type 分組，每組保存 symbol 索引、user_id 與門檻三個陣列，
+    一輪檢查只需對整組做幾次陣列運算，不必逐筆走 if/elif。
+    """
+
+    def __init__(self, alerts):
+        """alerts: [(user_id, symbol, alert_type, threshold)]"""
+        alerts = list(alerts)
+        self.size = len(alerts)
+        self.groups = {}
+
+        if not alerts:
+            self.symbols = []
+            self.symbol_index = {}
+            self._symbol_array = np.array([], dtype=object)
+            return
+
+        user_ids, symbols, alert_types, thresholds = zip(*alerts)
+
+        # 以字典編碼股票與警報類型，比 np.unique 排序字串快
+        self.symbol_index = {}
+        symbol_idx = np.fromiter(
+            (self.symbol_index.setdefault(symbol, len(self.symbol_index)) for symbol in symbols),
+            dtype=np.int32, count=self.size
+        )
+        type_codes = {alert_type: code for code, alert_type in enumerate(ALERT_TYPES)}
+        type_idx = np.fromiter((type_codes.get(t, -1) for t in alert_types), dtype=np.int8, count=self.size)
+        user_ids = np.array(user_ids, dtype=np.int64)
+        thresholds = np.array(thresholds, dtype=np.float64)
+
+        self.symbols = list(self.symbol_index)
+        self._symbol_array = np.array(self.symbols, dtype=object)
+
+        for alert_type, code in type_codes.items():
+            mask = type_idx == code
+            if mask.any():
+                self.groups[alert_type] = (symbol_idx[mask], user_ids[mask], thresholds[mask])
+
+    @classmethod
+    def from_db(cls, db, select=None):
+        """由資料庫中啟用的警報建立索引，select 可過濾警報列（分片用）"""
+        alerts = db.get_active_alerts()
+        return cls(select(alerts) if select else alerts)
+
+    def __len__(self):
+        return self.size
+
+    def new_snapshot(self):
+        """建立與索引對齊、全部為 NaN 的市場快照"""
+        return MarketSnapshot(len(self.symbols))
+
+    def evaluate(self, snapshot):
+        """評估所有警報，回傳觸發的 (alert_type, symbol, user_id, threshold, value) 列表
+
+        快照中為 NaN 的股票（本輪未輪詢或資料不足）不會觸發。
+        """
+        triggered = []
+
+        for alert_type, (symbol_idx, user_ids, thresholds) in self.groups.items():
+            values = getattr(snapshot, RULE_METRICS[alert_type])[symbol_idx]
+            hit_idx = np.flatnonzero(rule_hits(alert_type, values, thresholds))
+            if hit_idx.size:
+                triggered.extend(zip(
+                    [alert_type] * hit_idx.size,
+                    self._symbol_array[symbol_idx[hit_idx]].tolist(),
+                    user_ids[hit_idx].tolist(),
+                    thresholds[hit_idx].tolist(),
+                    values[hit_idx].tolist()
+                ))
+
+        return triggered
+
+    def distance_to_trigger(self, snapshot):
+        """每檔股票距離最近一個價格或變動門檻的百分比，無法估算時為 inf"""
+        distance = np.full(len(self.symbols), np.inf)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for alert_type in ('price_high', 'price_low'):
+                if alert_type in self.groups:
+                    symbol_idx, _, thresholds = self.groups[alert_type]
+                    price = snapshot.price[symbol_idx]
+                    d = np.maximum(0.0, np.abs(thresholds - price) / price * 100)
+                    np.minimum.at(distance, symbol_idx, np.where(np.isnan(d), np.inf, d))
+
+            if 'price_change' in self.groups:
+                symbol_idx, _, thresholds = self.groups['price_change']
+                d = np.maximum(0.0, thresholds - np.abs(snapshot.change_percent[symbol_idx]))
+                np.minimum.at(distance, symbol_idx, np.where(np.isnan(d), np.inf, d))
+
+        return distance
+
+class MarketSnapshot:
+    """與 AlertIndex.symbols 對齊的當前市場數值"""
+
+    def __init__(self, size):
+        self.price = np.full(size, np.nan)
+        self.change_percent = np.full(size, np.nan)
+        self.volume_ratio = np.full(size, np.nan)
+        self.volatility = np.full(size, np.nan)
+
+    def set(self, i, price, change_percent=None, volume_ratio=None, volatility=None):
+        """填入一檔股票的數值，None 代表資料不足"""
+        self.price[i] = price
+        self.change_percent[i] = np.nan if change_percent is None else change_percent
+        self.volume_ratio[i] = np.nan if volume_ratio is None else volume_ratio
+        self.volatility[i] = np.nan if volatility is None else volatility
+
+class AlertIndexCache:
+    """只在警報變動時重建的 AlertIndex
+
+    每輪只讀取 alerts 表的變動計數（Database.get_alerts_version），與上次建立
+    索引時相同就沿用，不必每輪取出所有警報重新編碼。
+    """
+
+    def __init__(self, select=None):
+        self.select = select
+        self.rebuilds = 0
+        self._index = None
+        self._version = None
+
+    def get(self, db):
+        # 先讀版本再取警報：期間若有變動，下一輪版本不同會再重建
+        version = db.get_alerts_version()
+        if self._index is None or version != self._version:
+            self._index = AlertIndex.from_db(db, self.select)
+            self._version = version
+            self.rebuilds += 1
+        return self._index
@@ -0,0 +1,90 @@
+import logging
+import time
+import numpy as np
+from alert_polling import AdaptivePollingPlanner
+from rolling_window import SymbolWindows
+
+class AlertEvaluator:
+    """一輪警報評估：輪詢到期股票的報價、更新滑動視窗、向量化評估並排定下次輪詢
+
+    AlertSystem 在程序內使用一個實例；分片模式下每個工作程序各自持有一個，
+    只負責自己分片的股票。
+    """
+
+    def __init__(self, stock_manager, latency=None):
+        self.stock_manager = stock_manager
+        self.latency = latency
+        self.polling_planner = AdaptivePollingPlanner()
+        self.price_windows = SymbolWindows()
+        self.logger = logging.getLogger(__name__)
+
+    def hydrate(self, db, symbols):
+        """從 price_history 還原滑動視窗"""
+        self.price_windows.hydrate(db, symbols)
+
+    def _record(self, stage, seconds):
+        if self.latency is not None:
+            self.latency.record(stage, seconds)
+
+    def run_cycle(self, index):
+        """評估到期股票的警報，回傳 (triggered, quotes)
+
+        triggered: AlertIndex.evaluate 的結果
+        quotes: 本輪取得的報價 {symbol: quote}
+        """
+        snapshot = index.new_snapshot()
+
+        # 只輪詢到期的股票，其餘股票在快照中保持 NaN 不會觸發
+        quotes = {}
+        for symbol in self.polling_planner.due_symbols(index.symbols):
+            quote = self.update_snapshot(index, snapshot, symbol)
+            if quote:
+                quotes[symbol] = quote
+            else:
+                self.polling_planner.defer(symbol)
+
+        started = time.perf_counter()
+        triggered = index.evaluate(snapshot)
+        self._record('evaluation', time.perf_counter() - started)
+
+        self.schedule_next(index, snapshot, quotes)
+        return triggered, quotes
+
+    def update_snapshot(self, index, snapshot, symbol, current_data=None):
+        """取得報價、更新滑動視窗並填入快照，回傳報價"""
+        try:
+            if current_data is None:
+                started = time.perf_counter()
+                current_data = self.stock_manager.get_current_price(
+                    symbol, max_age=self.polling_planner.min_interval
+                )
+                self._record('quote_fetch', time.perf_counter() - started)
+            if not current_data:
+                return None
+
+            window = self.price_windows.add_quote(current_data)
+            snapshot.set(
+                index.symbol_index[symbol],
+                current_data['price'],
+                change_percent=window.change_percent,
+                volume_ratio=window.volume_ratio,
+                volatility=window.volatility
+            )
+            return current_data
+
+        except Exception as e:
+            self.logger.error(f"Error updating quote for {symbol}: {e}")
+            return None
+
+    def schedule_next(self, index, snapshot, quotes):
+        """依距離門檻的遠近與波動率排定下次輪詢"""
+        distance = index.distance_to_trigger(snapshot)
+        for symbol, quote in quotes.items():
+            i = index.symbol_index[symbol]
+            d = None if np.isinf(distance[i]) else float(distance[i])
+            volatility = float(snapshot.volatility[i])
+            if np.isnan(volatility):
+                # 滑動視窗資料不足時以當日振幅估計波動
+                volatility = (quote['high'] - quote['low']) / quote['price'] * 100 if quote['price'] else None
+            interval = self.polling_planner.update(symbol, d, volatility)
+            self.logger.debug(f"Next alert check for {symbol} in {interval:.0f}s")
@@ -0,0 +1,75 @@
+import logging
+import time
+from config import (ALERT_MIN_POLL_INTERVAL, ALERT_MAX_POLL_INTERVAL, ALERT_NEAR_DISTANCE_PCT,
+                    ALERT_FAR_DISTANCE_PCT, ALERT_API_BUDGET_PER_HOUR, VOLATILITY_THRESHOLD)
+
+class AdaptivePollingPlanner:
+    """依觸發可能性調整每檔股票的警報輪詢間隔
+
+    價格越接近警報門檻、波動越大，輪詢越頻繁；離門檻很遠時拉長間隔。
+    所有股票的總請求量超過 API 預算時，依比例放大間隔，讓額度集中在
+    最可能觸發的股票上。
+    """
+
+    def __init__(self, min_interval=ALERT_MIN_POLL_INTERVAL, max_interval=ALERT_MAX_POLL_INTERVAL,
+                 near_pct=ALERT_NEAR_DISTANCE_PCT, far_pct=ALERT_FAR_DISTANCE_PCT,
+                 budget_per_hour=ALERT_API_BUDGET_PER_HOUR):
+        self.logger = logging.getLogger(__name__)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.near_pct = near_pct
+        self.far_pct = far_pct
+        self.budget_per_hour = budget_per_hour
+
+        self.intervals = {}  # symbol -> 期望的輪詢間隔（秒）
+        self.next_due = {}   # symbol -> 下次輪詢時間
+
+    def due_symbols(self, symbols, now=None):
+        """回傳已到輪詢時間的股票，並移除已沒有警報的股票"""
+        now = now if now is not None else time.time()
+        active = set(symbols)
+
+        for symbol in list(self.next_due):
+            if symbol not in active:
+                del self.next_due[symbol]
+                self.intervals.pop(symbol, None)
+
+        due = [symbol for symbol in symbols if self.next_due.get(symbol, 0) <= now]
+        # 最早到期的先檢查
+        return sorted(due, key=lambda symbol: self.next_due.get(symbol, 0))
+
+    def update(self, symbol, distance, volatility=None, now=None):
+        """根據距離門檻的百分比與波動率更新輪詢間隔並排定下次輪詢時間
+
+        distance: 距離最近價格或變動門檻的百分比，None 表示沒有可估算距離的警報
+        volatility: 波動率 (%)
+        """
+        now = now if now is not None else time.time()
+
+        if distance is None:
+            closeness = 0.5  # 成交量、波動率警報沒有距離可言，取中間值
+        else:
+            span = max(self.far_pct - self.near_pct, 1e-9)
+            closeness = min(1.0, max(0.0, (distance - self.near_pct) / span))
+
+        interval = self.min_interval + (self.max_interval - self.min_interval) * closeness
+
+        # 波動越大，價格越可能在下一次輪詢前穿越門檻
+        if volatility:
+            interval /= 1 + volatility / (VOLATILITY_THRESHOLD * 100)
+
+        self.intervals[symbol] = max(self.min_interval, interval)
+        self.next_due[symbol] = now + self.intervals[symbol] * self._budget_scale()
+        return self.intervals[symbol]
+
+    def defer(self, symbol, delay=None, now=None):
+        """報價取得失敗時延後重試"""
+        now = now if now is not None else time.time()
+        self.next_due[symbol] = now + (delay if delay is not None else self.min_interval)
+
+    def _budget_scale(self):
+        """總請求量超出預算時的間隔放大倍數"""
+        if not self.budget_per_hour or not self.intervals:
+            return 1.0
+        requests_per_hour = sum(3600.0 / interval for interval in self.intervals.values())
+        return max(1.0, requests_per_hour / self.budget_per_hour)
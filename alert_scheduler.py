@@ -0,0 +1,97 @@
+import heapq
+import logging
+import threading
+import time
+
+class CooldownScheduler:
+    """警報冷卻排程器
+
+    所有冷卻中的警報共用一條執行緒與一個最小堆積，冷卻結束時間存在
+    alerts.cooldown_until，重新啟動後會從資料庫還原，不會讓警報卡在停用狀態。
+    """
+
+    def __init__(self, db, retry_delay=30.0):
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.retry_delay = retry_delay  # 寫入失敗時延後重試的秒數
+
+        self._heap = []  # (cooldown_until, (user_id, symbol, alert_type))
+        self._condition = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+    def start(self):
+        """從資料庫還原冷卻中的警報並啟動排程執行緒"""
+        with self._condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        try:
+            for user_id, symbol, alert_type, cooldown_until in self.db.get_alert_cooldowns():
+                self._push(cooldown_until, (user_id, symbol, alert_type))
+        except Exception as e:
+            self.logger.error(f"Error restoring alert cooldowns: {e}")
+
+        self._thread = threading.Thread(target=self._run, name="alert-cooldown", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Cooldown scheduler started with {len(self._heap)} pending alerts")
+
+    def stop(self):
+        """停止排程執行緒（未到期的冷卻仍保存在資料庫）"""
+        with self._condition:
+            self.is_running = False
+            self._condition.notify()
+
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def schedule(self, user_id, symbol, alert_type, cooldown_until):
+        """排程在 cooldown_until 重新啟用警報"""
+        self._push(cooldown_until, (user_id, symbol.upper(), alert_type))
+
+    def pending_count(self):
+        """冷卻中的警報數量"""
+        with self._condition:
+            return len(self._heap)
+
+    def _push(self, cooldown_until, alert_key):
+        with self._condition:
+            heapq.heappush(self._heap, (cooldown_until, alert_key))
+            # 只有新項目成為最早到期者時才需要喚醒執行緒重新計算等待時間
+            if self._heap[0][1] == alert_key:
+                self._condition.notify()
+
+    def _pop_due(self, now):
+        """取出所有已到期的警報"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.is_running:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._condition.wait(timeout)
+
+                if not self.is_running:
+                    return
+
+                now = time.time()
+                due = self._pop_due(now)
+
+            # 在鎖外批次寫入，避免阻塞 schedule()
+            try:
+                self.db.release_alert_cooldowns(list(dict.fromkeys(due)), now)
+                self.logger.info(f"Re-enabled {len(due)} alerts after cooldown")
+            except Exception as e:
+                self.logger.error(f"Error re-enabling alerts: {e}")
+                retry_at = time.time() + self.retry_delay
+                for alert_key in due:
+                    self._push(retry_at, alert_key)
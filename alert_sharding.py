@@ -0,0 +1,136 @@
+import logging
+import multiprocessing
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from config import ALERT_SHARD_TIMEOUT
+
+def shard_for(symbol, shard_count):
+    """股票所屬的分片（crc32 不受 PYTHONHASHSEED 影響，重啟後分配不變）"""
+    return zlib.crc32(symbol.upper().encode('utf-8')) % shard_count
+
+class _SampleRecorder:
+    """工作程序內暫存延遲樣本，每輪隨結果一起回傳給協調者"""
+
+    def __init__(self):
+        self.samples = []
+
+    def record(self, stage, seconds):
+        self.samples.append((stage, seconds))
+
+    def drain(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+# 工作程序內的狀態（每個程序只負責一個分片）
+_shard = {}
+
+def _init_shard(shard_id, shard_count):
+    """工作程序初始化：建立此分片專屬的報價管理、滑動視窗、輪詢排程與警報索引"""
+    from alert_engine import AlertIndexCache
+    from alert_evaluator import AlertEvaluator
+    from database import Database
+    from stock_data import StockDataManager
+
+    logging.basicConfig(
+        format=f'%(asctime)s - shard{shard_id} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+
+    db = Database()
+    recorder = _SampleRecorder()
+    evaluator = AlertEvaluator(StockDataManager(), latency=recorder)
+
+    symbols = sorted({
+        symbol for _, symbol, _, _ in db.get_active_alerts()
+        if shard_for(symbol, shard_count) == shard_id
+    })
+    evaluator.hydrate(db, symbols)
+
+    # 分片索引保留在程序內，只在警報變動時重新取出並過濾，每輪成本只與本分片的警報數有關
+    alert_index = AlertIndexCache(
+        select=lambda alerts: [alert for alert in alerts if shard_for(alert[1], shard_count) == shard_id]
+    )
+
+    _shard.update(id=shard_id, count=shard_count, db=db, evaluator=evaluator, recorder=recorder,
+                  alert_index=alert_index)
+
+def _run_shard_cycle():
+    """在工作程序內評估此分片的警報，回傳 (triggered, quotes, latency_samples)"""
+    index = _shard['alert_index'].get(_shard['db'])
+    triggered, quotes = _shard['evaluator'].run_cycle(index)
+    return triggered, quotes, _shard['recorder'].drain()
+
+class ShardedAlertEvaluator:
+    """多程序分片警報評估的協調者
+
+    股票依 crc32 雜湊分配到固定的工作程序，每個程序擁有自己分片的警報索引、
+    滑動視窗與報價請求，協調者收集各分片觸發的警報後統一交給發送佇列。
+    """
+
+    def __init__(self, shard_count, timeout=ALERT_SHARD_TIMEOUT):
+        self.shard_count = shard_count
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self._executors = []
+        self._futures = {}  # shard_id -> 尚未完成的 future
+
+    def start(self):
+        """為每個分片啟動一個工作程序"""
+        if self._executors:
+            return
+
+        self._executors = [self._new_executor(shard_id) for shard_id in range(self.shard_count)]
+        self.logger.info(f"Started {self.shard_count} alert shard workers")
+
+    def _new_executor(self, shard_id):
+        # 主程序已有背景執行緒，使用 spawn 避免 fork 後鎖狀態不一致
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_shard,
+            initargs=(shard_id, self.shard_count)
+        )
+
+    def stop(self):
+        """關閉所有工作程序"""
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._executors = []
+        self._futures = {}
+
+    def run_cycle(self):
+        """所有分片各跑一輪，回傳合併後的 (triggered, quotes, latency_samples)
+
+        上一輪尚未完成的分片本輪略過，超過 timeout 的分片結果留待下一輪收集。
+        """
+        for shard_id, executor in enumerate(self._executors):
+            if shard_id not in self._futures:
+                self._futures[shard_id] = executor.submit(_run_shard_cycle)
+
+        triggered, quotes, samples = [], {}, []
+        deadline = time.monotonic() + self.timeout
+        for shard_id, future in list(self._futures.items()):
+            try:
+                remaining = max(0.0, deadline - time.monotonic())
+                shard_triggered, shard_quotes, shard_samples = future.result(timeout=remaining)
+            except TimeoutError:
+                self.logger.warning(f"Alert shard {shard_id} did not finish within {self.timeout}s")
+                continue
+            except BrokenProcessPool as e:
+                self.logger.error(f"Alert shard {shard_id} worker died, restarting: {e}")
+                del self._futures[shard_id]
+                self._executors[shard_id] = self._new_executor(shard_id)
+                continue
+            except Exception as e:
+                self.logger.error(f"Alert shard {shard_id} failed: {e}")
+                del self._futures[shard_id]
+                continue
+
+            del self._futures[shard_id]
+            triggered.extend(shard_triggered)
+            quotes.update(shard_quotes)
+            samples.extend(shard_samples)
+
+        return triggered, quotes, samples
@@ -1,136 +1,168 @@
 import asyncio
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
+from alert_engine import AlertIndex, AlertIndexCache
+from alert_evaluator import AlertEvaluator
+from alert_scheduler import CooldownScheduler
+from alert_sharding import ShardedAlertEvaluator
 from database import Database
+from latency import LatencyTracker
+from message_queue import AlertDeliveryQueue
 from stock_data import StockDataManager
 from config import *
 
+# 警報路徑的延遲量測階段（依發生順序）
+ALERT_LATENCY_STAGES = ['quote_fetch', 'evaluation', 'enrichment', 'queue_wait', 'send', 'end_to_end']
+
 class AlertSystem:
-    def __init__(self, bot):
+    def __init__(self, bot, tick_recorder=None):
         self.bot = bot
         self.db = Database()
-        self.stock_manager = StockDataManager()
+        self.tick_recorder = tick_recorder
+        self.stock_manager = StockDataManager(tick_recorder=tick_recorder)
+        self.cooldown_scheduler = CooldownScheduler(self.db)
+        self.latency = LatencyTracker()
+        self.delivery_queue = AlertDeliveryQueue(bot, latency=self.latency)
+        self.evaluator = AlertEvaluator(self.stock_manager, latency=self.latency)
+        # ALERT_SHARD_COUNT > 0 時改由多個工作程序分片評估
+        self.sharded_evaluator = ShardedAlertEvaluator(ALERT_SHARD_COUNT) if ALERT_SHARD_COUNT > 0 else None
+        # 警報索引只在警報新增、刪除、冷卻或恢復後重建
+        self.alert_index = AlertIndexCache()
         self.logger = logging.getLogger(__name__)
         self.is_running = False
+        self._check_lock = threading.Lock()
+    
+    def start(self):
+        """啟動背景服務（冷卻排程、訊息發送）並還原滑動視窗"""
+        if self.sharded_evaluator:
+            # 各分片程序自行還原滑動視窗
+            self.sharded_evaluator.start()
+        else:
+            try:
+                symbols = sorted({symbol for _, symbol, _, _ in self.db.get_active_alerts()})
+                self.evaluator.hydrate(self.db, symbols)
+            except Exception as e:
+                self.logger.error(f"Error hydrating price windows: {e}")
+        
+        self.cooldown_scheduler.start()
+        self.delivery_queue.start()
+    
+    def stop(self):
+        """停止背景服務"""
+        if self.sharded_evaluator:
+            self.sharded_evaluator.stop()
+        self.cooldown_scheduler.stop()
+        self.delivery_queue.stop()
+        self.db.close()
+        self.logger.info(f"Alert latency summary:\n{self.get_latency_report()}")
     
     def start_monitoring(self):
         """開始監控警報"""
         self.is_running = True
+        self.start()
         self.logger.info("Alert system started")
         
         while self.is_running:
             try:
-                self.check_alerts()
-                import time
+                self.check_alerts_job(None)
                 time.sleep(ALERT_CHECK_INTERVAL)
             except Exception as e:
                 self.logger.error(f"Error in alert monitoring: {e}")
-                import time
                 time.sleep(ALERT_CHECK_INTERVAL)
     
     def stop_monitoring(self):
         """停止監控"""
         self.is_running = False
+        self.stop()
         self.logger.info("Alert system stopped")
     
+    def check_alerts_job(self, context):
+        """由 Updater 的 job queue 定期呼叫的警報檢查"""
+        # 上一輪尚未結束時略過，避免同時對同一檔股票重複請求
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self.check_alerts()
+        finally:
+            self._check_lock.release()
+    
     def check_alerts(self):
-        """檢查所有警報"""
+        """檢查已到輪詢時間的股票警報"""
         try:
-            # 取得所有活躍警報
-            conn = self.db.db_path
-            import sqlite3
-            conn = sqlite3.connect(conn)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT DISTINCT user_id, symbol 
-                FROM alerts 
-                WHERE is_active = 1
-            ''')
+            if self.sharded_evaluator:
+                triggered, quotes, samples = self.sharded_evaluator.run_cycle()
+                for stage, seconds in samples:
+                    self.latency.record(stage, seconds)
+                # 分片程序取得的報價交回主程序記錄
+                if self.tick_recorder:
+                    for quote in quotes.values():
+                        self.tick_recorder.record(quote)
+            else:
+                triggered, quotes = self.evaluator.run_cycle(self.alert_index.get(self.db))
             
-            active_alerts = cursor.fetchall()
-            conn.close()
-            
-            for user_id, symbol in active_alerts:
-                self.check_user_alerts(user_id, symbol)
+            self.process_triggers(triggered, quotes)
                 
         except Exception as e:
             self.logger.error(f"Error checking alerts: {e}")
     
-    def check_user_alerts(self, user_id, symbol):
+    def check_user_alerts(self, user_id, symbol, current_data=None):
         """檢查特定用戶的股票警報"""
         try:
-            # 取得當前價格
-            current_data = self.stock_manager.get_current_price(symbol)
-            if not current_data:
-                return
-            
-            # 取得歷史價格
-            history = self.db.get_price_history(symbol, limit=2)
-            if len(history) < 2:
+            index = AlertIndex(
+                (user_id, alert_symbol, alert_type, threshold)
+                for alert_symbol, alert_type, threshold, is_active in self.db.get_user_alerts(user_id)
+                if alert_symbol == symbol and is_active
+            )
+            if not len(index):
                 return
             
-            current_price = current_data['price']
-            previous_price = history[1][0]  # 前一個價格
-            
-            # 取得用戶的警報設定
-            alerts = self.db.get_user_alerts(user_id)
-            symbol_alerts = [alert for alert in alerts if alert[0] == symbol]
-            
-            for alert in symbol_alerts:
-                symbol, alert_type, threshold, is_active = alert
-                
-                if not is_active:
-                    continue
-                
-                triggered = False
-                message = ""
-                
-                if alert_type == 'price_high':
-                    if current_price >= threshold:
-                        triggered = True
-                        message = f"🚀 {symbol} 價格突破 {threshold:.2f}！\n當前價格: ${current_price:.2f}"
-                
-                elif alert_type == 'price_low':
-                    if current_price <= threshold:
-                        triggered = True
-                        message = f"📉 {symbol} 價格跌破 {threshold:.2f}！\n當前價格: ${current_price:.2f}"
-                
-                elif alert_type == 'price_change':
-                    change_percent = abs((current_price - previous_price) / previous_price * 100)
-                    if change_percent >= threshold:
-                        triggered = True
-                        direction = "上漲" if current_price > previous_price else "下跌"
-                        message = f"⚡ {symbol} {direction} {change_percent:.1f}%！\n當前價格: ${current_price:.2f}"
-                
-                elif alert_type == 'volume_spike':
-                    volume_ratio = current_data['volume'] / history[1][1] if history[1][1] > 0 else 0
-                    if volume_ratio >= threshold:
-                        triggered = True
-                        message = f"📊 {symbol} 成交量放大 {volume_ratio:.1f} 倍！\n當前成交量: {current_data['volume']:,}"
-                
-                elif alert_type == 'volatility':
-                    # 計算波動率
-                    prices = [h[0] for h in history[-20:]]  # 最近20個價格
-                    if len(prices) >= 2:
-                        returns = [(prices[i] - prices[i-1]) / prices[i-1] for i in range(1, len(prices))]
-                        volatility = (sum(r**2 for r in returns) / len(returns))**0.5 * 100
-                        
-                        if volatility >= threshold:
-                            triggered = True
-                            message = f"🌊 {symbol} 波動率達到 {volatility:.1f}%！\n當前價格: ${current_price:.2f}"
-                
-                if triggered:
-                    self.send_alert(user_id, message, symbol)
-                    # 暫時停用警報避免重複發送
-                    self.disable_alert_temporarily(user_id, symbol, alert_type)
+            snapshot = index.new_snapshot()
+            current_data = self.evaluator.update_snapshot(index, snapshot, symbol, current_data)
+            if current_data:
+                self.process_triggers(index.evaluate(snapshot), {symbol: current_data})
         
         except Exception as e:
             self.logger.error(f"Error checking alerts for {user_id} {symbol}: {e}")
     
-    def send_alert(self, user_id, message, symbol):
-        """發送警報訊息"""
+    def process_triggers(self, triggered, quotes):
+        """發送觸發的警報並進入冷卻"""
+        for alert_type, symbol, user_id, threshold, value in triggered:
+            try:
+                quote = quotes[symbol]
+                message = self.format_alert_message(alert_type, symbol, threshold, value, quote)
+                origin_time = quote['timestamp'].timestamp() if isinstance(quote.get('timestamp'), datetime) else None
+                self.send_alert(user_id, message, symbol, origin_time=origin_time)
+                # 暫時停用警報避免重複發送
+                self.disable_alert_temporarily(user_id, symbol, alert_type)
+            except Exception as e:
+                self.logger.error(f"Error handling {alert_type} alert for {user_id} {symbol}: {e}")
+    
+    def format_alert_message(self, alert_type, symbol, threshold, value, current_data):
+        """產生警報訊息內容"""
+        current_price = current_data['price']
+        
+        if alert_type == 'price_high':
+            return f"🚀 {symbol} 價格突破 {threshold:.2f}！\n當前價格: ${current_price:.2f}"
+        elif alert_type == 'price_low':
+            return f"📉 {symbol} 價格跌破 {threshold:.2f}！\n當前價格: ${current_price:.2f}"
+        elif alert_type == 'price_change':
+            direction = "上漲" if value > 0 else "下跌"
+            return f"⚡ {symbol} {direction} {abs(value):.1f}%！\n當前價格: ${current_price:.2f}"
+        elif alert_type == 'volume_spike':
+            return f"📊 {symbol} 成交量放大 {value:.1f} 倍！\n當前成交量: {current_data['volume']:,}"
+        else:
+            return f"🌊 {symbol} 波動率達到 {value:.1f}%！\n當前價格: ${current_price:.2f}"
+    
+    def send_alert(self, user_id, message, symbol, origin_time=None):
+        """發送警報訊息
+        
+        origin_time: 觸發警報的報價時間，用於量測端到端延遲
+        """
         try:
+            enrichment_started = time.perf_counter()
+            
             # 取得股票資訊
             stock_info = self.stock_manager.get_stock_info(symbol)
             if stock_info:
@@ -144,65 +176,39 @@ class AlertSystem:
                 for signal in analysis['signals'][:3]:  # 只顯示前3個信號
                     message += f"• {signal}\n"
             
-            # 發送訊息
-            self.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode='Markdown'
-            )
+            self.latency.record('enrichment', time.perf_counter() - enrichment_started)
             
-            self.logger.info(f"Alert sent to user {user_id} for {symbol}")
+            # 放入發送佇列，由背景執行緒依速率限制發送
+            self.delivery_queue.enqueue(user_id, message, parse_mode='Markdown', origin_time=origin_time)
+            
+            self.logger.info(f"Alert queued for user {user_id} for {symbol}")
             
         except Exception as e:
-            self.logger.error(f"Error sending alert to {user_id}: {e}")
+            self.logger.error(f"Error queueing alert to {user_id}: {e}")
+    
+    def get_latency_report(self):
+        """警報路徑各階段的延遲統計與發送佇列狀態"""
+        report = self.latency.dump(ALERT_LATENCY_STAGES)
+        stats = self.delivery_queue.get_stats()
+        report += (
+            f"\n\n📬 發送佇列: {stats['queue_depth']} 則待送"
+            f"（最久 {stats['oldest_pending_age']:.1f}s），"
+            f"已送 {stats['sent_alerts']} 則，丟棄 {stats['dropped_alerts']} 則"
+        )
+        return report
     
     def disable_alert_temporarily(self, user_id, symbol, alert_type):
         """暫時停用警報避免重複發送"""
         try:
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
+            cooldown_until = time.time() + ALERT_COOLDOWN_SECONDS
+            self.db.start_alert_cooldown(user_id, symbol, alert_type, cooldown_until)
             
-            cursor.execute('''
-                UPDATE alerts 
-                SET is_active = 0 
-                WHERE user_id = ? AND symbol = ? AND alert_type = ?
-            ''', (user_id, symbol, alert_type))
-            
-            conn.commit()
-            conn.close()
-            
-            # 30分鐘後重新啟用
-            import threading
-            import time
-            def re_enable():
-                time.sleep(1800)
-                self.re_enable_alert(user_id, symbol, alert_type, delay=1800)
-            threading.Thread(target=re_enable, daemon=True).start()
+            # 冷卻結束後由排程器重新啟用
+            self.cooldown_scheduler.schedule(user_id, symbol, alert_type, cooldown_until)
             
         except Exception as e:
             self.logger.error(f"Error disabling alert: {e}")
     
-    def re_enable_alert(self, user_id, symbol, alert_type, delay=1800):
-        """重新啟用警報"""
-        import time
-        time.sleep(delay)
-        
-        try:
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE alerts 
-                SET is_active = 1 
-                WHERE user_id = ? AND symbol = ? AND alert_type = ?
-            ''', (user_id, symbol, alert_type))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            self.logger.error(f"Error re-enabling alert: {e}")
-    
     def create_price_alert(self, user_id, symbol, alert_type, threshold):
         """建立價格警報"""
         try:
@@ -252,16 +258,7 @@ class AlertSystem:
     def delete_alert(self, user_id, symbol, alert_type):
         """刪除警報"""
         try:
-            conn = sqlite3.connect(self.db.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                DELETE FROM alerts 
-                WHERE user_id = ? AND symbol = ? AND alert_type = ?
-            ''', (user_id, symbol, alert_type))
-            
-            conn.commit()
-            conn.close()
+            self.db.delete_alert(user_id, symbol, alert_type)
             
             return True, f"已刪除 {symbol} 的 {alert_type} 警報"
             
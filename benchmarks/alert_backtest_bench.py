@@ -0,0 +1,57 @@
+"""
+警報回測效能測試：一年1分鐘K線 × 數百個警報
+
+在專案根目錄執行：python -m benchmarks.alert_backtest_bench
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from alert_backtest import AlertBacktester
+from alert_engine import ALERT_TYPES
+
+def make_bars(days, seed=1):
+    """合成每天390根的1分鐘K線"""
+    rng = np.random.default_rng(seed)
+    sessions = pd.bdate_range('2024-01-01', periods=days)
+    index = (sessions.repeat(390) + pd.to_timedelta(np.tile(np.arange(390), days) + 570, unit='min'))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.0008, len(index))))
+    volume = rng.lognormal(8, 0.6, len(index)).astype(np.int64)
+    return pd.DataFrame({'Close': close, 'Volume': volume}, index=index)
+
+def make_alerts(count, seed=2):
+    rng = np.random.default_rng(seed)
+    ranges = {
+        'price_high': (100, 160),
+        'price_low': (50, 100),
+        'price_change': (0.2, 1.0),
+        'volume_spike': (2, 6),
+        'volatility': (0.1, 0.3)
+    }
+    alerts = []
+    for i in range(count):
+        alert_type = ALERT_TYPES[i % len(ALERT_TYPES)]
+        alerts.append((alert_type, float(rng.uniform(*ranges[alert_type]))))
+    return alerts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--alerts', type=int, default=500)
+    args = parser.parse_args()
+
+    bars = make_bars(args.days)
+    alerts = make_alerts(args.alerts)
+    backtester = AlertBacktester()
+
+    start = time.perf_counter()
+    results = backtester.run(bars, alerts)
+    elapsed = time.perf_counter() - start
+
+    total = sum(result['count'] for result in results)
+    print(f"bars={len(bars):,} alerts={len(alerts)} triggers={total:,}")
+    print(f"replay {elapsed:.3f} s ({len(bars) * len(alerts) / elapsed / 1e6:.1f}M bar-alerts/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+警報評估效能測試：10 萬筆合成警報
+
+比較逐筆 if/elif 評估與 AlertIndex 向量化評估的耗時。每輪重建索引時
+建立成本也計入；AlertIndexCache 只在警報變動時重建，其餘各輪只需評估。
+在專案根目錄執行：python -m benchmarks.alert_engine_bench
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+from alert_engine import AlertIndex, ALERT_TYPES
+
+def make_alerts(count, symbol_count, seed=42):
+    rng = random.Random(seed)
+    symbols = [f"S{i:04d}" for i in range(symbol_count)]
+    alerts = []
+    for i in range(count):
+        alert_type = rng.choice(ALERT_TYPES)
+        threshold = {
+            'price_high': rng.uniform(100, 130),
+            'price_low': rng.uniform(70, 100),
+            'price_change': rng.uniform(1, 10),
+            'volume_spike': rng.uniform(1.5, 4),
+            'volatility': rng.uniform(1, 5)
+        }[alert_type]
+        alerts.append((i % 50000, rng.choice(symbols), alert_type, threshold))
+    return alerts
+
+def make_market(symbols, seed=7):
+    rng = np.random.default_rng(seed)
+    n = len(symbols)
+    return {
+        'price': rng.uniform(70, 130, n),
+        'change_percent': rng.normal(0, 3, n),
+        'volume_ratio': rng.lognormal(0, 0.5, n),
+        'volatility': rng.uniform(0, 6, n)
+    }
+
+def evaluate_loop(alerts, market, symbol_index):
+    """舊版逐筆評估（作為對照）"""
+    triggered = 0
+    for user_id, symbol, alert_type, threshold in alerts:
+        i = symbol_index[symbol]
+        if alert_type == 'price_high':
+            hit = market['price'][i] >= threshold
+        elif alert_type == 'price_low':
+            hit = market['price'][i] <= threshold
+        elif alert_type == 'price_change':
+            hit = abs(market['change_percent'][i]) >= threshold
+        elif alert_type == 'volume_spike':
+            hit = market['volume_ratio'][i] >= threshold
+        else:
+            hit = market['volatility'][i] >= threshold
+        triggered += bool(hit)
+    return triggered
+
+def timed(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=100000)
+    parser.add_argument('--symbols', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    alerts = make_alerts(args.alerts, args.symbols)
+
+    build_time, index = timed(lambda: AlertIndex(alerts), args.repeat)
+    market = make_market(index.symbols)
+    snapshot = index.new_snapshot()
+    for i in range(len(index.symbols)):
+        snapshot.set(i, market['price'][i], market['change_percent'][i],
+                     market['volume_ratio'][i], market['volatility'][i])
+
+    loop_time, loop_hits = timed(lambda: evaluate_loop(alerts, market, index.symbol_index), args.repeat)
+    vector_time, triggered = timed(lambda: index.evaluate(snapshot), args.repeat)
+    mask_time, _ = timed(lambda: index.distance_to_trigger(snapshot), args.repeat)
+
+    assert loop_hits == len(triggered), (loop_hits, len(triggered))
+
+    print(f"alerts={args.alerts:,} symbols={len(index.symbols):,} triggered={len(triggered):,}")
+    print(f"index build        {build_time * 1000:8.1f} ms")
+    print(f"if/elif loop       {loop_time * 1000:8.1f} ms")
+    print(f"vectorized         {vector_time * 1000:8.1f} ms  ({loop_time / vector_time:.1f}x, cached index)")
+    rebuild_time = build_time + vector_time
+    print(f"build + vectorized {rebuild_time * 1000:8.1f} ms  ({loop_time / rebuild_time:.1f}x, index rebuilt every cycle)")
+    print(f"distance_to_trigger{mask_time * 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+長序列圖表效能測試：繪製全部資料點 vs 依像素寬度縮減
+
+以合成的K線（數百到數萬根）量測價格圖與技術分析圖的繪製時間（ms），
+比較 ChartEngine(downsample=False) 與預設的 min/max 分桶縮減。
+在專案根目錄執行：python -m benchmarks.chart_downsample_bench
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from chart_engine import ChartEngine
+from stock_data import StockDataManager
+
+def make_history(bars, seed=0):
+    """合成分鐘K（長度不受交易日限制）"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+    index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=bars, freq='min')
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.001, bars)),
+        'High': close * 1.002,
+        'Low': close * 0.998,
+        'Close': close,
+        'Volume': rng.integers(1_000, 50_000, bars).astype(float),
+    }, index=index)
+
+def time_render(engine, method, args, repeat):
+    getattr(engine, method)(*args)  # 建立範本
+    start = time.perf_counter()
+    for _ in range(repeat):
+        getattr(engine, method)(*args)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bars', type=int, nargs='+', default=[250, 1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    full, reduced = ChartEngine(downsample=False), ChartEngine()
+    print(f"{'chart':>10}{'bars':>8}{'full ms':>10}{'reduced ms':>12}")
+    for bars in args.bars:
+        df = make_history(bars)
+        technical = StockDataManager().calculate_technical_indicators(df.copy())
+        for chart, method, chart_args in (('price', 'render_price_chart', ('BENCH', df, 'dark_background')),
+                                          ('technical', 'render_technical_chart', ('BENCH', technical, 'dark_background'))):
+            full_ms = time_render(full, method, chart_args, args.repeat)
+            reduced_ms = time_render(reduced, method, chart_args, args.repeat)
+            print(f"{chart:>10}{bars:>8}{full_ms:>10.1f}{reduced_ms:>12.1f}")
+
+if __name__ == '__main__':
+    main()
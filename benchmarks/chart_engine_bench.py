@@ -0,0 +1,63 @@
+"""
+圖表引擎效能測試：每張圖重建 Figure vs 重複使用範本
+
+以合成的日K資料量測每張圖的繪製時間（ms）。「重建」每次建立新的 ChartEngine，
+等同每張圖重新建立 Figure、子圖、圖例與日期格式；「範本」使用同一個 ChartEngine，
+只更新資料後輸出 PNG。
+在專案根目錄執行：python -m benchmarks.chart_engine_bench
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from chart_engine import ChartEngine
+from stock_data import StockDataManager
+
+def make_history(days, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq='B')
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, days)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 5_000_000, days).astype(float),
+    }, index=index)
+
+def make_charts(days):
+    df = make_history(days)
+    technical = StockDataManager().calculate_technical_indicators(df.copy())
+    histories = [(f'S{i}', make_history(days, seed=i)) for i in range(5)]
+    correlation = pd.DataFrame({symbol: history['Close'] for symbol, history in histories}).pct_change().corr()
+    return {
+        'price': ('render_price_chart', ('BENCH', df, 'dark_background')),
+        'technical': ('render_technical_chart', ('BENCH', technical, 'dark_background')),
+        'comparison': ('render_comparison_chart', (histories, 'dark_background')),
+        'heatmap': ('render_heatmap_chart', (correlation,)),
+    }
+
+def time_chart(method, args, repeat, reuse):
+    engine = ChartEngine()
+    getattr(engine, method)(*args)  # 預熱字型快取
+    start = time.perf_counter()
+    for _ in range(repeat):
+        if not reuse:
+            engine = ChartEngine()
+        getattr(engine, method)(*args)
+    return (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--days', type=int, default=66, help='K線數（66 約為 3 個月）')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    for name, (method, chart_args) in make_charts(args.days).items():
+        rebuild = time_chart(method, chart_args, args.repeat, reuse=False)
+        reuse = time_chart(method, chart_args, args.repeat, reuse=True)
+        print(f"{name:>10}: rebuild {rebuild:7.1f} ms  template {reuse:7.1f} ms  ({rebuild / reuse:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+圖表繪製效能測試：主程序內序列繪製 vs 工作程序池
+
+以合成的一年日K資料，由多個執行緒同時請求價格圖與技術分析圖，
+量測各工作程序數下的 charts/sec（workers=0 為主程序內以鎖序列化繪製）。
+在專案根目錄執行：python -m benchmarks.chart_render_bench
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from chart_render import ChartRenderService
+from stock_data import StockDataManager
+
+def make_history(days=252, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq='B')
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, days)),
+        'High': close * 1.01,
+        'Low': close * 0.99,
+        'Close': close,
+        'Volume': rng.integers(1_000_000, 5_000_000, days).astype(float),
+    }, index=index)
+
+def run(workers, charts, clients):
+    service = ChartRenderService(workers=workers)
+    service.start()
+    df = make_history()
+    technical = StockDataManager().calculate_technical_indicators(df.copy())
+    jobs = [('price', 'BENCH', df, 'dark_background') if i % 2 == 0 else ('technical', 'BENCH', technical, 'dark_background')
+            for i in range(charts)]
+
+    # 預熱：工作程序啟動與字型載入不計入
+    service.render('price', 'BENCH', df, 'dark_background')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda job: service.render(*job), jobs))
+    elapsed = time.perf_counter() - start
+    service.stop()
+
+    failed = sum(1 for result in results if result is None)
+    return charts / elapsed, failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--charts', type=int, default=40)
+    parser.add_argument('--clients', type=int, default=8, help='同時請求的執行緒數')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        rate, failed = run(workers, args.charts, args.clients)
+        label = 'in-process' if workers == 0 else f"{workers} workers"
+        print(f"{label:>12}: {rate:7.2f} charts/sec  failed={failed}")
+
+if __name__ == '__main__':
+    main()
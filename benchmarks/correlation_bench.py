@@ -0,0 +1,63 @@
+"""
+相關性效能測試：每次由收盤價重算 vs CorrelationEngine 增量更新
+
+以合成的日K資料量測相關係數矩陣的取得時間（ms）。「重算」每次將各股票的收盤價
+對齊成寬表後計算報酬率與 DataFrame.corr()；「增量」為每天新K線的更新時間與
+直接由累加值取出矩陣的時間。
+在專案根目錄執行：python -m benchmarks.correlation_bench
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from correlation import CorrelationEngine
+from config import CORRELATION_WINDOW
+
+def make_closes(symbols, days, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    market = rng.normal(0, 0.01, days)
+    return {
+        f'S{i}': pd.Series(100 * np.exp(np.cumsum(market * rng.uniform(0, 2) + rng.normal(0, 0.015, days))), index=index)
+        for i in range(symbols)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--symbols', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    days = CORRELATION_WINDOW + 1
+    closes = make_closes(args.symbols, days + 1)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        pd.DataFrame({symbol: close.iloc[-days:] for symbol, close in closes.items()}).pct_change().corr()
+    recompute = (time.perf_counter() - start) / args.repeat * 1000
+
+    engine = CorrelationEngine()
+    start = time.perf_counter()
+    engine.add_histories({symbol: close.iloc[:-1].to_frame('Close') for symbol, close in closes.items()})
+    hydrate = (time.perf_counter() - start) * 1000
+
+    # 最新一天的K線一次加入（移出視窗最舊的一天）
+    last_day = {symbol: {close.index[-1].date(): close.iloc[-1]} for symbol, close in closes.items()}
+    start = time.perf_counter()
+    engine.add_closes(last_day)
+    update = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        engine.matrix()
+    matrix = (time.perf_counter() - start) / args.repeat * 1000
+
+    print(f"{args.symbols} symbols, {CORRELATION_WINDOW}-day window")
+    print(f"  recompute from closes: {recompute:7.2f} ms")
+    print(f"  engine hydrate:        {hydrate:7.2f} ms (once)")
+    print(f"  engine daily update:   {update:7.2f} ms")
+    print(f"  engine matrix:         {matrix:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+資料庫效能測試：每次操作重新連線 vs 每執行緒持久連線（WAL）
+
+以混合的讀寫操作（新增警報、查詢警報、寫入報價、查詢歷史）量測 ops/sec，
+並以多執行緒同時寫入檢查 "database is locked" 錯誤。
+在專案根目錄執行：python -m benchmarks.database_bench
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from database import Database
+
+class ConnectPerCallDatabase(Database):
+    """舊行為：每個方法自行 connect，使用 SQLite 預設的 rollback journal"""
+
+    def _get_connection(self):
+        # 方法結束後連線失去參照即被關閉
+        return sqlite3.connect(self.db_path)
+
+def run_ops(db, ops, worker=0):
+    symbols = ['AAPL', 'MSFT', 'TSLA', 'NVDA', '2330.TW']
+    errors = 0
+    for i in range(ops):
+        symbol = symbols[i % len(symbols)]
+        try:
+            kind = i % 4
+            if kind == 0:
+                db.save_price_data(symbol, 100 + i % 7, 1000 + i, 0.5)
+            elif kind == 1:
+                db.get_price_history(symbol, limit=20)
+            elif kind == 2:
+                db.get_user_alerts(worker * 1000 + i % 50)
+            else:
+                db.get_active_alerts()
+        except sqlite3.OperationalError:
+            errors += 1
+    return errors
+
+def bench(db_class, ops, threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            db = db_class()
+            for user_id in range(50):
+                db.add_alert(user_id, 'AAPL', 'price_high', 200)
+
+            start = time.perf_counter()
+            run_ops(db, ops)
+            single = ops / (time.perf_counter() - start)
+
+            errors = [0] * threads
+            def worker(n):
+                errors[n] = run_ops(db, ops // threads, n)
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+            start = time.perf_counter()
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            concurrent = ops / (time.perf_counter() - start)
+
+            db.close()
+            return single, concurrent, sum(errors)
+        finally:
+            os.chdir(cwd)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':<18}{'1 thread ops/s':>16}{f'{args.threads} threads ops/s':>18}{'locked':>8}")
+    for name, db_class in (('connect per call', ConnectPerCallDatabase), ('pooled + WAL', Database)):
+        single, concurrent, errors = bench(db_class, args.ops, args.threads)
+        print(f"{name:<18}{single:>16,.0f}{concurrent:>18,.0f}{errors:>8}")
+
+if __name__ == '__main__':
+    main()
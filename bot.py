@@ -1,13 +1,22 @@
 import logging
 import asyncio
 import os
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, MessageHandler, CallbackQueryHandler, Filters
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.ext import Updater, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, Filters
+from telegram.error import BadRequest
 from database import Database
 from stock_data import StockDataManager
 from alert_system import AlertSystem
+from alert_backtest import AlertBacktester, format_report
 from chart_generator import ChartGenerator
-from config import TELEGRAM_TOKEN, INVESTMENT_PERSONALITIES
+from chart_prerender import ChartPrerenderer
+from chart_engine import resolve_profile
+from tick_recorder import TickRecorder
+from user_writer import UserWriteBehind
+from price_archive import PriceArchive
+from correlation import CorrelationEngine
+from config import (TELEGRAM_TOKEN, INVESTMENT_PERSONALITIES, ALERT_CHECK_INTERVAL, ADMIN_USER_IDS, PRICE_COMPACTION_INTERVAL,
+                    PRICE_ARCHIVE_INTERVAL, CHART_OUTPUT_PROFILES, CORRELATION_WINDOW, HEATMAP_MAX_SYMBOLS)
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import io
@@ -28,17 +37,33 @@ WEBHOOK_URL = os.getenv('WEBHOOK_URL', None)
 class StockBot:
     def __init__(self):
         self.db = Database()
-        self.stock_manager = StockDataManager()
-        self.chart_generator = ChartGenerator()
+        self.tick_recorder = TickRecorder(self.db)
+        self.user_writer = UserWriteBehind(self.db)
+        self.price_archive = PriceArchive()
+        if not self.price_archive.available:
+            logger.info("pyarrow not installed, price archive disabled")
+            self.price_archive = None
+        # 日報酬率相關性，新取得的日K線與彙總出的日K線都會更新
+        self.correlation = CorrelationEngine()
+        self.stock_manager = StockDataManager(tick_recorder=self.tick_recorder, archive=self.price_archive,
+                                              correlation=self.correlation)
+        self.chart_generator = ChartGenerator(stock_manager=self.stock_manager)
+        self.chart_prerenderer = ChartPrerenderer(self.db, self.chart_generator)
         self.alert_system = None
         self.updater = None
         
+    def track_activity(self, update: Update, context):
+        """每則訊息與按鈕都更新用戶的 updated_at（延遲批次寫入，同一用戶合併成一次）"""
+        user = update.effective_user
+        if user:
+            self.user_writer.touch(user.id)
+    
     def start(self, update: Update, context):
         """開始命令"""
         user = update.effective_user
         
-        # 新增用戶到資料庫
-        self.db.add_user(
+        # 新增用戶到資料庫（延遲批次寫入，不阻塞回覆）
+        self.user_writer.upsert_user(
             user_id=user.id,
             username=user.username,
             first_name=user.first_name,
@@ -82,6 +107,7 @@ class StockBot:
 📈 **圖表功能：**
 /chart <代碼> - 生成股票圖表 (價格走勢 + 技術指標)
 /compare <代碼1> <代碼2> ... - 多股票比較圖表 (最多5支)
+/heatmap [代碼...] - 報酬率相關性熱力圖 (預設為追蹤清單)
 
 ⭐ **追蹤功能：**
 /watchlist - 查看追蹤清單
@@ -92,6 +118,7 @@ class StockBot:
 /alerts - 查看警報設定
 /alert_price <代碼> <價格> - 設定價格警報
 /alert_change <代碼> <百分比> - 設定變動警報
+/backtest <代碼> - 回測警報過去3個月的觸發次數
 
 🎯 **投資策略：**
 /personality - 投資人格測驗
@@ -100,6 +127,7 @@ class StockBot:
 
 ⚙️ **設定：**
 /settings - 個人設定
+/chartstyle <設定> - 圖表輸出設定 (mobile / standard / hi-res)
 /help - 顯示此幫助
 
 💡 **圖表功能特色：**
@@ -585,29 +613,87 @@ class StockBot:
         """處理新增股票回調"""
         query.edit_message_text("請使用 /add <股票代碼> 來新增股票到追蹤清單\n\n例如: /add AAPL")
     
+    def _reply_chart(self, message, chart, caption):
+        """發送圖表：同一張圖已上傳過時以 file_id 發送，不再重新上傳"""
+        cache = self.chart_generator.chart_cache
+        cache_key = getattr(chart, 'cache_key', None)
+        
+        file_id = cache.get_file_id(cache_key) if cache_key else None
+        if file_id:
+            try:
+                return message.reply_photo(photo=file_id, caption=caption)
+            except BadRequest as e:
+                # file_id 失效時改為重新上傳
+                logger.warning(f"Cached chart file_id rejected, re-uploading: {e}")
+                cache.forget_file_id(cache_key)
+        
+        sent = message.reply_photo(photo=chart, caption=caption)
+        if cache_key and sent.photo:
+            cache.set_file_id(cache_key, sent.photo[-1].file_id)
+        return sent
+    
+    def _reply_chart_group(self, message, charts):
+        """以一則 media group 發送多張圖表，已上傳過的圖以 file_id 發送
+        
+        charts: [(chart, caption)]，只有一張時改用 _reply_chart
+        """
+        if len(charts) == 1:
+            return [self._reply_chart(message, *charts[0])]
+        
+        cache = self.chart_generator.chart_cache
+        keys = [getattr(chart, 'cache_key', None) for chart, _ in charts]
+        file_ids = [cache.get_file_id(key) if key else None for key in keys]
+        
+        def media():
+            items = []
+            for (chart, caption), file_id in zip(charts, file_ids):
+                if not file_id:
+                    chart.seek(0)  # 重新上傳時從頭讀取
+                items.append(InputMediaPhoto(media=file_id or chart, caption=caption))
+            return items
+        
+        try:
+            sent = message.reply_media_group(media=media())
+        except BadRequest as e:
+            if not any(file_ids):
+                raise
+            # 其中一個 file_id 失效時整組改為重新上傳
+            logger.warning(f"Cached chart file_id rejected, re-uploading: {e}")
+            for key, file_id in zip(keys, file_ids):
+                if file_id:
+                    cache.forget_file_id(key)
+            file_ids = [None] * len(charts)
+            sent = message.reply_media_group(media=media())
+        
+        for key, file_id, sent_message in zip(keys, file_ids, sent):
+            if key and not file_id and sent_message.photo:
+                cache.set_file_id(key, sent_message.photo[-1].file_id)
+        return sent
+    
+    def _chart_captions(self, symbol, price_chart, technical_chart):
+        """/chart 的圖表與說明（略過生成失敗的圖）"""
+        charts = [
+            (price_chart, f"📊 {symbol} 價格走勢圖 (1個月)\n\n包含：價格走勢、移動平均線、成交量"),
+            (technical_chart, f"📈 {symbol} 技術分析圖\n\n包含：RSI、MACD、布林通道、成交量分析")
+        ]
+        return [(chart, caption) for chart, caption in charts if chart]
+    
+    def _chart_profile(self, user_id):
+        """用戶偏好的圖表輸出設定檔（偏好設定 chart_style），未設定時回傳 None 使用預設"""
+        preferences = self.db.get_user_preferences(user_id)
+        return preferences[2] if preferences else None
+    
     def handle_chart_callback(self, query, symbol):
         """處理圖表回調"""
         query.edit_message_text("📈 正在生成圖表...")
+        profile = self._chart_profile(query.from_user.id)
         
         try:
-            # 生成價格走勢圖
-            price_chart = self.chart_generator.generate_price_chart(symbol, period='1mo')
+            # 同時生成價格走勢圖與技術指標圖，以一則 media group 發送
+            price_chart, technical_chart = self.chart_generator.generate_chart_pair(symbol, period='1mo', profile=profile)
             
             if price_chart:
-                # 發送圖片
-                query.message.reply_photo(
-                    photo=price_chart,
-                    caption=f"📊 {symbol} 價格走勢圖 (1個月)\n\n包含：價格走勢、移動平均線、成交量"
-                )
-                
-                # 生成技術指標圖
-                technical_chart = self.chart_generator.generate_technical_chart(symbol, period='1mo')
-                
-                if technical_chart:
-                    query.message.reply_photo(
-                        photo=technical_chart,
-                        caption=f"📈 {symbol} 技術分析圖\n\n包含：RSI、MACD、布林通道、成交量分析"
-                    )
+                self._reply_chart_group(query.message, self._chart_captions(symbol, price_chart, technical_chart))
                 
                 # 更新原始訊息
                 keyboard = [
@@ -640,31 +726,18 @@ class StockBot:
             return
         
         symbol = context.args[0].upper()
+        profile = self._chart_profile(update.effective_user.id)
         
         # 顯示載入訊息
         loading_msg = update.message.reply_text("📈 正在生成圖表...")
         
         try:
-            # 生成價格走勢圖
-            price_chart = self.chart_generator.generate_price_chart(symbol, period='1mo')
+            # 同時生成價格走勢圖與技術指標圖，以一則 media group 發送
+            price_chart, technical_chart = self.chart_generator.generate_chart_pair(symbol, period='1mo', profile=profile)
             
             if price_chart:
+                self._reply_chart_group(update.message, self._chart_captions(symbol, price_chart, technical_chart))
                 loading_msg.delete()
-                
-                # 發送圖片
-                update.message.reply_photo(
-                    photo=price_chart,
-                    caption=f"📊 {symbol} 價格走勢圖 (1個月)\n\n包含：價格走勢、移動平均線、成交量"
-                )
-                
-                # 生成技術指標圖
-                technical_chart = self.chart_generator.generate_technical_chart(symbol, period='1mo')
-                
-                if technical_chart:
-                    update.message.reply_photo(
-                        photo=technical_chart,
-                        caption=f"📈 {symbol} 技術分析圖\n\n包含：RSI、MACD、布林通道、成交量分析"
-                    )
             else:
                 loading_msg.edit_text(f"❌ 無法生成 {symbol} 的圖表，請檢查股票代碼是否正確")
                 
@@ -679,28 +752,31 @@ class StockBot:
             return
         
         symbols = [arg.upper() for arg in context.args[:5]]  # 最多比較5支股票
+        profile = self._chart_profile(update.effective_user.id)
         
         loading_msg = update.message.reply_text("📊 正在生成比較圖表...")
         
         try:
             # 生成比較圖
-            comparison_chart = self.chart_generator.generate_comparison_chart(symbols, period='1mo')
+            comparison_chart = self.chart_generator.generate_comparison_chart(symbols, period='1mo', profile=profile)
             
             if comparison_chart:
                 loading_msg.delete()
                 
-                update.message.reply_photo(
-                    photo=comparison_chart,
-                    caption=f"📊 股票表現比較圖\n\n比較股票: {', '.join(symbols)}\n\n標準化價格以第一天為基準 (100%)"
+                self._reply_chart(
+                    update.message,
+                    comparison_chart,
+                    f"📊 股票表現比較圖\n\n比較股票: {', '.join(symbols)}\n\n標準化價格以第一天為基準 (100%)"
                 )
                 
                 # 生成相關性熱力圖
-                heatmap_chart = self.chart_generator.generate_heatmap_chart(symbols, period='1mo')
+                heatmap_chart = self.chart_generator.generate_heatmap_chart(symbols, profile=profile)
                 
                 if heatmap_chart:
-                    update.message.reply_photo(
-                        photo=heatmap_chart,
-                        caption=f"🔥 股票相關性熱力圖\n\n數值範圍：-1 (完全負相關) 到 +1 (完全正相關)"
+                    self._reply_chart(
+                        update.message,
+                        heatmap_chart,
+                        f"🔥 股票相關性熱力圖\n\n數值範圍：-1 (完全負相關) 到 +1 (完全正相關)"
                     )
             else:
                 loading_msg.edit_text("❌ 無法生成比較圖表，請檢查股票代碼是否正確")
@@ -709,6 +785,129 @@ class StockBot:
             logger.error(f"Error in compare command: {e}")
             loading_msg.edit_text("❌ 生成比較圖表時發生錯誤")
     
+    def heatmap_command(self, update: Update, context):
+        """相關性熱力圖命令（未指定股票時使用追蹤清單）"""
+        if context.args:
+            symbols = [arg.upper() for arg in context.args]
+        else:
+            symbols = [symbol for symbol, _, _ in self.db.get_user_watchlist(update.effective_user.id)]
+        
+        if len(symbols) < 2:
+            update.message.reply_text("請輸入至少兩個股票代碼，或先以 /add 將兩支以上股票加入追蹤清單")
+            return
+        
+        symbols = symbols[:HEATMAP_MAX_SYMBOLS]
+        profile = self._chart_profile(update.effective_user.id)
+        loading_msg = update.message.reply_text("🔥 正在計算相關性...")
+        
+        try:
+            heatmap_chart = self.chart_generator.generate_heatmap_chart(symbols, profile=profile)
+            
+            if heatmap_chart:
+                loading_msg.delete()
+                self._reply_chart(
+                    update.message,
+                    heatmap_chart,
+                    f"🔥 股票相關性熱力圖 ({len(symbols)} 支)\n\n"
+                    f"最近 {CORRELATION_WINDOW} 個交易日的日報酬率，-1 (完全負相關) 到 +1 (完全正相關)"
+                )
+            else:
+                loading_msg.edit_text("❌ 無法生成熱力圖，請檢查股票代碼是否正確")
+                
+        except Exception as e:
+            logger.error(f"Error in heatmap command: {e}")
+            loading_msg.edit_text("❌ 生成熱力圖時發生錯誤")
+    
+    def chartstyle_command(self, update: Update, context):
+        """圖表輸出設定命令"""
+        user_id = update.effective_user.id
+        
+        if not context.args:
+            current, _ = resolve_profile(self._chart_profile(user_id))
+            options = "\n".join(
+                f"• {name} - {'×'.join(str(inches * settings['dpi']) for inches in settings['figsize']['price'])} "
+                f"({settings['dpi']} dpi {settings['format']})"
+                for name, settings in CHART_OUTPUT_PROFILES.items()
+            )
+            update.message.reply_text(
+                f"🖼️ 目前圖表輸出設定：{current}\n\n可選設定：\n{options}\n\n"
+                f"使用 /chartstyle <設定> 變更，例如: /chartstyle mobile"
+            )
+            return
+        
+        profile = context.args[0].lower()
+        if profile not in CHART_OUTPUT_PROFILES:
+            update.message.reply_text(f"❌ 未知的設定，可選：{', '.join(CHART_OUTPUT_PROFILES)}")
+            return
+        
+        self.user_writer.update_preferences(user_id, chart_style=profile)
+        # 立即寫入，接下來的圖表命令就會使用新設定
+        self.user_writer.flush()
+        update.message.reply_text(f"✅ 圖表輸出設定已改為 {profile}")
+    
+    def backtest_command(self, update: Update, context):
+        """警報回測命令"""
+        if not context.args:
+            update.message.reply_text("請輸入股票代碼，例如: /backtest AAPL")
+            return
+        
+        symbol = context.args[0].upper()
+        user_id = update.effective_user.id
+        
+        alerts = [
+            (alert_type, threshold)
+            for alert_symbol, alert_type, threshold, _ in self.db.get_user_alerts(user_id)
+            if alert_symbol == symbol
+        ]
+        if not alerts:
+            update.message.reply_text(f"您沒有設定 {symbol} 的警報，請先使用 /alerts 設定")
+            return
+        
+        loading_msg = update.message.reply_text("⏪ 正在回測警報...")
+        
+        try:
+            backtester = AlertBacktester(self.stock_manager)
+            bars = backtester.load_bars(symbol, period='3mo', interval='1h')
+            
+            if bars is None or bars.empty:
+                loading_msg.edit_text(f"❌ 無法取得 {symbol} 的歷史資料")
+                return
+            
+            results = backtester.run(bars, alerts)
+            loading_msg.edit_text(format_report(symbol, results, bars))
+            
+        except Exception as e:
+            logger.error(f"Error in backtest command: {e}")
+            loading_msg.edit_text("❌ 回測警報時發生錯誤")
+    
+    def latency_command(self, update: Update, context):
+        """警報延遲統計命令（管理員）"""
+        if update.effective_user.id not in ADMIN_USER_IDS:
+            update.message.reply_text("❌ 此命令僅限管理員使用")
+            return
+        
+        report = self.alert_system.get_latency_report()
+        report += f"\n\n🖼️ 圖表輸出\n{self.chart_generator.render_service.get_output_report()}"
+        update.message.reply_text(f"```\n{report}\n```", parse_mode='Markdown')
+    
+    def compact_price_history_job(self, context):
+        """定期將報價歷史彙總成K線並刪除過期資料"""
+        try:
+            rolled, pruned = self.db.compact_price_history()
+            logger.info(f"Price history compacted: rolled {rolled}, pruned {pruned}")
+            # 新彙總出的日K線更新相關性（已有的收盤價不會重複計算）
+            self.correlation.add_bars(self.db.get_price_bars_since('1d', datetime.now() - timedelta(days=2)))
+        except Exception as e:
+            logger.error(f"Error compacting price history: {e}")
+    
+    def archive_price_bars_job(self, context):
+        """定期將彙總後的K線匯出到 Parquet 封存"""
+        try:
+            exported = self.price_archive.archive_price_bars(self.db)
+            logger.info(f"Price bars archived: {exported}")
+        except Exception as e:
+            logger.error(f"Error archiving price bars: {e}")
+    
     def run(self):
         """運行 Bot"""
         # 建立 Updater
@@ -716,7 +915,39 @@ class StockBot:
         dispatcher = self.updater.dispatcher
         
         # 初始化警報系統
-        self.alert_system = AlertSystem(self.updater.bot)
+        self.alert_system = AlertSystem(self.updater.bot, tick_recorder=self.tick_recorder)
+        # 啟動警報冷卻排程與發送佇列（會還原重啟前尚未結束的冷卻）
+        self.alert_system.start()
+        
+        # 警報檢查交給 job queue 定期執行，各股票的實際輪詢間隔由警報系統自行調整
+        self.updater.job_queue.run_repeating(
+            self.alert_system.check_alerts_job,
+            interval=ALERT_CHECK_INTERVAL,
+            first=ALERT_CHECK_INTERVAL,
+            name='alert_check'
+        )
+        
+        # 報價歷史彙總與保留期限清理
+        self.updater.job_queue.run_repeating(
+            self.compact_price_history_job,
+            interval=PRICE_COMPACTION_INTERVAL,
+            first=PRICE_COMPACTION_INTERVAL,
+            name='price_compaction'
+        )
+        
+        if self.price_archive:
+            self.updater.job_queue.run_repeating(
+                self.archive_price_bars_job,
+                interval=PRICE_ARCHIVE_INTERVAL,
+                first=PRICE_COMPACTION_INTERVAL,
+                name='price_archive'
+            )
+        
+        # 收盤後預先繪製熱門股票的圖表
+        self.chart_prerenderer.schedule(self.updater.job_queue)
+        
+        # 記錄用戶最後活動時間（group -1 先於命令處理器執行，不影響其他處理器）
+        dispatcher.add_handler(TypeHandler(Update, self.track_activity), group=-1)
         
         # 註冊命令處理器
         dispatcher.add_handler(CommandHandler("start", self.start))
@@ -731,10 +962,24 @@ class StockBot:
         dispatcher.add_handler(CommandHandler("strategy", self.strategy_command))
         dispatcher.add_handler(CommandHandler("chart", self.chart_command))
         dispatcher.add_handler(CommandHandler("compare", self.compare_command))
+        dispatcher.add_handler(CommandHandler("heatmap", self.heatmap_command))
+        dispatcher.add_handler(CommandHandler("chartstyle", self.chartstyle_command))
+        dispatcher.add_handler(CommandHandler("backtest", self.backtest_command))
+        dispatcher.add_handler(CommandHandler("latency", self.latency_command))
         
         # 註冊按鈕回調處理器
         dispatcher.add_handler(CallbackQueryHandler(self.button_callback))
         
+        # 由封存與資料庫的日K線還原相關性視窗
+        self.correlation.hydrate(self.db, self.price_archive)
+        
+        # 啟動圖表繪製工作程序
+        self.chart_generator.render_service.start()
+        
+        # 啟動報價記錄器與用戶資料寫入佇列
+        self.tick_recorder.start()
+        self.user_writer.start()
+        
         # 啟動 Bot
         logger.info("Starting Stock Bot...")
         
@@ -759,6 +1004,13 @@ class StockBot:
         
         # 保持運行
         self.updater.idle()
+        
+        # 關閉前送出剩餘警報並寫入剩餘報價與用戶資料
+        self.alert_system.stop()
+        self.tick_recorder.stop()
+        self.user_writer.stop()
+        self.chart_generator.render_service.stop()
+        self.db.close()
 
 if __name__ == "__main__":
     bot = StockBot()
@@ -0,0 +1,176 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from config import CHART_CACHE_SIZE, CHART_CACHE_DIR, CHART_CACHE_MAX_FILES
+
+class ChartImage(io.BytesIO):
+    """圖表圖片，帶有快取 key 以便發送後記錄 Telegram 的 file_id"""
+
+    def __init__(self, data, cache_key=None):
+        super().__init__(data)
+        self.cache_key = cache_key
+
+class ChartCache:
+    """已繪製圖表的快取
+
+    key 包含圖表種類、股票、期間、樣式、輸出設定檔與最後一根K線的時間，有新K線時 key 自然改變，
+    舊圖不會被取用。記憶體中以 LRU 保存 PNG bytes，並寫入磁碟供重啟後使用。
+    同一張圖同時被多人請求時只繪製一次，其他請求等待結果。
+    """
+
+    def __init__(self, max_entries=CHART_CACHE_SIZE, directory=CHART_CACHE_DIR, max_files=CHART_CACHE_MAX_FILES):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_files = max_files
+        self.logger = logging.getLogger(__name__)
+
+        self._entries = OrderedDict()  # digest -> PNG bytes
+        self._in_flight = {}           # digest -> {'done': Event, 'data': 繪製結果}
+        self._file_ids = {}            # digest -> Telegram file_id
+        self._lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.disk_hits = 0
+        self.renders = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(chart_type, symbols, period, style, last_bar, profile=None):
+        """產生快取 key；last_bar 為最後一根K線的時間（多檔股票時為各自的時間），profile 為輸出設定檔"""
+        raw = repr((chart_type, tuple(symbols), period, style, last_bar, profile))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, digest, extension='png'):
+        return os.path.join(self.directory, f"{digest}.{extension}")
+
+    def get(self, digest):
+        """取得快取的圖片 bytes（記憶體或磁碟），沒有時回傳 None"""
+        with self._lock:
+            data = self._entries.get(digest)
+            if data is not None:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return data
+
+        if self.directory:
+            try:
+                with open(self._path(digest), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            self._remember(digest, data)
+            with self._lock:
+                self.disk_hits += 1
+            return data
+
+        return None
+
+    def _remember(self, digest, data):
+        with self._lock:
+            self._entries[digest] = data
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, digest, data):
+        self._remember(digest, data)
+        if not self.directory:
+            return
+        try:
+            path = self._path(digest)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._prune_disk()
+        except OSError as e:
+            self.logger.warning(f"Error writing chart cache file: {e}")
+
+    def _prune_disk(self):
+        """磁碟上的圖檔超過上限時刪除最舊的"""
+        names = [name for name in os.listdir(self.directory) if name.endswith('.png')]
+        if len(names) <= self.max_files:
+            return
+        paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_files]:
+            for stale in (path, path[:-len('png')] + 'fileid'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def get_or_render(self, digest, render):
+        """取得快取的圖片，沒有時呼叫 render() 繪製（同一 key 同時只繪製一次）
+
+        render 回傳 BytesIO 或 None；回傳新的 ChartImage，呼叫端可以直接傳給 reply_photo
+        """
+        data = self.get(digest)
+        if data is not None:
+            return ChartImage(data, digest)
+
+        with self._lock:
+            flight = self._in_flight.get(digest)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[digest] = {'done': threading.Event(), 'data': None}
+
+        if not leader:
+            # 其他執行緒正在繪製同一張圖，直接使用它的結果
+            flight['done'].wait()
+            return ChartImage(flight['data'], digest) if flight['data'] is not None else None
+
+        try:
+            buffer = render()
+            with self._lock:
+                self.renders += 1
+            if buffer is not None:
+                flight['data'] = buffer.getvalue()
+                self.put(digest, flight['data'])
+        finally:
+            with self._lock:
+                del self._in_flight[digest]
+            flight['done'].set()
+
+        return ChartImage(flight['data'], digest) if flight['data'] is not None else None
+
+    def get_file_id(self, digest):
+        """已上傳過的圖表在 Telegram 的 file_id，沒有時回傳 None"""
+        with self._lock:
+            file_id = self._file_ids.get(digest)
+        if file_id is None and self.directory:
+            try:
+                with open(self._path(digest, 'fileid')) as f:
+                    file_id = f.read().strip() or None
+            except FileNotFoundError:
+                return None
+            if file_id:
+                with self._lock:
+                    self._file_ids[digest] = file_id
+        return file_id
+
+    def set_file_id(self, digest, file_id):
+        """記錄圖表上傳後的 file_id（同一個 bot token 重啟後仍有效）"""
+        with self._lock:
+            self._file_ids[digest] = file_id
+        if self.directory:
+            try:
+                with open(self._path(digest, 'fileid'), 'w') as f:
+                    f.write(file_id)
+            except OSError as e:
+                self.logger.warning(f"Error writing chart file_id: {e}")
+
+    def forget_file_id(self, digest):
+        """Telegram 拒絕 file_id 時移除，下次重新上傳"""
+        with self._lock:
+            self._file_ids.pop(digest, None)
+        if self.directory:
+            try:
+                os.remove(self._path(digest, 'fileid'))
+            except OSError:
+                pass
@@ -0,0 +1,556 @@
+"""
+以 matplotlib 物件導向 Figure API 繪製圖表（不使用 pyplot）
+
+每種圖表第一次繪製時建立範本：Figure、固定版面的子圖、線條/區塊/長條、
+標題、圖例、日期格式都只建立一次。之後的繪製只更新資料（set_data、set_verts、
+set_array）與座標範圍後輸出 PNG，不再執行 subplots、tight_layout 與
+bbox_inches='tight' 這些最耗時的步驟。
+
+資料點多於輸出像素時依像素寬度縮減（見 downsample）。
+範本依 (圖表種類, 樣式[, 股票數]) 保存，最多 CHART_TEMPLATE_CACHE_SIZE 個，
+最久未使用的範本釋放；樣式的 rcParams 為全域狀態，同一個 ChartEngine 的繪製以鎖序列化。
+
+輸出依設定檔（config.CHART_OUTPUT_PROFILES）決定尺寸、dpi 與格式，點陣化後由
+Pillow 編碼（PNG 可先量化成調色盤圖片），並記錄點陣化與編碼的耗時。
+"""
+
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import Normalize, to_rgba
+from matplotlib.figure import Figure
+import matplotlib.dates as mdates
+import matplotlib.style as mstyle
+import numpy as np
+import pandas as pd
+from PIL import Image
+from config import CHART_OUTPUT_PROFILES, DEFAULT_CHART_PROFILE, CHART_TEMPLATE_CACHE_SIZE
+from downsample import bucket_size, bucket_bounds, bucket_centers, bucket_max, bucket_min, bucket_absmax, minmax_indices
+
+# 設定中文字體
+matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'DejaVu Sans']
+matplotlib.rcParams['axes.unicode_minus'] = False
+
+UP_COLOR = to_rgba('green', 0.7)
+DOWN_COLOR = to_rgba('red', 0.7)
+BAR_PIXELS = 3  # 縮減後每根長條約佔的像素欄數
+HEATMAP_LABEL_LIMIT = 12  # 熱力圖超過這麼多檔時不顯示格子內的數值
+
+def resolve_profile(profile):
+    """輸出設定檔名稱與設定；未知名稱（例如舊的 chart_style 值 'line'）使用預設設定檔"""
+    if profile not in CHART_OUTPUT_PROFILES:
+        profile = DEFAULT_CHART_PROFILE
+    return profile, CHART_OUTPUT_PROFILES[profile]
+
+class EncodedChart(io.BytesIO):
+    """編碼後的圖表，附帶輸出設定檔與點陣化/編碼耗時（秒）"""
+
+    def __init__(self, data=b'', profile=DEFAULT_CHART_PROFILE, format='PNG', draw_seconds=0.0, encode_seconds=0.0):
+        super().__init__(data)
+        self.profile = profile
+        self.format = format
+        self.draw_seconds = draw_seconds
+        self.encode_seconds = encode_seconds
+
+def _date_numbers(index):
+    """時間索引轉成 matplotlib 的日期數值（不含時區）"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return mdates.date2num(index.values)
+
+def _values(df, column):
+    return df[column].to_numpy(dtype=np.float64)
+
+def _bar_width(x):
+    """長條寬度為K線間距中位數的 0.8 倍（日K為 0.8 天，與 ax.bar 預設相同）"""
+    if len(x) < 2:
+        return 0.8
+    return 0.8 * float(np.median(np.diff(x)))
+
+def _bar_verts(x, heights, width):
+    """一次產生所有長條的四個頂點，形狀為 (n, 4, 2)"""
+    left = x - width / 2
+    right = x + width / 2
+    zeros = np.zeros_like(heights)
+    heights = np.nan_to_num(heights)
+    return np.stack([
+        np.column_stack([left, zeros]),
+        np.column_stack([left, heights]),
+        np.column_stack([right, heights]),
+        np.column_stack([right, zeros]),
+    ], axis=1)
+
+def _band_verts(x, upper, lower):
+    """上下兩條線之間的區塊（跳過任一邊為 NaN 的點）"""
+    valid = ~(np.isnan(upper) | np.isnan(lower))
+    x, upper, lower = x[valid], upper[valid], lower[valid]
+    if len(x) == 0:
+        return []
+    return [np.concatenate([np.column_stack([x, upper]), np.column_stack([x[::-1], lower[::-1]])])]
+
+def _set_x_limits(ax, x, width=0.0):
+    span = x[-1] - x[0] if len(x) > 1 else 1.0
+    pad = max(span * 0.02, width)
+    ax.set_xlim(x[0] - pad, x[-1] + pad)
+
+def _set_y_limits(ax, *series, floor=None):
+    """依資料設定 y 範圍並保留 5% 邊界（relim 不會計算 collection，手動設定）"""
+    values = np.concatenate([np.asarray(s, dtype=np.float64).ravel() for s in series])
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return
+    low, high = values.min(), values.max()
+    margin = (high - low) * 0.05 or abs(high) * 0.05 or 1.0
+    ax.set_ylim(low - margin if floor is None else floor, high + margin)
+
+def _new_bars(ax, **kwargs):
+    bars = PolyCollection([], **kwargs)
+    ax.add_collection(bars, autolim=False)
+    return bars
+
+def _date_axis(ax):
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
+    ax.tick_params(axis='x', labelrotation=45)
+
+def _day_locator(x, ticks):
+    """依時間跨度（而非K線數）決定刻度間隔，分鐘K與日K都約有 ticks 個刻度"""
+    span = x[-1] - x[0] if len(x) > 1 else 1.0
+    return mdates.DayLocator(interval=max(1, int(span / ticks)))
+
+class _Template:
+    """圖表範本：建立一次 Figure 與所有 artist，之後只更新資料"""
+
+    figsize = (12, 8)
+
+    def __init__(self, style, downsample=True):
+        self.style = style
+        self.downsample = downsample
+        self.facecolor = '#1e1e1e' if style == 'dark_background' else 'white'
+        self.figure = Figure(figsize=self.figsize, facecolor=self.facecolor)
+        FigureCanvasAgg(self.figure)
+        self._legend_keys = {}
+        self.build()
+        # 版面邊界以 figsize 的比例設定，其他尺寸下換算成相同的英吋寬度，刻度標籤不會被裁掉
+        pars = self.figure.subplotpars
+        self._margins = (pars.left, pars.right, pars.top, pars.bottom)
+
+    def build(self):
+        raise NotImplementedError
+
+    def update(self, *args):
+        raise NotImplementedError
+
+    def resize(self, figsize, dpi):
+        """套用輸出設定檔的尺寸與 dpi（版面以比例設定，不必重建範本）"""
+        if tuple(self.figure.get_size_inches()) != tuple(figsize):
+            (width, height), (base_width, base_height) = figsize, self.figsize
+            left, right, top, bottom = self._margins
+            self.figure.set_size_inches(figsize)
+            self.figure.subplots_adjust(left=left * base_width / width, right=1 - (1 - right) * base_width / width,
+                                        top=1 - (1 - top) * base_height / height, bottom=bottom * base_height / height)
+        self.figure.set_dpi(dpi)
+
+    def close(self):
+        """釋放 Figure 的所有 artist 與點陣化緩衝區"""
+        self.figure.clear()
+        self.figure.canvas.__dict__.pop('renderer', None)
+
+    def _columns(self, ax):
+        """子圖在目前 dpi 下的像素寬度，不縮減時回傳 None"""
+        if not self.downsample:
+            return None
+        return max(1, int(ax.get_position().width * self.figure.bbox.width))
+
+    def _plot_line(self, line, ax, x, y):
+        """更新線條資料；點數多於像素欄時每欄保留最高與最低點"""
+        columns = self._columns(ax)
+        if columns:
+            indices = minmax_indices(y, columns)
+            x, y = x[indices], y[indices]
+        line.set_data(x, y)
+
+    def _plot_band(self, band, ax, x, upper, lower):
+        """更新上下線之間的區塊；分桶時取每桶的最高上緣與最低下緣"""
+        columns = self._columns(ax)
+        size = bucket_size(len(x), columns) if columns else 1
+        if size > 1:
+            x, upper, lower = bucket_centers(x, size), bucket_max(upper, size), bucket_min(lower, size)
+        band.set_verts(_band_verts(x, upper, lower))
+
+    def _bar_bucket(self, ax, x):
+        """長條的分桶大小（不縮減時為 1）"""
+        columns = self._columns(ax)
+        return bucket_size(len(x), columns // BAR_PIXELS) if columns else 1
+
+    def _plot_volume(self, bars, ax, x, width, volume, open_, close):
+        """更新成交量長條並依漲跌上色；分桶時取最大成交量，以桶內第一根開盤與最後一根收盤判斷漲跌"""
+        size = self._bar_bucket(ax, x)
+        if size > 1:
+            starts, ends = bucket_bounds(len(x), size)
+            falling = close[ends] < open_[starts]
+            x, volume = bucket_centers(x, size), bucket_max(volume, size)
+            width = _bar_width(x)
+        else:
+            falling = close < open_
+        bars.set_verts(_bar_verts(x, volume, width))
+        bars.set_facecolor(np.where(falling[:, None], DOWN_COLOR, UP_COLOR))
+
+    def _legend(self, ax, artists, **kwargs):
+        """可見的 artist 組合改變時才重建圖例"""
+        visible = [artist for artist in artists if artist.get_visible()]
+        key = tuple(artist.get_label() for artist in visible)
+        if self._legend_keys.get(ax) != key:
+            ax.legend(handles=visible, **kwargs)
+            self._legend_keys[ax] = key
+
+    def save(self, profile):
+        """依輸出設定檔點陣化並編碼，回傳 EncodedChart"""
+        name, settings = resolve_profile(profile)
+        start = time.perf_counter()
+        self.figure.set_dpi(settings['dpi'])
+        self.figure.canvas.draw()
+        drawn = time.perf_counter()
+
+        image = Image.fromarray(np.asarray(self.figure.canvas.buffer_rgba())).convert('RGB')
+        image_format = settings['format'].upper()
+        if image_format == 'PNG':
+            options = {'compress_level': settings.get('compress_level', 6)}
+            if settings.get('colors'):
+                # 圖表多為純色，量化成調色盤 PNG 檔案小很多，壓縮也較快
+                image = image.quantize(settings['colors'], method=Image.Quantize.FASTOCTREE)
+        else:
+            options = {'quality': settings.get('quality', 85)}
+            if image_format == 'WEBP':
+                options['method'] = settings.get('method', 4)
+
+        output = EncodedChart(profile=name, format=image_format)
+        image.save(output, image_format, **options)
+        output.seek(0)
+        output.draw_seconds = drawn - start
+        output.encode_seconds = time.perf_counter() - drawn
+        return output
+
+class PriceTemplate(_Template):
+    """價格走勢圖：價格/均線/高低價範圍 + 成交量"""
+
+    def build(self):
+        fig = self.figure
+        self.ax_price, self.ax_volume = fig.subplots(2, 1, height_ratios=[3, 1])
+        fig.subplots_adjust(left=0.08, right=0.97, top=0.92, bottom=0.1, hspace=0.3)
+        self.title = fig.suptitle('', fontsize=16, fontweight='bold')
+
+        ax1, ax2 = self.ax_price, self.ax_volume
+        self.close_line, = ax1.plot([], [], label='收盤價', linewidth=2, color='#00ff88')
+        self.open_line, = ax1.plot([], [], label='開盤價', linewidth=1, color='#ff8800', alpha=0.7)
+        self.range_band = _new_bars(ax1, alpha=0.3, facecolor='#888888', label='高低價範圍')
+        self.ma20_line, = ax1.plot([], [], label='20日均線', color='#ff0088', linewidth=1.5)
+        self.ma50_line, = ax1.plot([], [], label='50日均線', color='#8800ff', linewidth=1.5)
+        ax1.set_ylabel('價格 ($)', fontsize=12)
+        ax1.grid(True, alpha=0.3)
+
+        self.volume_bars = _new_bars(ax2, label='成交量')
+        ax2.set_ylabel('成交量', fontsize=12)
+        ax2.set_xlabel('日期', fontsize=12)
+        ax2.grid(True, alpha=0.3)
+
+        for ax in (ax1, ax2):
+            _date_axis(ax)
+
+    def update(self, symbol, df):
+        x = _date_numbers(df.index)
+        close, open_, high, low = (_values(df, c) for c in ('Close', 'Open', 'High', 'Low'))
+        volume = _values(df, 'Volume')
+        width = _bar_width(x)
+
+        self.title.set_text(f'{symbol} 價格走勢圖')
+        self._plot_line(self.close_line, self.ax_price, x, close)
+        self._plot_line(self.open_line, self.ax_price, x, open_)
+        self._plot_band(self.range_band, self.ax_price, x, high, low)
+
+        # 移動平均線（資料不足時隱藏）
+        visible_ma = []
+        for line, window in ((self.ma20_line, 20), (self.ma50_line, 50)):
+            line.set_visible(len(df) >= window)
+            if len(df) >= window:
+                ma = df['Close'].rolling(window=window).mean().to_numpy(dtype=np.float64)
+                self._plot_line(line, self.ax_price, x, ma)
+                visible_ma.append(ma)
+
+        self._legend(self.ax_price, [self.close_line, self.open_line, self.range_band,
+                                     self.ma20_line, self.ma50_line], loc='upper left')
+        _set_y_limits(self.ax_price, close, open_, high, low, *visible_ma)
+
+        self._plot_volume(self.volume_bars, self.ax_volume, x, width, volume, open_, close)
+        _set_y_limits(self.ax_volume, volume, floor=0)
+
+        for ax in (self.ax_price, self.ax_volume):
+            _set_x_limits(ax, x, width)
+            ax.xaxis.set_major_locator(_day_locator(x, 10))
+
+class TechnicalTemplate(_Template):
+    """技術分析圖：RSI、MACD、布林通道、成交量"""
+
+    figsize = (15, 10)
+
+    def build(self):
+        fig = self.figure
+        (ax1, ax2), (ax3, ax4) = fig.subplots(2, 2)
+        fig.subplots_adjust(left=0.06, right=0.98, top=0.91, bottom=0.08, hspace=0.35, wspace=0.18)
+        self.axes = (ax1, ax2, ax3, ax4)
+        self.title = fig.suptitle('', fontsize=16, fontweight='bold')
+
+        # RSI 圖
+        self.rsi_line, = ax1.plot([], [], color='#00ff88', linewidth=2, label='RSI')
+        ax1.axhline(y=70, color='red', linestyle='--', alpha=0.7, label='超買線')
+        ax1.axhline(y=30, color='green', linestyle='--', alpha=0.7, label='超賣線')
+        ax1.set_ylabel('RSI', fontsize=12)
+        ax1.set_title('相對強弱指數 (RSI)', fontsize=12)
+        ax1.legend()
+        ax1.set_ylim(0, 100)
+
+        # MACD 圖
+        self.macd_line, = ax2.plot([], [], color='#00ff88', linewidth=2, label='MACD')
+        self.signal_line, = ax2.plot([], [], color='#ff8800', linewidth=2, label='Signal')
+        self.histogram_bars = _new_bars(ax2, facecolor='#888888', alpha=0.7, label='Histogram')
+        ax2.set_ylabel('MACD', fontsize=12)
+        ax2.set_title('MACD 指標', fontsize=12)
+        ax2.legend(handles=[self.macd_line, self.signal_line, self.histogram_bars])
+
+        # 布林通道圖
+        self.bb_close_line, = ax3.plot([], [], color='#00ff88', linewidth=2, label='收盤價')
+        self.bb_upper_line, = ax3.plot([], [], color='#ff0088', linewidth=1.5, label='上軌', alpha=0.7)
+        self.bb_middle_line, = ax3.plot([], [], color='#888888', linewidth=1.5, label='中軌', alpha=0.7)
+        self.bb_lower_line, = ax3.plot([], [], color='#ff0088', linewidth=1.5, label='下軌', alpha=0.7)
+        self.bb_band = _new_bars(ax3, alpha=0.1, facecolor='#888888')
+        ax3.set_ylabel('價格 ($)', fontsize=12)
+        ax3.set_title('布林通道', fontsize=12)
+        ax3.legend(handles=[self.bb_close_line, self.bb_upper_line, self.bb_middle_line, self.bb_lower_line])
+
+        # 成交量圖
+        self.volume_bars = _new_bars(ax4, label='成交量')
+        self.volume_sma_line, = ax4.plot([], [], color='#ff8800', linewidth=2, label='成交量均線')
+        ax4.set_ylabel('成交量', fontsize=12)
+        ax4.set_title('成交量分析', fontsize=12)
+
+        for ax in self.axes:
+            ax.grid(True, alpha=0.3)
+            _date_axis(ax)
+
+    def update(self, symbol, df):
+        x = _date_numbers(df.index)
+        width = _bar_width(x)
+        close, open_ = _values(df, 'Close'), _values(df, 'Open')
+
+        self.title.set_text(f'{symbol} 技術分析圖')
+        ax_rsi, ax_macd, ax_bb, ax_volume = self.axes
+        self._plot_line(self.rsi_line, ax_rsi, x, _values(df, 'RSI'))
+
+        macd, signal, histogram = (_values(df, c) for c in ('MACD', 'MACD_Signal', 'MACD_Histogram'))
+        self._plot_line(self.macd_line, ax_macd, x, macd)
+        self._plot_line(self.signal_line, ax_macd, x, signal)
+        size = self._bar_bucket(ax_macd, x)
+        if size > 1:
+            centers = bucket_centers(x, size)
+            self.histogram_bars.set_verts(_bar_verts(centers, bucket_absmax(histogram, size), _bar_width(centers)))
+        else:
+            self.histogram_bars.set_verts(_bar_verts(x, histogram, width))
+        _set_y_limits(ax_macd, macd, signal, histogram, 0.0)
+
+        upper, middle, lower = (_values(df, c) for c in ('BB_Upper', 'BB_Middle', 'BB_Lower'))
+        for line, values in ((self.bb_close_line, close), (self.bb_upper_line, upper),
+                             (self.bb_middle_line, middle), (self.bb_lower_line, lower)):
+            self._plot_line(line, ax_bb, x, values)
+        self._plot_band(self.bb_band, ax_bb, x, upper, lower)
+        _set_y_limits(ax_bb, close, upper, lower)
+
+        volume = _values(df, 'Volume')
+        self._plot_volume(self.volume_bars, ax_volume, x, width, volume, open_, close)
+        has_sma = 'Volume_SMA' in df.columns
+        self.volume_sma_line.set_visible(has_sma)
+        if has_sma:
+            self._plot_line(self.volume_sma_line, ax_volume, x, _values(df, 'Volume_SMA'))
+        self._legend(ax_volume, [self.volume_bars, self.volume_sma_line])
+        _set_y_limits(ax_volume, volume, floor=0)
+
+        for ax in self.axes:
+            _set_x_limits(ax, x, width)
+            ax.xaxis.set_major_locator(_day_locator(x, 8))
+
+class ComparisonTemplate(_Template):
+    """多股票比較圖（最多5條標準化價格線）"""
+
+    COLORS = ['#00ff88', '#ff8800', '#0088ff', '#ff0088', '#8800ff']
+
+    def build(self):
+        fig = self.figure
+        self.ax = ax = fig.subplots()
+        fig.subplots_adjust(left=0.08, right=0.97, top=0.92, bottom=0.12)
+        self.lines = [ax.plot([], [], color=color, linewidth=2)[0] for color in self.COLORS]
+
+        ax.set_ylabel('標準化價格 (%)', fontsize=12)
+        ax.set_xlabel('日期', fontsize=12)
+        ax.set_title('股票表現比較', fontsize=16, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        _date_axis(ax)
+
+    def update(self, histories):
+        xs, ys = [], []
+        for line in self.lines:
+            line.set_visible(False)
+
+        for i, (symbol, df) in enumerate(histories):
+            if df is None:
+                continue
+            line = self.lines[i % len(self.lines)]
+            # 標準化價格（以第一天為基準）
+            close = _values(df, 'Close')
+            x, normalized_price = _date_numbers(df.index), close / close[0] * 100
+            self._plot_line(line, self.ax, x, normalized_price)
+            line.set_label(symbol)
+            line.set_visible(True)
+            xs.append(x)
+            ys.append(normalized_price)
+
+        if not xs:
+            return
+        self._legend(self.ax, self.lines)
+        x = np.concatenate(xs)
+        self.ax.set_xlim(x.min(), x.max())
+        # 原本每 7 天一個刻度，期間較長時依跨度放寬
+        span = x.max() - x.min()
+        self.ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(7, int(span / 10))))
+        _set_y_limits(self.ax, *ys)
+
+class HeatmapTemplate(_Template):
+    """相關性熱力圖（依股票數建立，格子、數值標籤與色條只建立一次）
+
+    股票數超過 HEATMAP_LABEL_LIMIT 時格子太小，不顯示數值標籤並縮小股票代碼。
+    """
+
+    figsize = (10, 8)
+
+    def __init__(self, style, size, downsample=True):
+        self.size = size
+        super().__init__(style, downsample)
+
+    def build(self):
+        fig, n = self.figure, self.size
+        self.ax = ax = fig.subplots()
+        fig.subplots_adjust(left=0.12, right=0.98, top=0.92, bottom=0.12)
+        self.norm = Normalize(vmin=-1, vmax=1)
+        self.cmap = matplotlib.colormaps['RdYlBu_r']
+        self.mesh = ax.pcolormesh(np.zeros((n, n)), cmap=self.cmap, norm=self.norm,
+                                  edgecolors='white', linewidth=0.5)
+        fig.colorbar(self.mesh, ax=ax, shrink=0.8)
+        labeled = n <= HEATMAP_LABEL_LIMIT
+        self.labels = [[ax.text(j + 0.5, i + 0.5, '', ha='center', va='center') for j in range(n)]
+                       for i in range(n)] if labeled else []
+
+        ax.set_xlim(0, n)
+        ax.set_ylim(n, 0)  # 第一列在上方
+        ax.set_aspect('equal')
+        ax.set_xticks(np.arange(n) + 0.5)
+        ax.set_yticks(np.arange(n) + 0.5)
+        ax.tick_params(length=0)
+        ax.tick_params(axis='x', labelrotation=45 if labeled else 90)
+        if not labeled:
+            ax.tick_params(labelsize=max(5, 10 - n // 10))
+        ax.set_title('股票相關性熱力圖', fontsize=16, fontweight='bold')
+
+    def update(self, correlation_matrix):
+        values = correlation_matrix.to_numpy(dtype=np.float64)
+        self.mesh.set_array(np.ma.masked_invalid(values).ravel())
+
+        colors = self.cmap(self.norm(np.nan_to_num(values)))
+        luminance = colors[..., :3] @ np.array([0.2126, 0.7152, 0.0722])
+        for i, row in enumerate(self.labels):
+            for j, label in enumerate(row):
+                value = values[i, j]
+                label.set_text('' if np.isnan(value) else f'{value:.2g}')
+                label.set_color('black' if luminance[i, j] > 0.408 else 'white')
+
+        names = list(correlation_matrix.columns)
+        self.ax.set_xticklabels(names)
+        self.ax.set_yticklabels(names)
+
+class ChartEngine:
+    """保存圖表範本並以更新資料的方式繪圖，回傳 EncodedChart，失敗時回傳 None
+
+    downsample 為 False 時繪製所有資料點（效能測試比較用）
+    """
+
+    def __init__(self, downsample=True, max_templates=CHART_TEMPLATE_CACHE_SIZE):
+        self.downsample = downsample
+        self.max_templates = max_templates
+        self.logger = logging.getLogger(__name__)
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _template(self, key, factory):
+        template = self._templates.get(key)
+        if template is not None:
+            self._templates.move_to_end(key)
+            return template
+
+        template = self._templates[key] = factory()
+        # 每個範本保留自己的 Figure 與點陣化緩衝區，熱力圖的股票數各不相同，不限制會持續增加
+        while len(self._templates) > self.max_templates:
+            self._templates.popitem(last=False)[1].close()
+        return template
+
+    def _render(self, key, factory, style, profile, *args):
+        with self._lock, mstyle.context(style):
+            try:
+                template = self._template(key, factory)
+                # 先套用輸出尺寸與 dpi，縮減資料點時依實際像素寬度計算
+                settings = resolve_profile(profile)[1]
+                template.resize(settings.get('figsize', {}).get(key[0], template.figsize), settings['dpi'])
+                template.update(*args)
+                return template.save(profile)
+            except Exception:
+                # 範本可能停在更新到一半的狀態，下次重新建立
+                self._templates.pop(key, None)
+                raise
+
+    def render_price_chart(self, symbol, df, style, profile=DEFAULT_CHART_PROFILE):
+        try:
+            return self._render(('price', style), lambda: PriceTemplate(style, self.downsample), style, profile, symbol, df)
+        except Exception as e:
+            self.logger.error(f"Error generating price chart for {symbol}: {e}")
+            return None
+
+    def render_technical_chart(self, symbol, df, style, profile=DEFAULT_CHART_PROFILE):
+        try:
+            return self._render(('technical', style), lambda: TechnicalTemplate(style, self.downsample), style, profile, symbol, df)
+        except Exception as e:
+            self.logger.error(f"Error generating technical chart for {symbol}: {e}")
+            return None
+
+    def render_comparison_chart(self, histories, style, profile=DEFAULT_CHART_PROFILE):
+        try:
+            return self._render(('comparison', style), lambda: ComparisonTemplate(style, self.downsample), style, profile, histories)
+        except Exception as e:
+            self.logger.error(f"Error generating comparison chart: {e}")
+            return None
+
+    def render_heatmap_chart(self, correlation_matrix, profile=DEFAULT_CHART_PROFILE):
+        try:
+            size = len(correlation_matrix)
+            return self._render(('heatmap', size), lambda: HeatmapTemplate('default', size, self.downsample), 'default', profile, correlation_matrix)
+        except Exception as e:
+            self.logger.error(f"Error generating heatmap chart: {e}")
+            return None
+
+    def warm_up(self, style='dark_background'):
+        """預先建立常用範本並繪製一次（載入字型、快取文字排版）"""
+        with self._lock, mstyle.context(style):
+            for key, factory in ((('price', style), lambda: PriceTemplate(style, self.downsample)),
+                                 (('technical', style), lambda: TechnicalTemplate(style, self.downsample)),
+                                 (('comparison', style), lambda: ComparisonTemplate(style, self.downsample))):
+                self._template(key, factory).figure.canvas.draw()
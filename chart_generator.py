@@ -1,233 +1,203 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
-import io
-import seaborn as sns
 from stock_data import StockDataManager
+from chart_cache import ChartCache
+from chart_render import ChartRenderService
+from chart_engine import resolve_profile
+from correlation import CorrelationEngine
+from config import (PRICE_MATRIX_TTL, CORRELATION_WINDOW, CORRELATION_MIN_PERIODS, CORRELATION_HISTORY_PERIOD, HEATMAP_MAX_SYMBOLS,
+                    CHART_PAIR_THREADS)
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import logging
-
-# 設定中文字體
-plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'DejaVu Sans']
-plt.rcParams['axes.unicode_minus'] = False
+import threading
+import time
+import pandas as pd
 
 class ChartGenerator:
-    def __init__(self):
-        self.stock_manager = StockDataManager()
+    def __init__(self, chart_cache=None, render_service=None, stock_manager=None):
+        # 與 bot 共用 StockDataManager，共用歷史資料快取、速率限制與封存
+        self.stock_manager = stock_manager or StockDataManager(correlation=CorrelationEngine())
+        self.chart_cache = chart_cache or ChartCache()
+        # 實際繪圖在工作程序內進行，未啟動時在本程序內序列化繪製
+        self.render_service = render_service or ChartRenderService()
         self.logger = logging.getLogger(__name__)
+        
+        # 最近載入的收盤價矩陣 (symbols, period) -> (matrix, 載入時間)
+        self._matrices = OrderedDict()
+        self._matrices_lock = threading.Lock()
+        
+        # 價格走勢圖與技術指標圖同時繪製時，技術指標圖在這裡等待繪製結果
+        self._pair_executor = ThreadPoolExecutor(max_workers=CHART_PAIR_THREADS, thread_name_prefix="chart-pair")
     
-    def generate_price_chart(self, symbol, period='1mo', style='dark_background'):
-        """生成價格走勢圖"""
+    @staticmethod
+    def _last_bar(df):
+        """最後一根K線的當地時間與收盤價（盤中K線仍在變動，收盤後才固定）"""
+        return df.index[-1].strftime('%Y-%m-%dT%H:%M'), round(float(df['Close'].iloc[-1]), 6)
+    
+    def generate_price_chart(self, symbol, period='1mo', style='dark_background', profile=None):
+        """生成價格走勢圖（同一根最新K線的圖只繪製一次）
+        
+        profile 為輸出設定檔名稱（用戶偏好 chart_style），未知或 None 時使用預設設定檔
+        """
         try:
+            profile, _ = resolve_profile(profile)
             # 取得歷史資料
             df = self.stock_manager.get_historical_data(symbol, period=period)
             if df is None or df.empty:
                 return None
             
-            # 設定圖表樣式
-            plt.style.use(style)
-            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), height_ratios=[3, 1])
-            fig.suptitle(f'{symbol} 價格走勢圖', fontsize=16, fontweight='bold')
-            
-            # 主圖：價格和成交量
-            ax1.plot(df.index, df['Close'], label='收盤價', linewidth=2, color='#00ff88')
-            ax1.plot(df.index, df['Open'], label='開盤價', linewidth=1, color='#ff8800', alpha=0.7)
-            ax1.fill_between(df.index, df['High'], df['Low'], alpha=0.3, color='#888888', label='高低價範圍')
-            
-            # 添加移動平均線
-            if len(df) >= 20:
-                ma20 = df['Close'].rolling(window=20).mean()
-                ax1.plot(df.index, ma20, label='20日均線', color='#ff0088', linewidth=1.5)
-            
-            if len(df) >= 50:
-                ma50 = df['Close'].rolling(window=50).mean()
-                ax1.plot(df.index, ma50, label='50日均線', color='#8800ff', linewidth=1.5)
-            
-            ax1.set_ylabel('價格 ($)', fontsize=12)
-            ax1.legend(loc='upper left')
-            ax1.grid(True, alpha=0.3)
-            
-            # 成交量圖
-            colors = ['red' if close < open else 'green' for close, open in zip(df['Close'], df['Open'])]
-            ax2.bar(df.index, df['Volume'], color=colors, alpha=0.7, label='成交量')
-            ax2.set_ylabel('成交量', fontsize=12)
-            ax2.set_xlabel('日期', fontsize=12)
-            ax2.grid(True, alpha=0.3)
-            
-            # 格式化日期軸
-            for ax in [ax1, ax2]:
-                ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-                ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(1, len(df)//10)))
-                plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
-            
-            plt.tight_layout()
-            
-            # 轉換為 bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
-                       facecolor='#1e1e1e' if style == 'dark_background' else 'white')
-            img_buffer.seek(0)
-            plt.close()
-            
-            return img_buffer
+            return self._price_chart(symbol, df, period, style, profile)
             
         except Exception as e:
             self.logger.error(f"Error generating price chart for {symbol}: {e}")
             return None
     
-    def generate_technical_chart(self, symbol, period='1mo', style='dark_background'):
-        """生成技術指標圖"""
+    def _price_chart(self, symbol, df, period, style, profile):
+        key = ChartCache.make_key('price', [symbol], period, style, self._last_bar(df), profile)
+        return self.chart_cache.get_or_render(
+            key, lambda: self.render_service.render('price', symbol, df, style, profile=profile))
+    
+    def generate_technical_chart(self, symbol, period='1mo', style='dark_background', profile=None):
+        """生成技術指標圖（同一根最新K線的圖只繪製一次）"""
         try:
-            # 取得歷史資料並計算技術指標
+            profile, _ = resolve_profile(profile)
+            # 取得歷史資料
             df = self.stock_manager.get_historical_data(symbol, period=period)
             if df is None or df.empty:
                 return None
             
-            df = self.stock_manager.calculate_technical_indicators(df)
-            if df is None:
-                return None
-            
-            # 設定圖表樣式
-            plt.style.use(style)
-            fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
-            fig.suptitle(f'{symbol} 技術分析圖', fontsize=16, fontweight='bold')
-            
-            # RSI 圖
-            ax1.plot(df.index, df['RSI'], color='#00ff88', linewidth=2, label='RSI')
-            ax1.axhline(y=70, color='red', linestyle='--', alpha=0.7, label='超買線')
-            ax1.axhline(y=30, color='green', linestyle='--', alpha=0.7, label='超賣線')
-            ax1.set_ylabel('RSI', fontsize=12)
-            ax1.set_title('相對強弱指數 (RSI)', fontsize=12)
-            ax1.legend()
-            ax1.grid(True, alpha=0.3)
-            ax1.set_ylim(0, 100)
-            
-            # MACD 圖
-            ax2.plot(df.index, df['MACD'], color='#00ff88', linewidth=2, label='MACD')
-            ax2.plot(df.index, df['MACD_Signal'], color='#ff8800', linewidth=2, label='Signal')
-            ax2.bar(df.index, df['MACD_Histogram'], color='#888888', alpha=0.7, label='Histogram')
-            ax2.set_ylabel('MACD', fontsize=12)
-            ax2.set_title('MACD 指標', fontsize=12)
-            ax2.legend()
-            ax2.grid(True, alpha=0.3)
-            
-            # 布林通道圖
-            ax3.plot(df.index, df['Close'], color='#00ff88', linewidth=2, label='收盤價')
-            ax3.plot(df.index, df['BB_Upper'], color='#ff0088', linewidth=1.5, label='上軌', alpha=0.7)
-            ax3.plot(df.index, df['BB_Middle'], color='#888888', linewidth=1.5, label='中軌', alpha=0.7)
-            ax3.plot(df.index, df['BB_Lower'], color='#ff0088', linewidth=1.5, label='下軌', alpha=0.7)
-            ax3.fill_between(df.index, df['BB_Upper'], df['BB_Lower'], alpha=0.1, color='#888888')
-            ax3.set_ylabel('價格 ($)', fontsize=12)
-            ax3.set_title('布林通道', fontsize=12)
-            ax3.legend()
-            ax3.grid(True, alpha=0.3)
-            
-            # 成交量圖
-            colors = ['red' if close < open else 'green' for close, open in zip(df['Close'], df['Open'])]
-            ax4.bar(df.index, df['Volume'], color=colors, alpha=0.7, label='成交量')
-            if 'Volume_SMA' in df.columns:
-                ax4.plot(df.index, df['Volume_SMA'], color='#ff8800', linewidth=2, label='成交量均線')
-            ax4.set_ylabel('成交量', fontsize=12)
-            ax4.set_title('成交量分析', fontsize=12)
-            ax4.legend()
-            ax4.grid(True, alpha=0.3)
-            
-            # 格式化日期軸
-            for ax in [ax1, ax2, ax3, ax4]:
-                ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-                ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(1, len(df)//8)))
-                plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
-            
-            plt.tight_layout()
-            
-            # 轉換為 bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight',
-                       facecolor='#1e1e1e' if style == 'dark_background' else 'white')
-            img_buffer.seek(0)
-            plt.close()
-            
-            return img_buffer
+            return self._technical_chart(symbol, df, period, style, profile)
             
         except Exception as e:
             self.logger.error(f"Error generating technical chart for {symbol}: {e}")
             return None
     
-    def generate_comparison_chart(self, symbols, period='1mo', style='dark_background'):
-        """生成多股票比較圖"""
+    def _technical_chart(self, symbol, df, period, style, profile):
+        key = ChartCache.make_key('technical', [symbol], period, style, self._last_bar(df), profile)
+        return self.chart_cache.get_or_render(key, lambda: self._render_technical_chart(symbol, df, style, profile))
+    
+    def generate_chart_pair(self, symbol, period='1mo', style='dark_background', profile=None):
+        """同時生成價格走勢圖與技術指標圖，回傳 (price_chart, technical_chart)，失敗的圖為 None
+        
+        歷史資料只取得一次，技術指標圖交給另一個執行緒，兩張圖在不同的繪圖程序同時繪製。
+        """
         try:
-            plt.style.use(style)
-            fig, ax = plt.subplots(figsize=(12, 8))
-            
-            colors = ['#00ff88', '#ff8800', '#0088ff', '#ff0088', '#8800ff']
-            
-            for i, symbol in enumerate(symbols[:5]):  # 最多比較5支股票
-                df = self.stock_manager.get_historical_data(symbol, period=period)
-                if df is not None and not df.empty:
-                    # 標準化價格（以第一天為基準）
-                    normalized_price = df['Close'] / df['Close'].iloc[0] * 100
-                    ax.plot(df.index, normalized_price, 
-                           label=symbol, color=colors[i % len(colors)], linewidth=2)
-            
-            ax.set_ylabel('標準化價格 (%)', fontsize=12)
-            ax.set_xlabel('日期', fontsize=12)
-            ax.set_title('股票表現比較', fontsize=16, fontweight='bold')
-            ax.legend()
-            ax.grid(True, alpha=0.3)
-            
-            # 格式化日期軸
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-            ax.xaxis.set_major_locator(mdates.DayLocator(interval=7))
-            plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
-            
-            plt.tight_layout()
-            
-            # 轉換為 bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight',
-                       facecolor='#1e1e1e' if style == 'dark_background' else 'white')
-            img_buffer.seek(0)
-            plt.close()
+            profile, _ = resolve_profile(profile)
+            df = self.stock_manager.get_historical_data(symbol, period=period)
+            if df is None or df.empty:
+                return None, None
+            
+            technical = self._pair_executor.submit(self._technical_chart, symbol, df, period, style, profile)
+            try:
+                price_chart = self._price_chart(symbol, df, period, style, profile)
+            except Exception as e:
+                self.logger.error(f"Error generating price chart for {symbol}: {e}")
+                price_chart = None
+            
+            try:
+                technical_chart = technical.result()
+            except Exception as e:
+                self.logger.error(f"Error generating technical chart for {symbol}: {e}")
+                technical_chart = None
+            return price_chart, technical_chart
             
-            return img_buffer
+        except Exception as e:
+            self.logger.error(f"Error generating charts for {symbol}: {e}")
+            return None, None
+    
+    def _render_technical_chart(self, symbol, df, style, profile):
+        # 技術指標在本程序計算（不修改快取中的歷史資料），只把繪圖需要的欄位交給工作程序
+        df = self.stock_manager.calculate_technical_indicators(df.copy())
+        if df is None:
+            return None
+        return self.render_service.render('technical', symbol, df, style, profile=profile)
+    
+    def load_price_matrix(self, symbols, period='1mo'):
+        """批次載入多檔股票的收盤價並對齊成寬表（欄為股票，依 symbols 順序，沒有資料的股票不含在內）
+        
+        PRICE_MATRIX_TTL 秒內相同的 symbols 與期間直接回傳同一個矩陣。
+        載入的日K線同時加入 CorrelationEngine，/compare 接著繪製的熱力圖
+        不必再下載 CORRELATION_HISTORY_PERIOD 的歷史資料。
+        """
+        key = (tuple(symbols), period)
+        with self._matrices_lock:
+            cached = self._matrices.get(key)
+            if cached and time.time() - cached[1] < PRICE_MATRIX_TTL:
+                return cached[0]
+        
+        histories = self.stock_manager.get_historical_data_batch(symbols, period=period)
+        # 快取命中或改讀封存的資料也要加入（已有的收盤價不會重複計算）
+        correlation = self.stock_manager.correlation
+        if correlation is not None:
+            correlation.add_histories(histories)
+        
+        closes = {}
+        for symbol in symbols:
+            df = histories.get(symbol.upper())
+            if df is None or df.empty:
+                continue
+            close = df['Close']
+            index = pd.DatetimeIndex(close.index)
+            if index.tz is not None:
+                index = index.tz_localize(None)
+            # 不同交易所的時區不同，日K以當地日期對齊
+            index = index.normalize()
+            closes[symbol] = pd.Series(close.to_numpy(), index=index)
+        
+        matrix = pd.DataFrame(closes).sort_index()
+        with self._matrices_lock:
+            self._matrices[key] = (matrix, time.time())
+            while len(self._matrices) > 8:
+                self._matrices.popitem(last=False)
+        return matrix
+    
+    def generate_comparison_chart(self, symbols, period='1mo', style='dark_background', profile=None):
+        """生成多股票比較圖（同一組最新K線的圖只繪製一次）"""
+        try:
+            profile, _ = resolve_profile(profile)
+            matrix = self.load_price_matrix(symbols[:5], period)  # 最多比較5支股票
+            histories = []
+            for symbol in symbols[:5]:
+                close = matrix[symbol].dropna() if symbol in matrix else None
+                histories.append((symbol, close.to_frame('Close') if close is not None and not close.empty else None))
+            
+            last_bars = [self._last_bar(df) if df is not None else None for _, df in histories]
+            key = ChartCache.make_key('comparison', symbols[:5], period, style, tuple(last_bars), profile)
+            return self.chart_cache.get_or_render(
+                key, lambda: self.render_service.render('comparison', histories, style, profile=profile))
             
         except Exception as e:
             self.logger.error(f"Error generating comparison chart: {e}")
             return None
     
-    def generate_heatmap_chart(self, symbols, period='1mo'):
-        """生成相關性熱力圖"""
+    def generate_heatmap_chart(self, symbols, profile=None):
+        """生成日報酬率相關性熱力圖（同一組最新K線的圖只繪製一次）
+        
+        相關係數由 CorrelationEngine 的累加值直接算出，最多 HEATMAP_MAX_SYMBOLS 檔；
+        視窗內資料不足的股票先批次下載 CORRELATION_HISTORY_PERIOD 的歷史資料，
+        超出每小時請求預算的股票改用封存的日K線（見 StockDataManager.available_requests）。
+        """
         try:
-            # 收集所有股票的價格資料
-            price_data = {}
-            for symbol in symbols[:10]:  # 最多10支股票
-                df = self.stock_manager.get_historical_data(symbol, period=period)
-                if df is not None and not df.empty:
-                    price_data[symbol] = df['Close']
-            
-            if len(price_data) < 2:
+            profile, _ = resolve_profile(profile)
+            correlation = self.stock_manager.correlation
+            if correlation is None:
                 return None
             
-            # 建立相關性矩陣
-            price_df = pd.DataFrame(price_data)
-            correlation_matrix = price_df.corr()
-            
-            # 生成熱力圖
-            plt.figure(figsize=(10, 8))
-            sns.heatmap(correlation_matrix, annot=True, cmap='RdYlBu_r', center=0,
-                       square=True, linewidths=0.5, cbar_kws={"shrink": .8})
-            plt.title('股票相關性熱力圖', fontsize=16, fontweight='bold')
-            plt.tight_layout()
+            symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))[:HEATMAP_MAX_SYMBOLS]
+            missing = [symbol for symbol in symbols if correlation.covered(symbol) < CORRELATION_MIN_PERIODS]
+            if missing:
+                histories = self.stock_manager.get_historical_data_batch(missing, period=CORRELATION_HISTORY_PERIOD)
+                # 快取命中或改讀封存的資料也要加入（已有的收盤價不會重複計算）
+                correlation.add_histories(histories)
             
-            # 轉換為 bytes
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-            img_buffer.seek(0)
-            plt.close()
+            matrix = correlation.matrix(symbols)
+            if len(matrix.columns) < 2:
+                return None
             
-            return img_buffer
+            names = list(matrix.columns)
+            key = ChartCache.make_key('heatmap', names, CORRELATION_WINDOW, None, correlation.last_bars(names), profile)
+            return self.chart_cache.get_or_render(
+                key, lambda: self.render_service.render('heatmap', matrix, profile=profile))
             
         except Exception as e:
             self.logger.error(f"Error generating heatmap chart: {e}")
-            return None 
\ No newline at end of file
+            return None
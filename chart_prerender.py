@@ -0,0 +1,114 @@
+"""
+收盤後預先繪製熱門股票的日K圖表
+
+收盤後的 /chart 請求集中，每張圖都要即時繪製。各市場收盤後（PRERENDER_MARKETS）
+依追蹤人數選出最熱門的股票，以一次批次下載取得最新的歷史資料（收盤後已取得的
+沿用快取；下載數受 PRERENDER_API_BUDGET 與每小時剩餘額度限制，超出的股票略過），
+當天的日K線已出現的股票以追蹤者使用的輸出設定檔繪製價格走勢圖與技術指標圖，
+放進圖表快取。快取 key 含最後一根K線的時間與收盤價，收盤後不再變動，
+隔天開盤前的 /chart 請求直接命中快取。
+
+同時繪製的圖表數受 PRERENDER_CONCURRENCY 限制，其餘繪圖程序留給用戶請求。
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time
+import pytz
+from chart_engine import resolve_profile
+from config import PRERENDER_MARKETS, PRERENDER_MAX_SYMBOLS, PRERENDER_CONCURRENCY, PRERENDER_PERIOD, PRERENDER_API_BUDGET
+
+def _parse_time(value):
+    hour, minute = (int(part) for part in value.split(':'))
+    return time(hour, minute)
+
+class ChartPrerenderer:
+    """依市場收盤時間排程的圖表預先繪製"""
+
+    def __init__(self, db, chart_generator, markets=PRERENDER_MARKETS, max_symbols=PRERENDER_MAX_SYMBOLS,
+                 concurrency=PRERENDER_CONCURRENCY, period=PRERENDER_PERIOD, budget=PRERENDER_API_BUDGET):
+        self.db = db
+        self.chart_generator = chart_generator
+        self.markets = markets
+        self.max_symbols = max_symbols
+        self.concurrency = concurrency
+        self.period = period
+        self.budget = budget
+        self.logger = logging.getLogger(__name__)
+
+    def market_of(self, symbol):
+        """股票代碼所屬的市場（依後綴判斷，沒有符合的後綴時為 suffixes 為 None 的市場）"""
+        default = None
+        for market, settings in self.markets.items():
+            suffixes = settings.get('suffixes')
+            if suffixes is None:
+                default = market
+            elif symbol.upper().endswith(tuple(suffix.upper() for suffix in suffixes)):
+                return market
+        return default
+
+    def select_symbols(self, market):
+        """該市場追蹤人數最多的股票"""
+        symbols = [symbol for symbol, _ in self.db.get_most_watched_symbols() if self.market_of(symbol) == market]
+        return symbols[:self.max_symbols]
+
+    def profiles(self):
+        """追蹤者使用中的輸出設定檔"""
+        return sorted({resolve_profile(style)[0] for style, _ in self.db.get_watcher_chart_styles()})
+
+    def run(self, market, now=None):
+        """預先繪製一個市場的圖表，回傳統計 dict"""
+        symbols = self.select_symbols(market)
+        stats = {'symbols': len(symbols), 'ready': 0, 'charts': 0, 'failed': 0}
+        if not symbols:
+            return stats
+
+        timezone = pytz.timezone(self.markets[market]['timezone'])
+        now = now or datetime.now(timezone)
+        today = now.date()
+        # 只沿用收盤後取得的快取（盤中取得的最後一根K線不是收盤價），依追蹤人數優先下載
+        closed_at = timezone.localize(datetime.combine(today, _parse_time(self.markets[market]['close'])))
+        histories = self.chart_generator.stock_manager.get_historical_data_batch(
+            symbols, period=self.period, max_age=max(0.0, (now - closed_at).total_seconds()), budget=self.budget)
+        # 休市、資料尚未更新或超出請求額度的股票沒有當天的K線，沿用先前的圖
+        ready = [
+            symbol for symbol in symbols
+            if histories.get(symbol) is not None and not histories[symbol].empty
+            and histories[symbol].index[-1].date() == today
+        ]
+        stats['ready'] = len(ready)
+
+        tasks = [(chart_type, symbol, profile)
+                 for symbol in ready for profile in self.profiles() for chart_type in ('price', 'technical')]
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="chart-prerender") as executor:
+            for rendered in executor.map(lambda task: self._render(*task), tasks):
+                stats['charts' if rendered else 'failed'] += 1
+
+        self.logger.info(f"Pre-rendered {market} charts: {stats}")
+        return stats
+
+    def _render(self, chart_type, symbol, profile):
+        if chart_type == 'price':
+            chart = self.chart_generator.generate_price_chart(symbol, period=self.period, profile=profile)
+        else:
+            chart = self.chart_generator.generate_technical_chart(symbol, period=self.period, profile=profile)
+        return chart is not None
+
+    def job(self, context):
+        """job queue 回呼，context.job.context 為市場名稱"""
+        market = context.job.context
+        try:
+            self.run(market)
+        except Exception as e:
+            self.logger.error(f"Error pre-rendering {market} charts: {e}")
+
+    def schedule(self, job_queue):
+        """在各市場收盤後（週一至週五）排程預先繪製"""
+        for market, settings in self.markets.items():
+            job_queue.run_daily(
+                self.job,
+                _parse_time(settings['after_close']).replace(tzinfo=pytz.timezone(settings['timezone'])),
+                days=tuple(range(5)),
+                context=market,
+                name=f'chart_prerender_{market}'
+            )
@@ -0,0 +1,199 @@
+"""
+圖表繪製與多程序繪製服務
+
+繪製受 GIL 限制，ChartRenderService 將繪製交給常駐的工作程序
+（matplotlib 已載入、圖表範本已建立，見 chart_engine），
+輸入只傳送繪圖需要的欄位陣列，呼叫端取得 future 並設定逾時。
+CHART_RENDER_WORKERS 為 0 時在呼叫端程序內繪製（ChartEngine 以鎖序列化）。
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+from chart_engine import ChartEngine, EncodedChart
+from config import CHART_RENDER_WORKERS, CHART_RENDER_TIMEOUT, DEFAULT_CHART_PROFILE
+from latency import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+# 每個程序一個繪圖引擎，範本在程序內重複使用
+_engine = ChartEngine()
+
+# 各圖表需要傳送給工作程序的欄位
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+TECHNICAL_COLUMNS = ['Open', 'Close', 'Volume', 'RSI', 'MACD', 'MACD_Signal', 'MACD_Histogram',
+                     'BB_Upper', 'BB_Middle', 'BB_Lower', 'Volume_SMA']
+
+def pack_frame(df, columns):
+    """DataFrame 轉成只含需要欄位的 numpy 陣列（時間為不含時區的 datetime64）"""
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return {
+        'index': index.values,
+        'columns': {column: df[column].to_numpy(dtype=np.float64) for column in columns if column in df.columns}
+    }
+
+def unpack_frame(packed):
+    return pd.DataFrame(packed['columns'], index=pd.DatetimeIndex(packed['index']))
+
+# 圖表種類對應的 ChartEngine 方法
+RENDERERS = {
+    'price': 'render_price_chart',
+    'technical': 'render_technical_chart',
+    'comparison': 'render_comparison_chart',
+    'heatmap': 'render_heatmap_chart',
+}
+
+def pack_args(chart_type, args):
+    """將繪圖參數中的 DataFrame 換成精簡的陣列"""
+    if chart_type == 'price':
+        symbol, df, style = args
+        return symbol, pack_frame(df, PRICE_COLUMNS), style
+    if chart_type == 'technical':
+        symbol, df, style = args
+        return symbol, pack_frame(df, TECHNICAL_COLUMNS), style
+    if chart_type == 'comparison':
+        histories, style = args
+        return [(symbol, pack_frame(df, ['Close']) if df is not None else None) for symbol, df in histories], style
+    if chart_type == 'heatmap':
+        correlation, = args
+        return (list(correlation.columns), correlation.to_numpy(dtype=np.float64)),
+    raise ValueError(f"Unknown chart type: {chart_type}")
+
+def unpack_args(chart_type, args):
+    if chart_type in ('price', 'technical'):
+        symbol, packed, style = args
+        return symbol, unpack_frame(packed), style
+    if chart_type == 'comparison':
+        histories, style = args
+        return [(symbol, unpack_frame(packed) if packed is not None else None) for symbol, packed in histories], style
+    if chart_type == 'heatmap':
+        (names, values), = args
+        return pd.DataFrame(values, index=names, columns=names),
+    raise ValueError(f"Unknown chart type: {chart_type}")
+
+def render(chart_type, *args, profile=DEFAULT_CHART_PROFILE):
+    """在目前程序內繪圖，回傳 EncodedChart，失敗時回傳 None"""
+    if chart_type not in RENDERERS:
+        raise ValueError(f"Unknown chart type: {chart_type}")
+    return getattr(_engine, RENDERERS[chart_type])(*args, profile=profile)
+
+def _init_worker():
+    """工作程序初始化：預先建立常用的圖表範本並繪製一次"""
+    logging.basicConfig(
+        format='%(asctime)s - chart-worker - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    _engine.warm_up()
+
+def _render_task(chart_type, packed_args, profile):
+    """在工作程序內繪圖，回傳 (圖片 bytes, 輸出資訊)"""
+    chart = render(chart_type, *unpack_args(chart_type, packed_args), profile=profile)
+    if chart is None:
+        return None
+    return chart.getvalue(), {
+        'profile': chart.profile,
+        'format': chart.format,
+        'draw_seconds': chart.draw_seconds,
+        'encode_seconds': chart.encode_seconds
+    }
+
+class ChartRenderService:
+    """圖表繪製服務：工作程序池，每個程序常駐並保持 matplotlib 已載入"""
+
+    def __init__(self, workers=CHART_RENDER_WORKERS, timeout=CHART_RENDER_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        # 各輸出設定檔的點陣化/編碼耗時與圖片大小
+        self.latency = LatencyTracker()
+        self._output_sizes = {}  # profile -> [張數, 總 bytes]
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        """啟動工作程序"""
+        with self._executor_lock:
+            if self._executor or self.workers <= 0:
+                return
+            self._executor = self._new_executor()
+        self.logger.info(f"Started {self.workers} chart render workers")
+
+    def _new_executor(self):
+        # dispatcher 已有多個執行緒，使用 spawn 避免 fork 後鎖狀態不一致
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+
+    def stop(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, chart_type, *args, profile=DEFAULT_CHART_PROFILE):
+        """送出繪圖工作，回傳結果為 (bytes, 輸出資訊) 的 future；服務未啟動時回傳 None"""
+        with self._executor_lock:
+            executor = self._executor
+        if executor is None:
+            return None
+        return executor.submit(_render_task, chart_type, pack_args(chart_type, args), profile)
+
+    def _record(self, chart):
+        self.latency.record(f"draw:{chart.profile}", chart.draw_seconds)
+        self.latency.record(f"enc:{chart.profile}", chart.encode_seconds)
+        with self._stats_lock:
+            sizes = self._output_sizes.setdefault(chart.profile, [0, 0])
+            sizes[0] += 1
+            sizes[1] += len(chart.getvalue())
+        return chart
+
+    def get_output_report(self):
+        """各輸出設定檔的耗時與平均圖片大小"""
+        report = self.latency.dump()
+        with self._stats_lock:
+            sizes = dict(self._output_sizes)
+        for profile, (count, total) in sorted(sizes.items()):
+            report += f"\n{profile}: {count} 張，平均 {total / count / 1024:.0f} KB"
+        return report
+
+    def render(self, chart_type, *args, profile=DEFAULT_CHART_PROFILE, timeout=None):
+        """依輸出設定檔繪圖並回傳 EncodedChart，逾時或失敗時回傳 None"""
+        future = self.submit(chart_type, *args, profile=profile)
+        if future is None:
+            chart = render(chart_type, *args, profile=profile)
+            return self._record(chart) if chart is not None else None
+
+        try:
+            result = future.result(timeout=timeout or self.timeout)
+        except TimeoutError:
+            future.cancel()
+            self.logger.warning(f"Rendering {chart_type} chart timed out after {timeout or self.timeout}s")
+            return None
+        except BrokenProcessPool as e:
+            self.logger.error(f"Chart render worker died, restarting pool: {e}")
+            with self._executor_lock:
+                # 其他執行緒可能已重建，只替換已損壞的那個
+                broken = self._executor if self._executor is not None and self._executor._broken else None
+                if broken is not None:
+                    self._executor = self._new_executor()
+            if broken is not None:
+                broken.shutdown(wait=False, cancel_futures=True)
+            return None
+        except Exception as e:
+            self.logger.error(f"Error rendering {chart_type} chart: {e}")
+            return None
+
+        if result is None:
+            return None
+        data, info = result
+        return self._record(EncodedChart(data, **info))
@@ -6,8 +6,14 @@ load_dotenv()
 # Telegram Bot 設定
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 
+# 管理員用戶 ID（逗號分隔），可使用 /latency 等維運命令
+ADMIN_USER_IDS = [int(uid) for uid in os.getenv('ADMIN_USER_IDS', '').split(',') if uid.strip()]
+
 # 資料庫設定
 DATABASE_PATH = 'stock_bot.db'
+DB_BUSY_TIMEOUT = 5.0  # 秒，寫入鎖被占用時的等待時間
+DB_STATEMENT_CACHE_SIZE = 128  # 每條連線快取的預編譯語句數
+DB_READ_CACHE_SIZE = 10000     # 用戶資料/追蹤清單/警報清單快取筆數
 
 # 股票資料來源設定
 STOCK_DATA_SOURCE = 'yfinance'  # 或 'twse' 用於台股
@@ -16,6 +22,84 @@ STOCK_DATA_SOURCE = 'yfinance'  # 或 'twse' 用於台股
 PRICE_UPDATE_INTERVAL = 60  # 1分鐘更新一次
 ALERT_CHECK_INTERVAL = 30   # 30秒檢查一次警報
 
+# 警報自適應輪詢設定
+ALERT_MIN_POLL_INTERVAL = ALERT_CHECK_INTERVAL  # 接近門檻時的最短輪詢間隔
+ALERT_MAX_POLL_INTERVAL = 600    # 遠離門檻時的最長輪詢間隔
+ALERT_NEAR_DISTANCE_PCT = 1.0    # 距離門檻1%以內視為接近
+ALERT_FAR_DISTANCE_PCT = 10.0    # 距離門檻10%以上視為遙遠
+ALERT_API_BUDGET_PER_HOUR = 40   # 警報輪詢每小時可用的報價請求數
+
+# 警報分片設定（0 表示在主程序內評估）
+ALERT_SHARD_COUNT = int(os.getenv('ALERT_SHARD_COUNT', 0))  # 工作程序數量
+ALERT_SHARD_TIMEOUT = 20.0       # 每輪等待分片結果的秒數
+
+# 報價記錄設定（批次寫入 price_history）
+TICK_FLUSH_SIZE = 200       # 累積200筆即寫入
+TICK_FLUSH_INTERVAL = 5.0   # 最多5秒寫入一次
+
+# 用戶資料延遲寫入（/start、偏好設定）
+USER_WRITE_FLUSH_INTERVAL = 2.0  # 最多2秒寫入一次
+
+# 報價歷史保留與K線彙總（超過保留期限的資料已彙總到較粗的K線後刪除）
+PRICE_TICK_RETENTION_DAYS = 2       # 原始報價
+PRICE_BAR_1M_RETENTION_DAYS = 30    # 1分鐘K線
+PRICE_BAR_1H_RETENTION_DAYS = 365   # 1小時K線（日K線永久保留）
+PRICE_COMPACTION_INTERVAL = 600     # 每10分鐘彙總一次
+
+# 圖表快取（key 含最後一根K線時間，新K線自動失效）
+CHART_CACHE_SIZE = 64               # 記憶體中保留的圖表數
+CHART_CACHE_DIR = os.getenv('CHART_CACHE_DIR', 'chart_cache')
+CHART_CACHE_MAX_FILES = 500         # 磁碟上最多保留的圖檔數
+
+# 比較圖/熱力圖的多檔歷史資料批次下載
+HISTORY_BATCH_DEADLINE = 20.0       # 超過此秒數改讀封存
+PRICE_MATRIX_TTL = 60               # 對齊後的收盤價矩陣重複使用的秒數
+
+# 熱力圖的日報酬率相關性（增量更新，見 correlation.py）
+CORRELATION_WINDOW = 60             # 最近60個交易日的報酬率
+CORRELATION_MIN_PERIODS = 10        # 共同天數少於此數的相關係數不顯示
+CORRELATION_HISTORY_PERIOD = '3mo'  # 資料不足的股票下載的歷史期間（涵蓋視窗）
+HEATMAP_MAX_SYMBOLS = 40            # 熱力圖最多股票數（/heatmap 預設為追蹤清單）
+
+# 收盤後預先繪製追蹤人數最多的股票圖表（價格走勢圖與技術指標圖）
+PRERENDER_MAX_SYMBOLS = 20          # 每個市場最多預先繪製的股票數
+PRERENDER_CONCURRENCY = 1           # 同時繪製的圖表數，其餘繪圖程序留給用戶請求
+PRERENDER_PERIOD = '1mo'            # 與 /chart 相同的期間
+PRERENDER_API_BUDGET = 10           # 每個市場的預先繪製最多使用的報價請求數（也受每小時剩餘額度限制）
+# 市場 -> 時區、收盤時間、收盤後的執行時間（週一至週五）與股票代碼後綴；suffixes 為 None 的市場包含其他所有股票
+PRERENDER_MARKETS = {
+    'US': {'timezone': 'America/New_York', 'close': '16:00', 'after_close': '16:30', 'suffixes': None},
+    'TW': {'timezone': 'Asia/Taipei', 'close': '13:30', 'after_close': '14:30', 'suffixes': ('.TW', '.TWO')},
+}
+
+# 圖表輸出設定檔，用戶以偏好設定 chart_style 選擇（其他值使用 DEFAULT_CHART_PROFILE）
+# 圖片尺寸為 figsize（各圖表種類的英吋尺寸）× dpi；format 為 PNG/JPEG/WEBP，colors 為 PNG 量化的色數（None 為全彩）
+CHART_FIGSIZES = {'price': (12, 8), 'technical': (15, 10), 'comparison': (12, 8), 'heatmap': (10, 8)}
+CHART_OUTPUT_PROFILES = {
+    # 手機直向螢幕：接近正方形，字體相對較大
+    'mobile': {'dpi': 100, 'format': 'PNG', 'colors': 64, 'compress_level': 6,
+               'figsize': {'price': (9, 9), 'technical': (11, 11), 'comparison': (9, 8), 'heatmap': (8, 8)}},
+    'standard': {'dpi': 150, 'format': 'PNG', 'colors': 256, 'compress_level': 6, 'figsize': CHART_FIGSIZES},
+    'hi-res': {'dpi': 220, 'format': 'PNG', 'colors': None, 'compress_level': 6, 'figsize': CHART_FIGSIZES},
+}
+DEFAULT_CHART_PROFILE = 'standard'
+
+# 圖表繪製工作程序（0 表示在主程序內繪製）
+CHART_RENDER_WORKERS = int(os.getenv('CHART_RENDER_WORKERS', 2))
+CHART_RENDER_TIMEOUT = 30.0         # 單張圖表的繪製逾時秒數
+CHART_PAIR_THREADS = 4              # /chart 的技術指標圖與價格走勢圖同時繪製的執行緒數
+CHART_TEMPLATE_CACHE_SIZE = 8       # 每個繪圖程序保留的圖表範本數（熱力圖每種股票數各一個）
+
+# Parquet 價格封存（需安裝 pyarrow）
+PRICE_ARCHIVE_DIR = os.getenv('PRICE_ARCHIVE_DIR', 'price_archive')
+PRICE_ARCHIVE_INTERVAL = 86400      # 每天匯出一次彙總後的K線
+PRICE_ARCHIVE_LOOKBACK_DAYS = 3     # 每次匯出最近3天（需小於1分鐘K線保留天數）
+
+# 警報發送設定（Telegram 速率限制）
+ALERT_SEND_RATE_GLOBAL = 30      # 全域每秒最多30則
+ALERT_SEND_RATE_PER_CHAT = 1.0   # 同一聊天室每秒最多1則
+ALERT_SEND_MAX_RETRIES = 3       # 網路錯誤重試次數
+
 # 技術指標設定
 RSI_PERIOD = 14
 MACD_FAST = 12
@@ -28,6 +112,8 @@ BOLLINGER_STD = 2
 PRICE_CHANGE_THRESHOLD = 0.05  # 5% 價格變動
 VOLUME_SPIKE_THRESHOLD = 2.0   # 成交量放大2倍
 VOLATILITY_THRESHOLD = 0.03    # 3% 波動率
+ALERT_COOLDOWN_SECONDS = 1800  # 警報觸發後暫停30分鐘
+ROLLING_WINDOW_SIZE = 20       # 波動率與變動警報使用最近20筆報價
 
 # 投資策略設定
 INVESTMENT_PERSONALITIES = {
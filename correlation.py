@@ -0,0 +1,265 @@
+"""
+日報酬率相關性的增量計算
+
+每天一列、每檔股票一欄的報酬率只保留最近 CORRELATION_WINDOW 天，
+同時維護每一對股票的共變動累加值（兩檔都有報酬率的天數、各自的總和、
+平方和與乘積和）。新K線只更新受影響的那一天（加回新值、扣掉舊值），
+最舊的一天移出視窗時扣除，相關係數矩陣直接由累加值算出，
+100 檔以上的矩陣不必重新讀取或對齊價格。
+
+缺值的處理與 pandas DataFrame.corr() 相同：每一對只使用兩檔都有資料的日子。
+
+由報價彙總的日K線（price_bars_1d）只是暫定值：收盤價為最後一筆輪詢到的報價，
+只用於還沒有正式日K線（yfinance 歷史資料、封存的 1d）的日子，不會覆蓋正式收盤價。
+"""
+
+import bisect
+import logging
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from config import CORRELATION_WINDOW, CORRELATION_MIN_PERIODS
+
+# 增減累加值的浮點誤差會累積，更新這麼多天後由視窗內的報酬率重新計算
+REBUILD_INTERVAL = 5000
+
+def _day(value):
+    """K線時間轉成日期（時區換成不含時區的當地時間）"""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_localize(None)
+    return timestamp.date()
+
+class CorrelationEngine:
+    """多檔股票日報酬率的滑動視窗相關性，新K線以增量方式更新"""
+
+    def __init__(self, window=CORRELATION_WINDOW, min_periods=CORRELATION_MIN_PERIODS):
+        self.window = window
+        self.min_periods = min_periods
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        self._columns = {}   # symbol -> 欄位位置
+        self._closes = {}    # symbol -> {date: 收盤價}，只保留視窗內與前一天
+        self._official = {}  # symbol -> 收盤價來自正式日K線的日期
+        self._days = []      # 視窗內的日期（遞增）
+        self._rows = {}      # date -> 各股票當天的報酬率（NaN 為沒有資料）
+        self._capacity = 0
+        self._allocate(16)
+        self._updates = 0
+
+    def _allocate(self, capacity):
+        """擴充欄位數，既有的累加值與報酬率保留"""
+        grow = capacity - self._capacity
+        pad = ((0, grow), (0, grow))
+        if self._capacity:
+            self._count = np.pad(self._count, pad)
+            self._sum = np.pad(self._sum, pad)
+            self._sum_sq = np.pad(self._sum_sq, pad)
+            self._sum_xy = np.pad(self._sum_xy, pad)
+            for day, row in self._rows.items():
+                self._rows[day] = np.concatenate([row, np.full(grow, np.nan)])
+        else:
+            # count[i, j]: i、j 都有報酬率的天數；sum[i, j]、sum_sq[i, j]: 這些天 i 的總和與平方和
+            self._count = np.zeros((capacity, capacity))
+            self._sum = np.zeros((capacity, capacity))
+            self._sum_sq = np.zeros((capacity, capacity))
+            self._sum_xy = np.zeros((capacity, capacity))
+        self._capacity = capacity
+
+    def _column(self, symbol):
+        column = self._columns.get(symbol)
+        if column is None:
+            column = self._columns[symbol] = len(self._columns)
+            if column >= self._capacity:
+                self._allocate(self._capacity * 2)
+        return column
+
+    def _apply(self, row, sign):
+        """將一天的報酬率加入（sign=1）或扣出（sign=-1）累加值"""
+        present = ~np.isnan(row)
+        if not present.any():
+            return
+        mask = present.astype(np.float64)
+        values = np.where(present, row, 0.0)
+        self._count += sign * np.outer(mask, mask)
+        self._sum += sign * np.outer(values, mask)
+        self._sum_sq += sign * np.outer(values * values, mask)
+        self._sum_xy += sign * np.outer(values, values)
+
+    def _row(self, day):
+        """取得某天的報酬率列（必要時加入視窗並移出最舊的一天），太舊時回傳 None"""
+        row = self._rows.get(day)
+        if row is not None:
+            return row
+        if len(self._days) >= self.window and day < self._days[0]:
+            return None
+
+        bisect.insort(self._days, day)
+        row = self._rows[day] = np.full(self._capacity, np.nan)
+        while len(self._days) > self.window:
+            oldest = self._days.pop(0)
+            self._apply(self._rows.pop(oldest), -1)
+        return row
+
+    def _set_returns(self, changes):
+        """changes: {date: {column: 報酬率}}，同一天的變更只增減一次累加值"""
+        for day in sorted(changes):
+            row = self._row(day)
+            if row is None:
+                continue
+            self._apply(row, -1)
+            for column, value in changes[day].items():
+                row[column] = value
+            self._apply(row, 1)
+            self._updates += 1
+
+        if self._updates >= REBUILD_INTERVAL:
+            self._rebuild()
+
+    def _rebuild(self):
+        for matrix in (self._count, self._sum, self._sum_sq, self._sum_xy):
+            matrix.fill(0.0)
+        for row in self._rows.values():
+            self._apply(row, 1)
+        self._updates = 0
+
+    def _add_closes(self, symbol, closes, changes, provisional=False):
+        """合併一檔股票的收盤價 {date: close}，重算受影響日期的報酬率放進 changes
+
+        provisional 為 True 時（報價彙總的K線）略過已有正式收盤價的日子
+        """
+        symbol = symbol.upper()
+        column = self._column(symbol)
+        known = self._closes.setdefault(symbol, {})
+        official = self._official.setdefault(symbol, set())
+        if provisional:
+            closes = {day: close for day, close in closes.items() if day not in official}
+        else:
+            official.update(closes)
+
+        changed = [day for day, close in closes.items() if known.get(day) != close]
+        if not changed:
+            return
+        known.update((day, closes[day]) for day in changed)
+
+        days = sorted(known)
+        # 只保留視窗內的收盤價，加上計算第一天報酬率需要的前一天
+        if len(days) > self.window + 1:
+            for day in days[:-(self.window + 1)]:
+                del known[day]
+                official.discard(day)
+            days = days[-(self.window + 1):]
+
+        # 收盤價變動時，當天與下一個交易日的報酬率都要重算
+        affected = set()
+        for day in changed:
+            position = bisect.bisect_left(days, day)
+            if position < len(days) and days[position] == day:
+                affected.update(days[position:position + 2])
+        for day in affected:
+            position = bisect.bisect_left(days, day)
+            previous = known[days[position - 1]] if position > 0 else None
+            value = known[day] / previous - 1 if previous else np.nan
+            changes.setdefault(day, {})[column] = value
+
+    def add_bar(self, symbol, timestamp, close):
+        """加入（或修正）一根日K線的收盤價"""
+        self.add_closes({symbol: {_day(timestamp): float(close)}})
+
+    def add_history(self, symbol, df):
+        """加入一檔股票的日K線歷史（含 Close 欄位、以時間為索引的 DataFrame）"""
+        self.add_histories({symbol: df})
+
+    def add_histories(self, histories):
+        """批次加入多檔股票的日K線歷史 {symbol: DataFrame 或 None}，同一天只更新一次累加值"""
+        self.add_closes({
+            symbol: {_day(timestamp): float(value) for timestamp, value in df['Close'].dropna().items()}
+            for symbol, df in histories.items() if df is not None and not df.empty
+        })
+
+    def add_closes(self, closes, provisional=False):
+        """批次加入多檔股票的收盤價 {symbol: {date: close}}，provisional 見 _add_closes"""
+        with self._lock:
+            changes = {}
+            for symbol, symbol_closes in closes.items():
+                if symbol_closes:
+                    self._add_closes(symbol, symbol_closes, changes, provisional)
+            self._set_returns(changes)
+
+    def add_bars(self, rows):
+        """加入 Database.get_price_bars_since('1d', ...) 的K線列（暫定值，不覆蓋正式日K線）"""
+        closes = {}
+        for symbol, bucket_start, _open, _high, _low, close, _volume in rows:
+            if close is not None:
+                closes.setdefault(symbol, {})[_day(bucket_start)] = float(close)
+        self.add_closes(closes, provisional=True)
+
+    def covered(self, symbol):
+        """股票在視窗內的報酬率天數"""
+        with self._lock:
+            column = self._columns.get(symbol.upper())
+            return 0 if column is None else int(self._count[column, column])
+
+    def last_bars(self, symbols):
+        """各股票最後一根K線的日期與收盤價（圖表快取 key 用，當天K線修正時 key 跟著改變）"""
+        with self._lock:
+            bars = []
+            for symbol in symbols:
+                known = self._closes.get(symbol.upper())
+                if known:
+                    day = max(known)
+                    bars.append((day.isoformat(), round(known[day], 6)))
+                else:
+                    bars.append(None)
+            return tuple(bars)
+
+    def matrix(self, symbols=None):
+        """相關係數矩陣 DataFrame（依 symbols 順序，只含有資料的股票）
+
+        共同天數少於 min_periods 或變異數為 0 的格子為 NaN。
+        """
+        with self._lock:
+            if symbols is None:
+                names = list(self._columns)
+            else:
+                names = [symbol.upper() for symbol in dict.fromkeys(symbols) if symbol.upper() in self._columns]
+            columns = [self._columns[name] for name in names]
+            selector = np.ix_(columns, columns)
+            count = self._count[selector]
+            total = self._sum[selector]
+            sum_sq = self._sum_sq[selector]
+            sum_xy = self._sum_xy[selector]
+
+        # 每一對以共同的天數計算：cov ∝ n·Σxy − Σx·Σy，var ∝ n·Σx² − (Σx)²
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = count * sum_xy - total * total.T
+            variance = count * sum_sq - total * total
+            correlation = covariance / np.sqrt(variance * variance.T)
+        valid = (count >= self.min_periods) & (variance > 1e-18) & (variance.T > 1e-18)
+        correlation = np.where(valid, np.clip(correlation, -1.0, 1.0), np.nan)
+        return pd.DataFrame(correlation, index=names, columns=names)
+
+    def hydrate(self, db, archive=None):
+        """啟動時由封存的日K線與資料庫的日K線載入視窗內的收盤價"""
+        # 視窗為交易日，日曆天多抓一些
+        since = datetime.now() - timedelta(days=self.window * 7 // 5 + 10)
+        loaded = 0
+        if archive is not None:
+            try:
+                matrix = archive.read_matrix(archive.symbols('1d'), start=since)
+                if matrix is not None:
+                    self.add_histories({symbol: matrix[[symbol]].rename(columns={symbol: 'Close'}) for symbol in matrix.columns})
+                    loaded += int(matrix.count().sum())
+            except Exception as e:
+                self.logger.error(f"Error loading archived daily bars: {e}")
+
+        try:
+            rows = db.get_price_bars_since('1d', since)
+            self.add_bars(rows)
+            loaded += len(rows)
+        except Exception as e:
+            self.logger.error(f"Error loading daily bars: {e}")
+
+        self.logger.info(f"Hydrated correlation engine with {len(self._columns)} symbols ({loaded} daily bars)")
@@ -1,94 +1,165 @@
 import sqlite3
 import json
-from datetime import datetime
-from config import DATABASE_PATH
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from db_migrations import migrate
+from config import (DATABASE_PATH, DB_BUSY_TIMEOUT, DB_STATEMENT_CACHE_SIZE, DB_READ_CACHE_SIZE, PRICE_TICK_RETENTION_DAYS,
+                    PRICE_BAR_1M_RETENTION_DAYS, PRICE_BAR_1H_RETENTION_DAYS)
+
+# K線彙總層級 (資料表, 區間秒數, 保留天數)，由細到粗；日K線永久保留
+PRICE_BAR_LEVELS = [
+    ('price_bars_1m', 60, PRICE_BAR_1M_RETENTION_DAYS),
+    ('price_bars_1h', 3600, PRICE_BAR_1H_RETENTION_DAYS),
+    ('price_bars_1d', 86400, None),
+]
+
+USER_UPSERT_SQL = '''
+    INSERT INTO users (user_id, username, first_name, last_name, updated_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        updated_at = excluded.updated_at
+'''
+
+class ReadThroughCache:
+    """用戶資料、偏好設定、追蹤清單與警報清單的讀取快取（LRU）
+
+    由 Database 的寫入方法在 commit 後精確失效。每個 key 帶有版本號，
+    查詢期間若被寫入失效，查到的舊資料不會放進快取。
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            version = self._versions.get(key, 0)
+
+        value = loader()
+
+        with self._lock:
+            if self._versions.get(key, 0) == version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+# 同一程序內所有 Database 實例共用，任一實例寫入都會讓其他實例的快取失效
+_read_cache = ReadThroughCache(DB_READ_CACHE_SIZE)
+
+def _epoch(dt):
+    """price_history 的時間為不含時區的牆上時間，與 SQLite strftime('%s') 一樣視為 UTC 換算"""
+    return calendar.timegm(dt.timetuple())
+
+def _timestamp_text(epoch):
+    return (datetime(1970, 1, 1) + timedelta(seconds=epoch)).strftime('%Y-%m-%d %H:%M:%S')
+
+def _ohlcv_query(source, seconds, condition):
+    """將 source（price_history 或K線表）依 seconds 分組成 OHLCV 的 SELECT
+
+    回傳欄位：symbol, bucket_start, open, high, low, close, volume
+    """
+    if source == 'price_history':
+        rows = f'''
+            SELECT symbol, CAST(strftime('%s', timestamp) AS INTEGER) AS ts, id AS seq,
+                   price AS open, price AS high, price AS low, price AS close, volume
+            FROM price_history WHERE {condition}
+        '''
+    else:
+        rows = f'''
+            SELECT symbol, bucket_start AS ts, bucket_start AS seq, open, high, low, close, volume
+            FROM {source} WHERE {condition}
+        '''
+    return f'''
+        SELECT symbol, bucket_start, open, MAX(high) AS high, MIN(low) AS low, close, volume
+        FROM (
+            SELECT symbol, ts / {seconds} * {seconds} AS bucket_start, high, low,
+                   FIRST_VALUE(open) OVER w AS open,
+                   LAST_VALUE(close) OVER w AS close,
+                   LAST_VALUE(volume) OVER w AS volume
+            FROM ({rows})
+            WINDOW w AS (PARTITION BY symbol, ts / {seconds} ORDER BY ts, seq
+                         ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+        )
+        GROUP BY symbol, bucket_start
+    '''
 
 class Database:
     def __init__(self):
         self.db_path = DATABASE_PATH
+        # 每個執行緒一條持久連線（sqlite3 連線不可跨執行緒共用）
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_database()
     
-    def init_database(self):
-        """初始化資料庫表格"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # 用戶表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                investment_personality TEXT DEFAULT '上班族型交易者',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 股票追蹤表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stock_watchlist (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                symbol TEXT,
-                company_name TEXT,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id),
-                UNIQUE(user_id, symbol)
-            )
-        ''')
-        
-        # 警報設定表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alerts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                symbol TEXT,
-                alert_type TEXT,  -- price_high, price_low, volume_spike, volatility
-                threshold REAL,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        ''')
-        
-        # 股價歷史表格
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS price_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symbol TEXT,
-                price REAL,
-                volume INTEGER,
-                change_percent REAL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 用戶偏好設定
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                user_id INTEGER PRIMARY KEY,
-                update_frequency INTEGER DEFAULT 60,
-                alert_enabled BOOLEAN DEFAULT 1,
-                chart_style TEXT DEFAULT 'line',
-                timezone TEXT DEFAULT 'Asia/Taipei',
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
+    def _get_connection(self):
+        """取得目前執行緒的連線，第一次使用時建立並設定 WAL"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=DB_BUSY_TIMEOUT,
+                cached_statements=DB_STATEMENT_CACHE_SIZE,
+                check_same_thread=False  # 只由建立的執行緒使用，但允許 close() 統一關閉
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
+            # WAL 讓讀取不被寫入阻塞，NORMAL 在 WAL 下仍能保證資料庫一致
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        elif conn.in_transaction:
+            # 上一次操作中途失敗留下的交易，先還原避免持有寫入鎖
+            conn.rollback()
+        return conn
+    
+    def close(self):
+        """關閉所有執行緒的連線（程式結束時呼叫）"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+    
+    def _cache_key(self, kind, user_id):
+        return (self.db_path, kind, user_id)
+    
+    def _invalidate(self, kind, user_id):
+        _read_cache.invalidate(self._cache_key(kind, user_id))
+    
+    def init_database(self):
+        """初始化資料庫表格（依版本執行尚未套用的 migration）"""
+        migrate(self._get_connection())
     
     def add_user(self, user_id, username=None, first_name=None, last_name=None):
         """新增用戶"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO users (user_id, username, first_name, last_name, updated_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, username, first_name, last_name, datetime.now()))
+        # ON CONFLICT 只更新基本資料，保留 created_at 與投資人格
+        cursor.execute(USER_UPSERT_SQL, (user_id, username, first_name, last_name, datetime.now()))
         
         # 同時新增偏好設定
         cursor.execute('''
@@ -97,22 +168,37 @@ class Database:
         ''', (user_id,))
         
         conn.commit()
-        conn.close()
+        self._invalidate('user', user_id)
+        self._invalidate('preferences', user_id)
     
     def get_user(self, user_id):
-        """取得用戶資料"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """取得用戶資料（經由快取）"""
+        def load():
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+            return cursor.fetchone()
+        
+        return _read_cache.get_or_load(self._cache_key('user', user_id), load)
+    
+    def get_user_preferences(self, user_id):
+        """取得用戶偏好設定 (update_frequency, alert_enabled, chart_style, timezone)（經由快取）"""
+        def load():
+            conn = self._get_connection()
+            cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = cursor.fetchone()
+            cursor.execute('''
+                SELECT update_frequency, alert_enabled, chart_style, timezone
+                FROM user_preferences WHERE user_id = ?
+            ''', (user_id,))
+            return cursor.fetchone()
         
-        conn.close()
-        return user
+        return _read_cache.get_or_load(self._cache_key('preferences', user_id), load)
     
     def add_stock_to_watchlist(self, user_id, symbol, company_name=None):
         """新增股票到追蹤清單"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         try:
@@ -121,16 +207,17 @@ class Database:
                 VALUES (?, ?, ?)
             ''', (user_id, symbol.upper(), company_name))
             conn.commit()
+            self._invalidate('watchlist', user_id)
             success = True
         except sqlite3.IntegrityError:
+            conn.rollback()
             success = False  # 已存在
         
-        conn.close()
         return success
     
     def remove_stock_from_watchlist(self, user_id, symbol):
         """從追蹤清單移除股票"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -139,27 +226,55 @@ class Database:
         ''', (user_id, symbol.upper()))
         
         conn.commit()
-        conn.close()
+        self._invalidate('watchlist', user_id)
     
     def get_user_watchlist(self, user_id):
-        """取得用戶的追蹤清單"""
-        conn = sqlite3.connect(self.db_path)
+        """取得用戶的追蹤清單（經由快取）"""
+        def load():
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT symbol, company_name, added_at 
+                FROM stock_watchlist 
+                WHERE user_id = ?
+                ORDER BY added_at DESC
+            ''', (user_id,))
+            return tuple(cursor.fetchall())
+        
+        return list(_read_cache.get_or_load(self._cache_key('watchlist', user_id), load))
+    
+    def get_most_watched_symbols(self):
+        """依追蹤人數由多到少排序的股票 [(symbol, watchers)]"""
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT symbol, company_name, added_at 
-            FROM stock_watchlist 
-            WHERE user_id = ?
-            ORDER BY added_at DESC
-        ''', (user_id,))
+            SELECT symbol, COUNT(*) AS watchers
+            FROM stock_watchlist
+            GROUP BY symbol
+            ORDER BY watchers DESC, symbol
+        ''')
         
-        watchlist = cursor.fetchall()
-        conn.close()
-        return watchlist
+        return cursor.fetchall()
+    
+    def get_watcher_chart_styles(self):
+        """有追蹤清單的用戶使用的圖表設定 [(chart_style, users)]，沒有偏好設定的用戶為 None"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT p.chart_style, COUNT(DISTINCT w.user_id)
+            FROM stock_watchlist w
+            LEFT JOIN user_preferences p ON p.user_id = w.user_id
+            GROUP BY p.chart_style
+        ''')
+        
+        return cursor.fetchall()
     
     def add_alert(self, user_id, symbol, alert_type, threshold):
         """新增警報設定"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -168,41 +283,105 @@ class Database:
         ''', (user_id, symbol.upper(), alert_type, threshold))
         
         conn.commit()
-        conn.close()
+        self._invalidate('alerts', user_id)
     
     def get_user_alerts(self, user_id):
-        """取得用戶的警報設定"""
-        conn = sqlite3.connect(self.db_path)
+        """取得用戶的警報設定（經由快取）"""
+        def load():
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT symbol, alert_type, threshold, is_active
+                FROM alerts 
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+            ''', (user_id,))
+            return tuple(cursor.fetchall())
+        
+        return list(_read_cache.get_or_load(self._cache_key('alerts', user_id), load))
+    
+    def get_active_alerts(self):
+        """取得所有啟用中的警報"""
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT symbol, alert_type, threshold, is_active
+            SELECT user_id, symbol, alert_type, threshold
             FROM alerts 
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        ''', (user_id,))
+            WHERE is_active = 1
+        ''')
         
         alerts = cursor.fetchall()
-        conn.close()
         return alerts
     
+    def get_alerts_version(self):
+        """警報變動計數（alerts 表每次新增、刪除或啟用狀態改變時遞增）"""
+        conn = self._get_connection()
+        return conn.execute('SELECT version FROM alert_state WHERE id = 1').fetchone()[0]
+    
     def update_investment_personality(self, user_id, personality):
-        """更新投資人格設定"""
-        conn = sqlite3.connect(self.db_path)
+        """更新投資人格設定
+        
+        /start 的用戶資料經由 UserWriteBehind 延遲寫入，用戶在寫入前就可能選擇人格，
+        因此以 upsert 寫入；之後寫入的用戶資料不會覆蓋投資人格。
+        """
+        conn = self._get_connection()
         cursor = conn.cursor()
         
+        now = datetime.now()
         cursor.execute('''
-            UPDATE users 
-            SET investment_personality = ?, updated_at = ?
-            WHERE user_id = ?
-        ''', (personality, datetime.now(), user_id))
+            INSERT INTO users (user_id, investment_personality, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                investment_personality = excluded.investment_personality,
+                updated_at = excluded.updated_at
+        ''', (user_id, personality, now))
         
         conn.commit()
-        conn.close()
+        self._invalidate('user', user_id)
+    
+    def save_user_writes(self, writes):
+        """以單一交易套用 UserWriteBehind 合併後的寫入
+        
+        writes: {user_id: {'profile': (username, first_name, last_name) 或 None,
+                           'preferences': {欄位: 值}, 'updated_at': datetime 或 None}}
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        profiles = [(user_id, *w['profile'], w['updated_at']) for user_id, w in writes.items() if w['profile']]
+        touches = [(w['updated_at'], user_id) for user_id, w in writes.items() if not w['profile'] and w['updated_at']]
+        
+        try:
+            cursor.executemany(USER_UPSERT_SQL, profiles)
+            cursor.executemany('UPDATE users SET updated_at = ? WHERE user_id = ?', touches)
+            cursor.executemany('''
+                INSERT OR IGNORE INTO user_preferences (user_id)
+                VALUES (?)
+            ''', [(user_id,) for user_id, w in writes.items() if w['profile'] or w['preferences']])
+        
+            for user_id, w in writes.items():
+                if w['preferences']:
+                    # 欄位名稱已由 UserWriteBehind 限定在 PREFERENCE_FIELDS 內
+                    columns = ', '.join(f'{field} = ?' for field in w['preferences'])
+                    cursor.execute(f'UPDATE user_preferences SET {columns} WHERE user_id = ?',
+                                   (*w['preferences'].values(), user_id))
+        
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        for user_id, w in writes.items():
+            if w['profile'] or w['updated_at']:
+                self._invalidate('user', user_id)
+            if w['profile'] or w['preferences']:
+                self._invalidate('preferences', user_id)
     
     def save_price_data(self, symbol, price, volume, change_percent):
         """儲存股價資料"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -211,11 +390,22 @@ class Database:
         ''', (symbol.upper(), price, volume, change_percent))
         
         conn.commit()
-        conn.close()
+    
+    def save_price_data_batch(self, rows):
+        """批次儲存股價資料 (symbol, price, volume, change_percent, timestamp)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            INSERT INTO price_history (symbol, price, volume, change_percent, timestamp)
+            VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', rows)
+        
+        conn.commit()
     
     def get_price_history(self, symbol, limit=100):
         """取得股價歷史資料"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -227,5 +417,195 @@ class Database:
         ''', (symbol.upper(), limit))
         
         history = cursor.fetchall()
-        conn.close()
-        return history 
\ No newline at end of file
+        return history
+    
+    def start_alert_cooldown(self, user_id, symbol, alert_type, cooldown_until):
+        """暫停警報直到冷卻結束"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE alerts 
+            SET is_active = 0, cooldown_until = ?
+            WHERE user_id = ? AND symbol = ? AND alert_type = ?
+        ''', (cooldown_until, user_id, symbol.upper(), alert_type))
+        
+        conn.commit()
+        self._invalidate('alerts', user_id)
+    
+    def get_alert_cooldowns(self):
+        """取得所有冷卻中的警報"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT DISTINCT user_id, symbol, alert_type, cooldown_until
+            FROM alerts 
+            WHERE cooldown_until IS NOT NULL
+        ''')
+        
+        cooldowns = cursor.fetchall()
+        return cooldowns
+    
+    def release_alert_cooldowns(self, alert_keys, now):
+        """批次重新啟用冷卻已結束的警報"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany('''
+            UPDATE alerts 
+            SET is_active = 1, cooldown_until = NULL
+            WHERE user_id = ? AND symbol = ? AND alert_type = ?
+              AND cooldown_until IS NOT NULL AND cooldown_until <= ?
+        ''', [(user_id, symbol, alert_type, now) for user_id, symbol, alert_type in alert_keys])
+        
+        conn.commit()
+        for user_id in {user_id for user_id, _, _ in alert_keys}:
+            self._invalidate('alerts', user_id)
+    
+    def delete_alert(self, user_id, symbol, alert_type):
+        """刪除警報"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            DELETE FROM alerts 
+            WHERE user_id = ? AND symbol = ? AND alert_type = ?
+        ''', (user_id, symbol.upper(), alert_type))
+        
+        conn.commit()
+        self._invalidate('alerts', user_id)
+        return cursor.rowcount
+    
+    def compact_price_history(self, now=None):
+        """將已結束區間的報價彙總成 1m/1h/1d K線，並刪除超過保留期限的資料
+
+        每一層只重算目前最後一根K線之後的區間，刪除時不會超過已彙總的範圍。
+        回傳 (rolled, pruned)：各K線表新增或更新的K線數、各來源表刪除的列數
+        """
+        now_epoch = _epoch(now or datetime.now())
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        rolled, pruned = {}, {}
+        
+        source, source_retention = 'price_history', PRICE_TICK_RETENTION_DAYS
+        for table, seconds, retention in PRICE_BAR_LEVELS:
+            cursor.execute(f'SELECT MAX(bucket_start) FROM {table}')
+            since = cursor.fetchone()[0]
+            # 只彙總已結束的區間
+            until = now_epoch // seconds * seconds
+            
+            if source == 'price_history':
+                condition = 'timestamp < ?' if since is None else 'timestamp >= ? AND timestamp < ?'
+                params = [_timestamp_text(until)] if since is None else [_timestamp_text(since), _timestamp_text(until)]
+            else:
+                condition = 'bucket_start < ?' if since is None else 'bucket_start >= ? AND bucket_start < ?'
+                params = [until] if since is None else [since, until]
+            
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO {table} (symbol, bucket_start, open, high, low, close, volume)
+                {_ohlcv_query(source, seconds, condition)}
+            ''', params)
+            rolled[table] = cursor.rowcount
+            
+            # 來源資料超過保留期限且已彙總完成才刪除
+            prune_before = min(now_epoch - source_retention * 86400, until)
+            if source == 'price_history':
+                cursor.execute('DELETE FROM price_history WHERE timestamp < ?', (_timestamp_text(prune_before),))
+            else:
+                cursor.execute(f'DELETE FROM {source} WHERE bucket_start < ?', (prune_before,))
+            pruned[source] = cursor.rowcount
+            
+            source, source_retention = table, retention
+        
+        conn.commit()
+        return rolled, pruned
+    
+    def get_price_bars_since(self, interval, since):
+        """取得所有股票自 since 起已彙總的K線（封存匯出用）
+        
+        interval: '1m'、'1h' 或 '1d'
+        回傳 [(symbol, bucket_start, open, high, low, close, volume)]
+        """
+        table = f'price_bars_{interval}'
+        if table not in {level[0] for level in PRICE_BAR_LEVELS}:
+            raise ValueError(f"Unknown bar interval: {interval}")
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT symbol, datetime(bucket_start, 'unixepoch'), open, high, low, close, volume
+            FROM {table}
+            WHERE bucket_start >= ?
+            ORDER BY symbol, bucket_start
+        ''', (_epoch(since),))
+        
+        return cursor.fetchall()
+    
+    def get_price_bars(self, symbol, start, end=None, resolution=60):
+        """取得 start 到 end 之間、每 resolution 秒一根的 OHLCV K線
+
+        從區間秒數能整除 resolution 的最粗一層讀取（例如 4 小時K線由 1h 表彙總），
+        該層最後一根K線之後尚未彙總的部分依序由較細的層補上，直到原始報價。
+        回傳 [(bucket_start, open, high, low, close, volume)]，bucket_start 與 price_history 同格式
+        """
+        symbol = symbol.upper()
+        # 包含 start 所在的那根K線
+        start_epoch = _epoch(start) // resolution * resolution
+        end_epoch = _epoch(end or datetime.now())
+        
+        sources = [(table, seconds) for table, seconds, _ in reversed(PRICE_BAR_LEVELS) if resolution % seconds == 0]
+        sources.append(('price_history', None))
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        bars = []
+        
+        for position, (source, seconds) in enumerate(sources):
+            if start_epoch >= end_epoch:
+                break
+            
+            if source == 'price_history':
+                split = end_epoch
+                condition = 'symbol = ? AND timestamp >= ? AND timestamp < ?'
+                params = (symbol, _timestamp_text(start_epoch), _timestamp_text(split))
+            else:
+                cursor.execute(f'SELECT MAX(bucket_start) FROM {source} WHERE symbol = ?', (symbol,))
+                last = cursor.fetchone()[0]
+                if last is None:
+                    continue
+                # 切在 resolution 邊界，避免同一根K線由兩層各算一半
+                covered = last + seconds
+                split = min(end_epoch, covered // resolution * resolution)
+                if split < covered and not self._has_bars(cursor, sources[position + 1:], symbol, split, covered):
+                    # 較細的層已依保留期限刪除，尾段無法補上時由這一層讀完最後一根K線
+                    split = min(end_epoch, -(-covered // resolution) * resolution)
+                condition = 'symbol = ? AND bucket_start >= ? AND bucket_start < ?'
+                params = (symbol, start_epoch, split)
+            
+            if split > start_epoch:
+                cursor.execute(f'''
+                    SELECT datetime(bucket_start, 'unixepoch'), open, high, low, close, volume
+                    FROM ({_ohlcv_query(source, resolution, condition)})
+                    ORDER BY bucket_start
+                ''', params)
+                bars.extend(cursor.fetchall())
+                start_epoch = split
+        
+        return bars
+    
+    def _has_bars(self, cursor, sources, symbol, start_epoch, end_epoch):
+        """sources 中任一層在 [start_epoch, end_epoch) 之間是否有這檔股票的資料"""
+        for source, _ in sources:
+            if source == 'price_history':
+                cursor.execute('''
+                    SELECT 1 FROM price_history WHERE symbol = ? AND timestamp >= ? AND timestamp < ? LIMIT 1
+                ''', (symbol, _timestamp_text(start_epoch), _timestamp_text(end_epoch)))
+            else:
+                cursor.execute(f'''
+                    SELECT 1 FROM {source} WHERE symbol = ? AND bucket_start >= ? AND bucket_start < ? LIMIT 1
+                ''', (symbol, start_epoch, end_epoch))
+            if cursor.fetchone():
+                return True
+        return False
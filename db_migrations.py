@@ -0,0 +1,205 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _create_base_tables(cursor):
+    """初始資料表（沿用 IF NOT EXISTS，舊資料庫版本為 0 但表格已存在）"""
+    # 用戶表格
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            investment_personality TEXT DEFAULT '上班族型交易者',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 股票追蹤表格
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_watchlist (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            company_name TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            UNIQUE(user_id, symbol)
+        )
+    ''')
+
+    # 警報設定表格
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            alert_type TEXT,  -- price_high, price_low, volume_spike, volatility
+            threshold REAL,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+
+    # 股價歷史表格
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            price REAL,
+            volume INTEGER,
+            change_percent REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 用戶偏好設定
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id INTEGER PRIMARY KEY,
+            update_frequency INTEGER DEFAULT 60,
+            alert_enabled BOOLEAN DEFAULT 1,
+            chart_style TEXT DEFAULT 'line',
+            timezone TEXT DEFAULT 'Asia/Taipei',
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+
+def _add_alert_cooldown(cursor):
+    """警報冷卻結束時間 (epoch 秒)，NULL 表示未冷卻"""
+    # 加入版本管理前的程式已在啟動時補過此欄位
+    cursor.execute('PRAGMA table_info(alerts)')
+    alert_columns = [row[1] for row in cursor.fetchall()]
+    if 'cooldown_until' not in alert_columns:
+        cursor.execute('ALTER TABLE alerts ADD COLUMN cooldown_until REAL')
+
+    # 舊版以睡眠執行緒在 30 分鐘後恢復警報，期間重新啟動的警報會永久停用；
+    # 停用的警報只會來自冷卻，沒有冷卻結束時間的直接恢復
+    cursor.execute('''
+        UPDATE alerts SET is_active = 1
+        WHERE is_active = 0 AND cooldown_until IS NULL
+    ''')
+
+def _add_query_indexes(cursor):
+    """依實際查詢建立的複合索引"""
+    # get_price_history / 滑動視窗還原：WHERE symbol ORDER BY timestamp DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_history_symbol_time
+        ON price_history (symbol, timestamp)
+    ''')
+
+    # get_user_alerts：WHERE user_id ORDER BY created_at DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_user_created
+        ON alerts (user_id, created_at)
+    ''')
+
+    # 冷卻、刪除：WHERE user_id AND symbol AND alert_type
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_user_symbol_type
+        ON alerts (user_id, symbol, alert_type)
+    ''')
+
+    # get_active_alerts：WHERE is_active = 1，涵蓋所有查詢欄位不需回表
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_active
+        ON alerts (is_active, symbol, user_id, alert_type, threshold)
+    ''')
+
+    # get_alert_cooldowns：只索引冷卻中的警報，欄位順序與 DISTINCT 一致
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alerts_cooldown
+        ON alerts (user_id, symbol, alert_type, cooldown_until)
+        WHERE cooldown_until IS NOT NULL
+    ''')
+
+    # get_user_watchlist：WHERE user_id ORDER BY added_at DESC
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_watchlist_user_added
+        ON stock_watchlist (user_id, added_at)
+    ''')
+
+def _add_price_bars(cursor):
+    """由 price_history 彙總的 OHLCV K線（bucket_start 為區間開始的 epoch 秒）"""
+    for table in ('price_bars_1m', 'price_bars_1h', 'price_bars_1d'):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                symbol TEXT NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume INTEGER,  -- 區間最後一筆報價的成交量（報價成交量為當日累計）
+                PRIMARY KEY (symbol, bucket_start)
+            ) WITHOUT ROWID
+        ''')
+
+    # 彙總與刪除依時間範圍掃描所有股票
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_history_time
+        ON price_history (timestamp)
+    ''')
+
+def _add_alert_version(cursor):
+    """警報變動計數：新增、刪除、冷卻與恢復時由觸發器遞增，評估端版本相同時沿用已建立的索引"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alert_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO alert_state (id, version) VALUES (1, 0)')
+
+    # 寫入警報的程式不必各自記得遞增版本（包含其他程序）
+    for name, event in (('insert', 'INSERT'), ('delete', 'DELETE'),
+                        ('update', 'UPDATE OF user_id, symbol, alert_type, threshold, is_active')):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_alerts_version_{name}
+            AFTER {event} ON alerts
+            BEGIN
+                UPDATE alert_state SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+# (版本, 說明, 升級函式)，只能在尾端新增，已發布的版本不可修改
+MIGRATIONS = [
+    (1, 'base tables', _create_base_tables),
+    (2, 'alert cooldown column', _add_alert_cooldown),
+    (3, 'query indexes', _add_query_indexes),
+    (4, 'price bar rollups', _add_price_bars),
+    (5, 'alert change counter', _add_alert_version),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """將資料庫升級到最新版本，已是最新版本時只讀取一次 user_version
+
+    版本記錄在 PRAGMA user_version，整個升級在 BEGIN IMMEDIATE 交易內進行，
+    多個程序同時啟動時只有一個會執行升級。
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # 取得寫入鎖後重新讀取，其他程序可能已完成升級
+        current = get_schema_version(conn)
+        cursor = conn.cursor()
+        for version, description, upgrade in MIGRATIONS:
+            if version <= current:
+                continue
+            logger.info(f"Applying schema migration {version}: {description}")
+            upgrade(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
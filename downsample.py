@@ -0,0 +1,62 @@
+"""
+依輸出像素寬度縮減圖表資料點
+
+多年日K或分鐘K有數千根，但圖上每個像素欄只看得到一條垂直線段。
+線條以 min/max 分桶保留每桶的最高與最低點（折線的外形與極值不變），
+長條以分桶彙總成一根，全部以 numpy 向量化計算。
+"""
+
+import numpy as np
+
+def bucket_size(n, buckets):
+    """n 個點分成最多 buckets 桶時每桶的點數"""
+    return max(1, -(-n // max(1, buckets)))
+
+def _rows(values, size, fill):
+    """補齊長度後 reshape 成每列一桶"""
+    rows = -(-len(values) // size)
+    padded = np.full(rows * size, fill, dtype=np.float64)
+    padded[:len(values)] = values
+    return padded.reshape(rows, size)
+
+def minmax_indices(y, buckets):
+    """每桶保留最小值與最大值的位置（含首尾點），回傳遞增的索引
+
+    全為 NaN 的桶保留一個 NaN 點，折線在該處照常斷開。
+    """
+    n = len(y)
+    size = bucket_size(n, buckets)
+    if size <= 2:
+        return np.arange(n)
+
+    rows = _rows(y, size, np.nan)
+    missing = np.isnan(rows)
+    low = np.where(missing, np.inf, rows).argmin(axis=1)
+    high = np.where(missing, -np.inf, rows).argmax(axis=1)
+    base = np.arange(len(rows)) * size
+    indices = np.unique(np.concatenate([base + low, base + high, [0, n - 1]]))
+    return indices[indices < n]
+
+def bucket_bounds(n, size):
+    """各桶第一個與最後一個點的索引"""
+    starts = np.arange(0, n, size)
+    ends = np.minimum(starts + size, n) - 1
+    return starts, ends
+
+def bucket_max(values, size):
+    """每桶的最大值（忽略 NaN）"""
+    return np.fmax.reduceat(values, bucket_bounds(len(values), size)[0])
+
+def bucket_min(values, size):
+    """每桶的最小值（忽略 NaN）"""
+    return np.fmin.reduceat(values, bucket_bounds(len(values), size)[0])
+
+def bucket_absmax(values, size):
+    """每桶絕對值最大的值（保留正負號，用於 MACD 柱狀圖）"""
+    rows = _rows(np.nan_to_num(values), size, 0.0)
+    return rows[np.arange(len(rows)), np.abs(rows).argmax(axis=1)]
+
+def bucket_centers(x, size):
+    """每桶的中心位置"""
+    starts, ends = bucket_bounds(len(x), size)
+    return (x[starts] + x[ends]) / 2
@@ -0,0 +1,118 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+class LatencyHistogram:
+    """HDR 風格的延遲直方圖
+
+    以 2 的次方分段、每段再細分 SUB_BUCKETS 格，記錄為 O(1)、記憶體固定，
+    任何量級的數值相對誤差都約在 1/SUB_BUCKETS 以內。數值單位為微秒。
+    """
+
+    SUB_BUCKETS = 32
+    MAX_EXPONENT = 40  # 約 12 天
+
+    def __init__(self):
+        self.counts = [0] * (self.MAX_EXPONENT * self.SUB_BUCKETS + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        if value < 1:
+            return 0
+        exponent = min(int(math.log2(value)), self.MAX_EXPONENT - 1)
+        sub = int((value / (1 << exponent) - 1) * self.SUB_BUCKETS)
+        return 1 + exponent * self.SUB_BUCKETS + min(sub, self.SUB_BUCKETS - 1)
+
+    def _bucket_value(self, bucket):
+        """格子的上界（微秒）"""
+        if bucket == 0:
+            return 1
+        exponent, sub = divmod(bucket - 1, self.SUB_BUCKETS)
+        return (1 << exponent) * (1 + (sub + 1) / self.SUB_BUCKETS)
+
+    def record(self, micros):
+        micros = max(0, int(micros))
+        self.counts[self._bucket(micros)] += 1
+        self.count += 1
+        self.total += micros
+        self.min = micros if self.min is None else min(self.min, micros)
+        self.max = micros if self.max is None else max(self.max, micros)
+
+    def percentile(self, p):
+        """第 p 百分位數（微秒）"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._bucket_value(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+class LatencyTracker:
+    """各階段延遲的直方圖集合（執行緒安全）"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, stage, seconds):
+        """記錄一次耗時（秒）"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(seconds * 1e6)
+
+    @contextmanager
+    def timer(self, stage):
+        """量測 with 區塊的耗時"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """各階段的統計數值（毫秒）"""
+        with self._lock:
+            stats = {}
+            for stage, histogram in self._histograms.items():
+                stats[stage] = {
+                    'count': histogram.count,
+                    'mean': histogram.mean / 1000,
+                    'p50': histogram.percentile(50) / 1000,
+                    'p90': histogram.percentile(90) / 1000,
+                    'p99': histogram.percentile(99) / 1000,
+                    'max': histogram.max / 1000
+                }
+            return stats
+
+    def dump(self, stages=None):
+        """產生延遲統計文字"""
+        stats = self.snapshot()
+        stages = stages or sorted(stats)
+        minutes = (time.time() - self.started_at) / 60
+        lines = [f"⏱️ 延遲統計（最近 {minutes:.0f} 分鐘，單位 ms）",
+                 f"{'stage':<14}{'n':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}"]
+        for stage in stages:
+            if stage not in stats:
+                continue
+            s = stats[stage]
+            lines.append(f"{stage:<14}{s['count']:>7}{s['p50']:>10.1f}{s['p90']:>10.1f}{s['p99']:>10.1f}{s['max']:>10.1f}")
+        return "\n".join(lines)
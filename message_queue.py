@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import RetryAfter, TimedOut, NetworkError
+from config import ALERT_SEND_RATE_GLOBAL, ALERT_SEND_RATE_PER_CHAT, ALERT_SEND_MAX_RETRIES
+
+class TokenBucket:
+    """令牌桶限流"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate  # 每秒補充的令牌數
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now=None):
+        """距離下一個令牌可用還需要幾秒"""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+class AlertDeliveryQueue:
+    """警報訊息發送佇列
+
+    警報評估只負責放入佇列，由背景執行緒依照 Telegram 的限制發送：
+    全域約每秒30則、同一聊天室每秒1則。同一用戶累積的多則警報會合併成
+    一則訊息，遇到 RetryAfter 會依照 Telegram 指定的秒數暫停後重送。
+    """
+
+    def __init__(self, bot, global_rate=ALERT_SEND_RATE_GLOBAL,
+                 per_chat_rate=ALERT_SEND_RATE_PER_CHAT, max_retries=ALERT_SEND_MAX_RETRIES, latency=None):
+        self.bot = bot
+        self.latency = latency  # LatencyTracker，記錄排隊、發送與端到端延遲
+        self.logger = logging.getLogger(__name__)
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._pending = OrderedDict()  # chat_id -> [(text, parse_mode, enqueued_at, origin_time)]
+        self._attempts = {}  # chat_id -> 連續失敗次數
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+        # 統計
+        self.sent_messages = 0
+        self.sent_alerts = 0
+        self.dropped_alerts = 0
+        self.retry_after_count = 0
+        self.last_delivery_lag = 0.0
+        self.max_delivery_lag = 0.0
+
+    def start(self):
+        """啟動發送執行緒"""
+        with self._condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        self._thread = threading.Thread(target=self._run, name="alert-delivery", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """停止發送執行緒，盡量送出剩餘訊息"""
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._pending and time.time() < deadline:
+                self._condition.wait(0.1)
+            self.is_running = False
+            self._condition.notify_all()
+
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def enqueue(self, chat_id, text, parse_mode='Markdown', origin_time=None):
+        """將警報訊息放入佇列
+        
+        origin_time: 觸發警報的報價時間 (epoch 秒)，用於計算端到端延遲
+        """
+        with self._condition:
+            self._pending.setdefault(chat_id, []).append((text, parse_mode, time.time(), origin_time))
+            self._condition.notify()
+
+    def get_stats(self):
+        """佇列深度與發送延遲"""
+        with self._condition:
+            depth = sum(len(items) for items in self._pending.values())
+            oldest = min((items[0][2] for items in self._pending.values()), default=None)
+
+        return {
+            'queue_depth': depth,
+            'pending_chats': len(self._pending),
+            'oldest_pending_age': time.time() - oldest if oldest else 0.0,
+            'sent_messages': self.sent_messages,
+            'sent_alerts': self.sent_alerts,
+            'dropped_alerts': self.dropped_alerts,
+            'retry_after_count': self.retry_after_count,
+            'last_delivery_lag': self.last_delivery_lag,
+            'max_delivery_lag': self.max_delivery_lag
+        }
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._prune_buckets()
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        return bucket
+
+    def _prune_buckets(self):
+        """移除已補滿且沒有待送訊息的聊天室令牌桶"""
+        now = time.monotonic()
+        idle = [chat_id for chat_id, bucket in self._chat_buckets.items()
+                if chat_id not in self._pending and bucket.wait_time(now) == 0]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _next_batch(self):
+        """挑出下一個可以發送的聊天室，回傳 (chat_id, items) 或等待秒數"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return None, self._paused_until - now
+
+        wait = self._global_bucket.wait_time(now)
+        if wait:
+            return None, wait
+
+        min_wait = None
+        for chat_id in self._pending:
+            bucket = self._chat_bucket(chat_id)
+            chat_wait = bucket.wait_time(now)
+            if chat_wait == 0:
+                items = self._take_mergeable(chat_id)
+                bucket.consume()
+                self._global_bucket.consume()
+                return (chat_id, items), 0
+            min_wait = chat_wait if min_wait is None else min(min_wait, chat_wait)
+
+        return None, min_wait
+
+    def _take_mergeable(self, chat_id):
+        """取出同一聊天室可合併成一則訊息的警報"""
+        items = self._pending[chat_id]
+        parse_mode = items[0][1]
+        taken = [items[0]]
+        length = len(items[0][0])
+
+        for item in items[1:]:
+            length += len(item[0]) + 2
+            if item[1] != parse_mode or length > MAX_MESSAGE_LENGTH:
+                break
+            taken.append(item)
+
+        remaining = items[len(taken):]
+        if remaining:
+            self._pending[chat_id] = remaining
+            self._pending.move_to_end(chat_id)
+        else:
+            del self._pending[chat_id]
+        return taken
+
+    def _requeue(self, chat_id, items):
+        """發送失敗時放回佇列前端"""
+        with self._condition:
+            self._pending[chat_id] = items + self._pending.get(chat_id, [])
+            self._pending.move_to_end(chat_id, last=False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self.is_running:
+                    batch, wait = self._next_batch() if self._pending else (None, None)
+                    if batch:
+                        break
+                    self._condition.wait(wait)
+
+                if not self.is_running:
+                    return
+
+            self._deliver(*batch)
+
+            with self._condition:
+                self._condition.notify_all()
+
+    def _deliver(self, chat_id, items):
+        text = "\n\n".join(item[0] for item in items)
+        send_started = time.time()
+
+        try:
+            self.bot.send_message(chat_id=chat_id, text=text, parse_mode=items[0][1])
+        except RetryAfter as e:
+            self.retry_after_count += 1
+            self.logger.warning(f"Flood control for chat {chat_id}, retry after {e.retry_after}s")
+            self._paused_until = time.monotonic() + float(e.retry_after)
+            self._requeue(chat_id, items)
+            return
+        except (TimedOut, NetworkError) as e:
+            attempts = self._attempts.get(chat_id, 0) + 1
+            if attempts <= self.max_retries:
+                self._attempts[chat_id] = attempts
+                self.logger.warning(f"Network error sending to {chat_id} ({attempts}/{self.max_retries}): {e}")
+                self._requeue(chat_id, items)
+                return
+            self._drop(chat_id, items, e)
+            return
+        except Exception as e:
+            self._drop(chat_id, items, e)
+            return
+
+        self._attempts.pop(chat_id, None)
+        sent_at = time.time()
+        if self.latency:
+            self.latency.record('send', sent_at - send_started)
+            for _, _, enqueued_at, origin_time in items:
+                self.latency.record('queue_wait', send_started - enqueued_at)
+                if origin_time:
+                    self.latency.record('end_to_end', sent_at - origin_time)
+
+        lag = sent_at - items[0][2]
+        self.sent_messages += 1
+        self.sent_alerts += len(items)
+        self.last_delivery_lag = lag
+        self.max_delivery_lag = max(self.max_delivery_lag, lag)
+        self.logger.info(f"Delivered {len(items)} alerts to {chat_id} (lag {lag:.2f}s)")
+
+    def _drop(self, chat_id, items, error):
+        self._attempts.pop(chat_id, None)
+        self.dropped_alerts += len(items)
+        self.logger.error(f"Error sending alert to {chat_id}: {error}")
@@ -0,0 +1,157 @@
+"""
+價格資料的 Parquet 欄式封存
+
+彙總後的K線（price_bars_1m/1h/1d）與 yfinance 取得的歷史資料依
+週期/股票/月份分檔存成 Parquet，長時間序列的分析（跨股票相關性、
+多年波動率）只讀取需要的欄位與月份，不經過 SQLite。
+
+目錄結構：{root}/{interval}/{symbol}/{YYYY-MM}.parquet
+時間欄位 timestamp 為不含時區的交易所/牆上時間，與 price_history 相同。
+由報價彙總的K線收盤價是最後一筆輪詢到的報價，區間以主機時間切分，
+與 yfinance 的正式K線不同，存放在 {interval}_rollup 下，不會覆蓋同一天的正式K線。
+
+需要選用套件 pyarrow（pip install pyarrow），未安裝時 available 為 False。
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+from config import PRICE_ARCHIVE_DIR, PRICE_ARCHIVE_LOOKBACK_DAYS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 選用套件
+    pa = pq = None
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def rollup_interval(interval):
+    """由報價彙總的K線在封存中的週期名稱"""
+    return f"{interval}_rollup"
+
+class PriceArchive:
+    """依週期/股票/月份分區的 Parquet 封存"""
+
+    def __init__(self, root=PRICE_ARCHIVE_DIR):
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def available(self):
+        return pq is not None
+
+    def _month_path(self, interval, symbol, month):
+        return os.path.join(self.root, interval, symbol.upper(), f"{month}.parquet")
+
+    def write(self, symbol, df, interval='1d'):
+        """寫入K線（與既有資料合併，同一時間以新資料為準），回傳寫入的月份數
+
+        df: 以時間為索引、含 Open/High/Low/Close/Volume 欄位的 DataFrame
+        """
+        if not self.available:
+            raise RuntimeError("pyarrow is required for the price archive")
+        if df is None or df.empty:
+            return 0
+
+        frame = df[[c for c in COLUMNS if c in df.columns]].copy()
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        frame.index = index.as_unit('us')
+        frame.index.name = 'timestamp'
+
+        months = 0
+        for month, part in frame.groupby(frame.index.strftime('%Y-%m')):
+            path = self._month_path(interval, symbol, month)
+            if os.path.exists(path):
+                existing = pq.read_table(path, memory_map=True).to_pandas()
+                part = pd.concat([existing, part])
+                part = part[~part.index.duplicated(keep='last')]
+            part = part.sort_index()
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先寫暫存檔再替換，讀取端不會看到寫到一半的檔案
+            tmp_path = f"{path}.tmp"
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=True), tmp_path)
+            os.replace(tmp_path, path)
+            months += 1
+
+        return months
+
+    def read(self, symbol, start=None, end=None, columns=None, interval='1d'):
+        """讀取 [start, end) 區間的K線，只讀取需要的欄位與月份檔案
+
+        回傳以 timestamp 為索引的 DataFrame，沒有資料時回傳 None
+        """
+        if not self.available:
+            return None
+
+        directory = os.path.join(self.root, interval, symbol.upper())
+        if not os.path.isdir(directory):
+            return None
+
+        first_month = start.strftime('%Y-%m') if start else None
+        last_month = end.strftime('%Y-%m') if end else None
+        paths = [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith('.parquet')
+            and (first_month is None or name[:7] >= first_month)
+            and (last_month is None or name[:7] <= last_month)
+        ]
+        if not paths:
+            return None
+
+        filters = []
+        if start:
+            filters.append(('timestamp', '>=', pd.Timestamp(start)))
+        if end:
+            filters.append(('timestamp', '<', pd.Timestamp(end)))
+        read_columns = None if columns is None else list(columns) + ['timestamp']
+
+        tables = [
+            pq.read_table(path, columns=read_columns, filters=filters or None, memory_map=True)
+            for path in paths
+        ]
+        df = pa.concat_tables(tables).to_pandas()
+        if df.empty:
+            return None
+        return df
+
+    def read_matrix(self, symbols, column='Close', start=None, end=None, interval='1d'):
+        """多檔股票的單一欄位對齊成寬表（欄為股票），供相關性等跨股票分析"""
+        series = {}
+        for symbol in symbols:
+            df = self.read(symbol, start, end, columns=[column], interval=interval)
+            if df is not None:
+                series[symbol.upper()] = df[column]
+        if not series:
+            return None
+        return pd.DataFrame(series).sort_index()
+
+    def symbols(self, interval='1d'):
+        directory = os.path.join(self.root, interval)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.listdir(directory))
+
+    def archive_price_bars(self, db, since=None):
+        """將 SQLite 中彙總後的K線匯出到封存（{interval}_rollup），回傳 {interval: 匯出的K線數}
+
+        預設匯出最近 PRICE_ARCHIVE_LOOKBACK_DAYS 天，需在K線依保留期限刪除前執行。
+        """
+        since = since or datetime.now() - timedelta(days=PRICE_ARCHIVE_LOOKBACK_DAYS)
+        exported = {}
+        for interval in ('1m', '1h', '1d'):
+            rows = db.get_price_bars_since(interval, since)
+            exported[interval] = len(rows)
+            if not rows:
+                continue
+
+            df = pd.DataFrame(rows, columns=['symbol', 'timestamp'] + COLUMNS)
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+            for symbol, part in df.groupby('symbol'):
+                self.write(symbol, part.set_index('timestamp').drop(columns=['symbol']), rollup_interval(interval))
+
+        return exported
@@ -0,0 +1,191 @@
+import logging
+import math
+import threading
+from collections import deque
+import numpy as np
+from config import ROLLING_WINDOW_SIZE
+
+class RunningStats:
+    """滑動視窗的 Welford 平均數與變異數，新增與移除皆為 O(1)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count = 0
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        self.count -= 1
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 -= delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """母體變異數"""
+        if self.count == 0:
+            return 0.0
+        return max(0.0, self.m2 / self.count)
+
+class RollingWindow:
+    """單一股票最近 N 筆報價的環狀緩衝區
+
+    同時維護報酬率與成交量的滑動統計，警報檢查不必再查詢資料庫。
+    """
+
+    def __init__(self, size=ROLLING_WINDOW_SIZE):
+        self.size = size
+        self.prices = deque(maxlen=size)
+        self.volumes = deque(maxlen=size)
+        self.returns = deque(maxlen=size - 1)
+        self.return_stats = RunningStats()
+        self.volume_stats = RunningStats()
+        self.last_timestamp = None
+
+    def __len__(self):
+        return len(self.prices)
+
+    def add(self, price, volume, timestamp=None):
+        """加入一筆報價，同一時間戳的重複報價會被略過"""
+        if timestamp is not None and timestamp == self.last_timestamp:
+            return False
+        self.last_timestamp = timestamp
+
+        if self.prices and self.prices[-1]:
+            if len(self.returns) == self.returns.maxlen:
+                self.return_stats.remove(self.returns[0])
+            ret = (price - self.prices[-1]) / self.prices[-1]
+            self.returns.append(ret)
+            self.return_stats.add(ret)
+
+        if len(self.volumes) == self.volumes.maxlen:
+            self.volume_stats.remove(self.volumes[0])
+        self.prices.append(price)
+        self.volumes.append(volume)
+        self.volume_stats.add(volume)
+        return True
+
+    @property
+    def last_price(self):
+        return self.prices[-1] if self.prices else None
+
+    @property
+    def previous_price(self):
+        return self.prices[-2] if len(self.prices) >= 2 else None
+
+    @property
+    def change_percent(self):
+        """最新一筆相對前一筆的漲跌幅 (%)"""
+        return self.returns[-1] * 100 if self.returns else None
+
+    @property
+    def volatility(self):
+        """視窗內報酬率的均方根 (%)"""
+        if not self.returns:
+            return None
+        stats = self.return_stats
+        return math.sqrt(stats.variance + stats.mean ** 2) * 100
+
+    @property
+    def volume_ratio(self):
+        """最新成交量相對先前平均成交量的倍數"""
+        count = self.volume_stats.count
+        if count < 2:
+            return None
+        previous_mean = (self.volume_stats.mean * count - self.volumes[-1]) / (count - 1)
+        if previous_mean <= 0:
+            return None
+        return self.volumes[-1] / previous_mean
+
+def _trailing_mean(values, length):
+    """每個位置往前（含自身）最多 length 筆的平均"""
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(0, end - length)
+    return (cumsum[end] - cumsum[start]) / (end - start)
+
+def rolling_metrics(prices, volumes, size=ROLLING_WINDOW_SIZE):
+    """以向量運算計算整段序列上每一點的 RollingWindow 數值（回測用）
+
+    回傳 dict：price、change_percent、volume_ratio、volatility，
+    與逐筆呼叫 RollingWindow.add 後讀取的屬性一致，資料不足處為 NaN。
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    n = len(prices)
+
+    change_percent = np.full(n, np.nan)
+    volatility = np.full(n, np.nan)
+    volume_ratio = np.full(n, np.nan)
+
+    if n >= 2:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = (prices[1:] - prices[:-1]) / prices[:-1]
+        change_percent[1:] = returns * 100
+        volatility[1:] = np.sqrt(_trailing_mean(returns ** 2, size - 1)) * 100
+
+        # 最新成交量相對視窗內先前 size-1 筆的平均
+        previous_mean = _trailing_mean(volumes[:-1], size - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_ratio[1:] = np.where(previous_mean > 0, volumes[1:] / previous_mean, np.nan)
+
+    return {
+        'price': prices,
+        'change_percent': change_percent,
+        'volume_ratio': volume_ratio,
+        'volatility': volatility
+    }
+
+class SymbolWindows:
+    """所有股票的滑動視窗，啟動時由 price_history 還原"""
+
+    def __init__(self, size=ROLLING_WINDOW_SIZE):
+        self.size = size
+        self.logger = logging.getLogger(__name__)
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """取得股票的滑動視窗（不存在時建立）"""
+        symbol = symbol.upper()
+        with self._lock:
+            window = self._windows.get(symbol)
+            if window is None:
+                window = self._windows[symbol] = RollingWindow(self.size)
+            return window
+
+    def add_quote(self, quote):
+        """加入一筆報價並回傳該股票的視窗"""
+        window = self.get(quote['symbol'])
+        with self._lock:
+            window.add(quote['price'], quote['volume'], quote.get('timestamp'))
+        return window
+
+    def hydrate(self, db, symbols):
+        """從 price_history 載入最近的報價"""
+        loaded = 0
+        for symbol in symbols:
+            try:
+                history = db.get_price_history(symbol, limit=self.size)
+            except Exception as e:
+                self.logger.error(f"Error loading price history for {symbol}: {e}")
+                continue
+
+            window = self.get(symbol)
+            with self._lock:
+                # get_price_history 由新到舊排序
+                for price, volume, change_percent, timestamp in reversed(history):
+                    window.add(price, volume or 0, timestamp)
+            loaded += len(history)
+
+        self.logger.info(f"Hydrated rolling windows for {len(symbols)} symbols ({loaded} ticks)")
@@ -5,14 +5,28 @@ import ta
 from datetime import datetime, timedelta
 import logging
 import time
+import math
 import random
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from config import *
 
+# yfinance period 對應的回溯天數，用於從封存讀取相同範圍
+PERIOD_DAYS = {'1d': 1, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653}
+
+def _period_start(period):
+    if period == 'ytd':
+        return datetime(datetime.now().year, 1, 1)
+    days = PERIOD_DAYS.get(period)
+    return datetime.now() - timedelta(days=days) if days else None
+
 class StockDataManager:
-    def __init__(self):
+    def __init__(self, tick_recorder=None, archive=None, correlation=None):
         self.logger = logging.getLogger(__name__)
+        self.tick_recorder = tick_recorder  # 記錄每筆新取得的報價到 price_history
+        self.archive = archive  # PriceArchive，歷史資料寫入 Parquet 封存並作為備援來源
+        self.correlation = correlation  # CorrelationEngine，新取得的日K線更新相關性
         self.last_request_time = 0
         self.min_request_interval = 10.0  # 增加最小請求間隔到10秒
         self.max_retries = 0  # 不重試，直接失敗讓 fallback 機制工作
@@ -22,6 +36,9 @@ class StockDataManager:
         self.cache = {}
         self.cache_duration = 600  # 增加快取時間到10分鐘
         
+        # 多檔歷史資料的批次下載（yf.download 使用全域狀態，同一時間只執行一個）
+        self._download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-download")
+        
         # 全局請求計數器
         self.request_count = 0
         self.max_requests_per_hour = 50  # 減少每小時最大請求數
@@ -63,6 +80,20 @@ class StockDataManager:
         self.last_request_time = time.time()
         self.request_count += 1
     
+    def available_requests(self):
+        """本小時還能用於批次下載的請求數
+
+        yfinance 每檔股票各算一個請求，用完每小時額度時下一個請求的執行緒
+        （可能是警報檢查）會睡到整點重設；保留警報輪詢在本小時剩餘時間的預算。
+        """
+        current_time = time.time()
+        if current_time > self.hourly_reset_time:
+            used, remaining_time = 0, 3600
+        else:
+            used, remaining_time = self.request_count, self.hourly_reset_time - current_time
+        reserve = math.ceil(ALERT_API_BUDGET_PER_HOUR * remaining_time / 3600)
+        return max(0, self.max_requests_per_hour - used - reserve)
+    
     def _get_cache_key(self, symbol, data_type, **kwargs):
         """生成快取鍵"""
         key_parts = [symbol, data_type]
@@ -70,11 +101,14 @@ class StockDataManager:
             key_parts.append(f"{k}_{v}")
         return "_".join(key_parts)
     
-    def _get_from_cache(self, cache_key):
+    def _get_from_cache(self, cache_key, max_age=None):
         """從快取取得資料"""
         if cache_key in self.cache:
             data, timestamp = self.cache[cache_key]
-            if time.time() - timestamp < self.cache_duration:
+            age = time.time() - timestamp
+            if age < self.cache_duration:
+                if max_age is not None and age >= max_age:
+                    return None  # 呼叫端需要更新的資料
                 return data
             else:
                 # 過期，移除
@@ -242,11 +276,14 @@ class StockDataManager:
             self.logger.error(f"Alpha Vantage Free error for {symbol}: {e}")
             return None
     
-    def get_current_price(self, symbol):
-        """取得即時股價 - 優先使用 Yahoo Finance，備用 Alpha Vantage"""
+    def get_current_price(self, symbol, max_age=None):
+        """取得即時股價 - 優先使用 Yahoo Finance，備用 Alpha Vantage
+        
+        max_age: 可接受的快取秒數，預設使用 cache_duration
+        """
         try:
             cache_key = self._get_cache_key(symbol, "price")
-            cached_data = self._get_from_cache(cache_key)
+            cached_data = self._get_from_cache(cache_key, max_age=max_age)
             if cached_data:
                 return cached_data
             
@@ -256,6 +293,7 @@ class StockDataManager:
             if result:
                 self.logger.info(f"✅ Successfully got price for {symbol} from {result['source']}")
                 self._set_cache(cache_key, result)
+                self._record_tick(result)
                 return result
             
             # 如果 Yahoo Finance 失敗，優先使用 Alpha Vantage
@@ -265,6 +303,7 @@ class StockDataManager:
             if result:
                 self.logger.info(f"✅ Successfully got price for {symbol} from {result['source']}")
                 self._set_cache(cache_key, result)
+                self._record_tick(result)
                 return result
             
             # 最後嘗試 IEX Cloud
@@ -274,6 +313,7 @@ class StockDataManager:
             if result:
                 self.logger.info(f"✅ Successfully got price for {symbol} from {result['source']}")
                 self._set_cache(cache_key, result)
+                self._record_tick(result)
                 return result
             
             self.logger.error(f"❌ All API sources failed for {symbol}")
@@ -283,6 +323,15 @@ class StockDataManager:
             self.logger.error(f"Error getting current price for {symbol}: {e}")
             return None
     
+    def _record_tick(self, quote):
+        """將新報價交給報價記錄器"""
+        if self.tick_recorder is None:
+            return
+        try:
+            self.tick_recorder.record(quote)
+        except Exception as e:
+            self.logger.error(f"Error recording tick for {quote.get('symbol')}: {e}")
+    
     def get_stock_info(self, symbol):
         """取得股票基本資訊"""
         try:
@@ -320,11 +369,11 @@ class StockDataManager:
             return None
     
     def get_historical_data(self, symbol, period='1mo', interval='1d'):
-        """取得歷史股價資料"""
+        """取得歷史股價資料（取得後寫入封存，取得失敗時改讀封存）"""
         try:
             cache_key = self._get_cache_key(symbol, "history", period=period, interval=interval)
             cached_data = self._get_from_cache(cache_key)
-            if cached_data:
+            if cached_data is not None:
                 return cached_data
             
             def _get_history():
@@ -335,15 +384,112 @@ class StockDataManager:
             hist = self._make_request_with_retry(_get_history)
             
             if hist is None or hist.empty:
-                return None
+                return self.get_archived_history(symbol, start=_period_start(period), interval=interval)
             
             self._set_cache(cache_key, hist)
+            self._archive_history(symbol, hist, interval)
+            self._track_correlation(symbol, hist, interval)
             return hist
             
         except Exception as e:
             self.logger.error(f"Error getting historical data for {symbol}: {e}")
             return None
     
+    def get_historical_data_batch(self, symbols, period='1mo', interval='1d', deadline=HISTORY_BATCH_DEADLINE, max_age=None,
+                                  budget=None):
+        """一次取得多檔股票的歷史資料，回傳 {symbol: DataFrame 或 None}
+        
+        快取命中的直接回傳，其餘以單一 yf.download 請求平行下載（只等待一次速率限制）。
+        超過 deadline 秒時改讀封存，下載完成後仍會寫入快取供下次使用。
+        只下載 available_requests() 允許的股票數（依 symbols 順序），其餘改讀封存。
+        max_age: 可接受的快取秒數，預設使用 cache_duration
+        budget: 這次最多使用的請求數（背景工作保留額度給用戶與警報）
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        results = {}
+        misses = []
+        for symbol in symbols:
+            cached_data = self._get_from_cache(self._get_cache_key(symbol, "history", period=period, interval=interval), max_age=max_age)
+            if cached_data is not None:
+                results[symbol] = cached_data
+            else:
+                misses.append(symbol)
+        
+        allowed = self.available_requests() if misses else 0
+        if budget is not None:
+            allowed = min(allowed, budget)
+        if len(misses) > allowed:
+            self.logger.warning(f"Request budget allows {allowed} of {len(misses)} history downloads, using archive for the rest")
+            misses = misses[:allowed]
+        
+        if misses:
+            future = self._download_executor.submit(self._download_histories, misses, period, interval)
+            try:
+                results.update(future.result(timeout=deadline))
+            except TimeoutError:
+                self.logger.warning(f"History download for {len(misses)} symbols exceeded {deadline}s, using archive")
+            except Exception as e:
+                self.logger.error(f"Error downloading history for {', '.join(misses)}: {e}")
+        
+        for symbol in symbols:
+            if results.get(symbol) is None:
+                results[symbol] = self.get_archived_history(symbol, start=_period_start(period), interval=interval)
+        return results
+    
+    def _download_histories(self, symbols, period, interval):
+        """以 yf.download 平行下載多檔股票並寫入快取與封存"""
+        self._rate_limit()
+        # yfinance 每檔各發一個請求，計入每小時的請求數
+        self.request_count += len(symbols) - 1
+        
+        data = yf.download(symbols, period=period, interval=interval, group_by='ticker',
+                           auto_adjust=True, threads=True, progress=False)
+        if data is None or data.empty:
+            return {}
+        
+        histories = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                hist = data[symbol]
+            else:
+                hist = data  # 只有一檔時欄位不分組
+            hist = hist.dropna(how='all')
+            if hist.empty:
+                continue
+            self._set_cache(self._get_cache_key(symbol, "history", period=period, interval=interval), hist)
+            self._archive_history(symbol, hist, interval)
+            self._track_correlation(symbol, hist, interval)
+            histories[symbol] = hist
+        return histories
+    
+    def _archive_history(self, symbol, hist, interval):
+        if not self.archive:
+            return
+        try:
+            self.archive.write(symbol, hist, interval)
+        except Exception as e:
+            self.logger.warning(f"Error archiving history for {symbol}: {e}")
+    
+    def _track_correlation(self, symbol, hist, interval):
+        if not self.correlation or interval != '1d':
+            return
+        try:
+            self.correlation.add_history(symbol, hist)
+        except Exception as e:
+            self.logger.warning(f"Error updating correlation for {symbol}: {e}")
+    
+    def get_archived_history(self, symbol, start=None, end=None, interval='1d', columns=None):
+        """從 Parquet 封存讀取歷史資料，欄位與 get_historical_data 相同"""
+        if not self.archive or not self.archive.available:
+            return None
+        try:
+            return self.archive.read(symbol, start=start, end=end, columns=columns, interval=interval)
+        except Exception as e:
+            self.logger.error(f"Error reading archived history for {symbol}: {e}")
+            return None
+    
     def calculate_technical_indicators(self, df):
         """計算技術指標"""
         if df is None or df.empty:
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# 模組位於專案根目錄（沒有套件），測試直接匯入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """每個測試使用暫存目錄內的獨立資料庫（路徑也是讀取快取 key 的一部分）"""
+    path = str(tmp_path / 'stock_bot.db')
+    monkeypatch.setattr(database, 'DATABASE_PATH', path)
+    return path
+
+@pytest.fixture
+def db(db_path):
+    db = database.Database()
+    yield db
+    db.close()
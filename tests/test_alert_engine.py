@@ -0,0 +1,79 @@
+import time
+import numpy as np
+from alert_engine import ALERT_TYPES, AlertIndex, AlertIndexCache
+
+def naive_hits(alerts, market):
+    """逐筆比較的參考實作"""
+    hits = set()
+    for user_id, symbol, alert_type, threshold in alerts:
+        price, change, volume_ratio, volatility = market[symbol]
+        value = {'price_high': price, 'price_low': price, 'price_change': change,
+                 'volume_spike': volume_ratio, 'volatility': volatility}[alert_type]
+        if value is None:
+            continue
+        if ((alert_type == 'price_low' and value <= threshold)
+                or (alert_type == 'price_change' and abs(value) >= threshold)
+                or (alert_type not in ('price_low', 'price_change') and value >= threshold)):
+            hits.add((alert_type, symbol, user_id, threshold, value))
+    return hits
+
+def test_evaluate_matches_per_alert_rules():
+    rng = np.random.default_rng(0)
+    symbols = [f'S{i}' for i in range(30)]
+    alerts = [(int(rng.integers(1, 50)), str(rng.choice(symbols)), str(rng.choice(ALERT_TYPES)),
+               float(rng.uniform(0.5, 150))) for _ in range(500)]
+    index = AlertIndex(alerts)
+
+    market = {}
+    snapshot = index.new_snapshot()
+    for i, symbol in enumerate(index.symbols):
+        if i % 7 == 0:
+            market[symbol] = (None, None, None, None)  # 本輪未輪詢
+            continue
+        # 部分股票的成交量與波動率資料不足
+        values = (float(rng.uniform(50, 150)), float(rng.normal(0, 5)),
+                  None if i % 5 == 0 else float(rng.uniform(0, 5)), None if i % 3 == 0 else float(rng.uniform(0, 10)))
+        market[symbol] = values
+        snapshot.set(i, *values)
+
+    triggered = index.evaluate(snapshot)
+    assert len(triggered) == len(set(triggered))
+    assert set(triggered) == naive_hits(alerts, market)
+    assert triggered
+
+def test_distance_to_trigger_uses_the_nearest_threshold():
+    index = AlertIndex([
+        (1, 'AAPL', 'price_high', 110.0),
+        (2, 'AAPL', 'price_low', 99.0),
+        (1, 'MSFT', 'price_change', 5.0),
+        (1, 'TSLA', 'volume_spike', 2.0),
+    ])
+    snapshot = index.new_snapshot()
+    snapshot.set(index.symbol_index['AAPL'], 100.0, 0.0)
+    snapshot.set(index.symbol_index['MSFT'], 300.0, -3.0)
+    snapshot.set(index.symbol_index['TSLA'], 200.0, 1.0, 1.0)
+
+    distance = dict(zip(index.symbols, index.distance_to_trigger(snapshot)))
+    assert distance['AAPL'] == 1.0
+    assert distance['MSFT'] == 2.0
+    assert distance['TSLA'] == np.inf
+
+def test_index_cache_rebuilds_only_when_alerts_change(db):
+    cache = AlertIndexCache()
+    db.add_alert(1, 'AAPL', 'price_high', 200)
+    first = cache.get(db)
+    assert cache.get(db) is first and cache.rebuilds == 1
+
+    db.start_alert_cooldown(1, 'AAPL', 'price_high', time.time())
+    assert len(cache.get(db)) == 0 and cache.rebuilds == 2
+
+    db.release_alert_cooldowns([(1, 'AAPL', 'price_high')], time.time() + 120)
+    assert len(cache.get(db)) == 1 and cache.rebuilds == 3
+    db.delete_alert(1, 'AAPL', 'price_high')
+    assert len(cache.get(db)) == 0 and cache.rebuilds == 4
+
+def test_index_cache_select_filters_alerts(db):
+    db.add_alert(1, 'AAPL', 'price_high', 200)
+    db.add_alert(2, 'MSFT', 'price_low', 300)
+    cache = AlertIndexCache(select=lambda alerts: [alert for alert in alerts if alert[1] == 'MSFT'])
+    assert cache.get(db).symbols == ['MSFT']
@@ -0,0 +1,39 @@
+import pytest
+from alert_polling import AdaptivePollingPlanner
+
+def make_planner(budget_per_hour=None):
+    return AdaptivePollingPlanner(min_interval=30, max_interval=600, near_pct=1.0, far_pct=10.0,
+                                  budget_per_hour=budget_per_hour)
+
+def test_interval_follows_distance_to_threshold():
+    planner = make_planner()
+    assert planner.update('NEAR', 0.5, now=0) == 30
+    assert planner.update('FAR', 25.0, now=0) == 600
+    assert planner.update('MID', 5.5, now=0) == pytest.approx(315)
+    assert planner.update('VOLUME', None, now=0) == pytest.approx(315)  # 沒有距離時取中間值
+    # 波動越大間隔越短，但不低於最短間隔
+    assert planner.update('MID', 5.5, volatility=3.0, now=0) == pytest.approx(157.5)
+    assert planner.update('NEAR', 0.5, volatility=30.0, now=0) == 30
+
+def test_due_symbols_are_ordered_and_pruned():
+    planner = make_planner()
+    planner.update('A', 25.0, now=0)   # 600 秒後
+    planner.update('B', 0.5, now=0)    # 30 秒後
+    assert planner.due_symbols(['A', 'B', 'NEW'], now=10) == ['NEW']
+    assert planner.due_symbols(['A', 'B'], now=700) == ['B', 'A']
+
+    # 已沒有警報的股票移除
+    assert planner.due_symbols(['B'], now=700) == ['B']
+    assert 'A' not in planner.next_due and 'A' not in planner.intervals
+
+    planner.defer('B', delay=5, now=700)
+    assert planner.due_symbols(['B'], now=704) == []
+    assert planner.due_symbols(['B'], now=705) == ['B']
+
+def test_intervals_stretch_when_over_budget():
+    planner = make_planner(budget_per_hour=120)
+    planner.update('A', 0.5, now=0)
+    assert planner.next_due['A'] == 30   # 120 次/小時，剛好在預算內
+    planner.update('B', 0.5, now=0)
+    assert planner.next_due['B'] == 60   # 240 次/小時，間隔放大兩倍
+    assert planner.intervals == {'A': 30, 'B': 30}
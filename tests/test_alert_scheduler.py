@@ -0,0 +1,53 @@
+import time
+from alert_scheduler import CooldownScheduler
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+def test_restores_cooldowns_and_releases_them(db):
+    db.add_alert(1, 'AAPL', 'price_high', 200)
+    db.add_alert(2, 'MSFT', 'price_low', 300)
+    db.start_alert_cooldown(1, 'AAPL', 'price_high', time.time() + 3600)
+    db.start_alert_cooldown(2, 'MSFT', 'price_low', time.time() + 3600)
+    assert db.get_active_alerts() == []
+
+    # 重新啟動後由資料庫還原冷卻中的警報（都還沒到期）
+    scheduler = CooldownScheduler(db)
+    scheduler.start()
+    try:
+        assert scheduler.pending_count() == 2
+
+        # 提前結束其中一個的冷卻
+        now = time.time()
+        db.start_alert_cooldown(1, 'AAPL', 'price_high', now)
+        scheduler.schedule(1, 'AAPL', 'price_high', now)
+        assert wait_for(lambda: db.get_active_alerts() == [(1, 'AAPL', 'price_high', 200)])
+        assert [row[:3] for row in db.get_alert_cooldowns()] == [(2, 'MSFT', 'price_low')]
+    finally:
+        scheduler.stop()
+
+def test_retries_when_release_fails(db):
+    db.add_alert(1, 'AAPL', 'price_high', 200)
+    db.start_alert_cooldown(1, 'AAPL', 'price_high', time.time())
+
+    failures = []
+    release = db.release_alert_cooldowns
+    def flaky_release(alert_keys, now):
+        if not failures:
+            failures.append(alert_keys)
+            raise RuntimeError('database is locked')
+        release(alert_keys, now)
+    db.release_alert_cooldowns = flaky_release
+
+    scheduler = CooldownScheduler(db, retry_delay=0.1)
+    scheduler.start()
+    try:
+        assert wait_for(lambda: db.get_active_alerts() == [(1, 'AAPL', 'price_high', 200)])
+        assert failures == [[(1, 'AAPL', 'price_high')]]
+    finally:
+        scheduler.stop()
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from PIL import Image
+from chart_engine import ChartEngine
+
+def correlation_matrix(n):
+    names = [f'S{i}' for i in range(n)]
+    return pd.DataFrame(np.random.default_rng(n).uniform(-1, 1, (n, n)), index=names, columns=names)
+
+def test_template_cache_evicts_least_recently_used():
+    engine = ChartEngine(max_templates=3)
+    for n in (2, 3, 4):
+        assert engine.render_heatmap_chart(correlation_matrix(n)) is not None
+    evicted = engine._templates[('heatmap', 2)]
+
+    assert engine.render_heatmap_chart(correlation_matrix(3)) is not None  # 3 成為最近使用
+    assert engine.render_heatmap_chart(correlation_matrix(5)) is not None
+    assert list(engine._templates) == [('heatmap', 4), ('heatmap', 3), ('heatmap', 5)]
+    assert not evicted.figure.axes
+
+    # 被釋放的股票數重新建立範本
+    assert engine.render_heatmap_chart(correlation_matrix(2)) is not None
+    assert len(engine._templates) == 3
+
+def test_profiles_set_figure_size():
+    engine = ChartEngine()
+    matrix = correlation_matrix(4)
+    sizes = {}
+    for profile in ('mobile', 'standard', 'mobile'):
+        chart = engine.render_heatmap_chart(matrix, profile)
+        sizes.setdefault(profile, set()).add(Image.open(chart).size)
+    # 同一個範本在不同設定檔間切換尺寸
+    assert sizes == {'mobile': {(800, 800)}, 'standard': {(1500, 1200)}}
+    assert len(engine._templates) == 1
@@ -0,0 +1,49 @@
+from datetime import datetime
+import pandas as pd
+import pytz
+from chart_prerender import ChartPrerenderer
+
+NOW = pytz.timezone('America/New_York').localize(datetime(2026, 10, 16, 16, 30))
+
+class FakeStockManager:
+    def __init__(self):
+        self.calls = []
+
+    def get_historical_data_batch(self, symbols, period='1mo', max_age=None, budget=None):
+        self.calls.append({'symbols': symbols, 'max_age': max_age, 'budget': budget})
+        index = pd.bdate_range(end=NOW.date(), periods=5)
+        # 超出請求額度的股票只有封存中前一天的資料
+        return {symbol: pd.DataFrame({'Close': range(5)}, index=index if i < budget else index - pd.offsets.BDay())
+                for i, symbol in enumerate(symbols)}
+
+class FakeChartGenerator:
+    def __init__(self):
+        self.stock_manager = FakeStockManager()
+        self.rendered = []
+
+    def generate_price_chart(self, symbol, period, profile):
+        self.rendered.append(('price', symbol))
+        return object()
+
+    def generate_technical_chart(self, symbol, period, profile):
+        self.rendered.append(('technical', symbol))
+        return object()
+
+class FakeDatabase:
+    def get_most_watched_symbols(self):
+        return [(f'S{i}', 100 - i) for i in range(6)] + [('2330.TW', 50)]
+
+    def get_watcher_chart_styles(self):
+        return [('mobile', 3)]
+
+def test_run_reuses_post_close_cache_and_skips_symbols_over_budget():
+    generator = FakeChartGenerator()
+    prerenderer = ChartPrerenderer(FakeDatabase(), generator, budget=2)
+    stats = prerenderer.run('US', now=NOW)
+
+    call, = generator.stock_manager.calls
+    assert call['symbols'] == [f'S{i}' for i in range(6)]
+    assert call['budget'] == 2
+    assert call['max_age'] == 1800  # 16:00 收盤後取得的快取可以沿用
+    assert stats == {'symbols': 6, 'ready': 2, 'charts': 4, 'failed': 0}
+    assert sorted({symbol for _, symbol in generator.rendered}) == ['S0', 'S1']
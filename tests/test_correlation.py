@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from correlation import CorrelationEngine
+
+WINDOW = 20
+MIN_PERIODS = 5
+
+def make_closes(days=40, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2026-01-05', periods=days + 3)
+    market = rng.normal(0, 0.01, len(index))
+    closes = pd.DataFrame({
+        symbol: 100 * np.exp(np.cumsum(market * beta + rng.normal(0, 0.01, len(index))))
+        for symbol, beta in (('AAA', 1.0), ('BBB', 0.5), ('CCC', -0.8), ('DDD', 1.5))
+    }, index=index)
+    closes.iloc[[7, 15, 30], 1] = np.nan  # 停牌的日子
+    closes.iloc[:25, 3] = np.nan          # 較晚上市
+    return closes
+
+def expected(closes):
+    """以 DataFrame.corr() 由收盤價重新計算視窗內的相關係數"""
+    returns = pd.DataFrame({symbol: closes[symbol].dropna().pct_change() for symbol in closes})
+    return returns.iloc[-WINDOW:].corr(min_periods=MIN_PERIODS)
+
+def load(engine, closes):
+    engine.add_histories({symbol: closes[[symbol]].rename(columns={symbol: 'Close'}) for symbol in closes})
+
+def assert_matches(engine, closes):
+    matrix = engine.matrix(list(closes.columns))
+    assert_frame_equal(matrix, expected(closes).rename_axis(None, axis=1), check_exact=False, atol=1e-9)
+
+def test_matches_dataframe_corr_after_add_revise_and_evict():
+    closes = make_closes()
+    engine = CorrelationEngine(window=WINDOW, min_periods=MIN_PERIODS)
+
+    load(engine, closes.iloc[:-3])
+    assert_matches(engine, closes.iloc[:-3])
+
+    # 修正視窗內某一天的收盤價（當天與下一天的報酬率都會改變）
+    revised = closes.iloc[:-3].copy()
+    revised.iloc[-8, 0] *= 1.05
+    engine.add_bar('AAA', revised.index[-8], revised.iloc[-8, 0])
+    assert_matches(engine, revised)
+
+    # 新的日子加入，最舊的日子移出視窗
+    revised = pd.concat([revised, closes.iloc[-3:]])
+    load(engine, revised.iloc[-3:])
+    assert_matches(engine, revised)
+
+def test_rollup_closes_never_override_vendor_closes():
+    closes = make_closes()
+    engine = CorrelationEngine(window=WINDOW, min_periods=MIN_PERIODS)
+    load(engine, closes.iloc[:-1])
+
+    # 已有正式收盤價的日子不被彙總的K線覆蓋
+    last_day = closes.index[-2]
+    engine.add_bars([('AAA', f'{last_day:%Y-%m-%d} 00:00:00', 0, 0, 0, 1.0, 0)])
+    assert_matches(engine, closes.iloc[:-1])
+
+    # 還沒有正式K線的日子先用彙總的收盤價，正式K線到達後取代
+    provisional = closes.copy()
+    provisional.iloc[-1] *= 1.01
+    day = closes.index[-1]
+    engine.add_bars([(symbol, f'{day:%Y-%m-%d} 00:00:00', 0, 0, 0, close, 0)
+                     for symbol, close in provisional.iloc[-1].dropna().items()])
+    assert_matches(engine, provisional)
+
+    load(engine, closes.iloc[-1:])
+    assert_matches(engine, closes)
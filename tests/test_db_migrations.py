@@ -0,0 +1,49 @@
+import sqlite3
+import database
+from db_migrations import SCHEMA_VERSION, get_schema_version
+
+def create_baseline(path):
+    """加入版本管理前的資料庫：user_version 為 0，alerts 沒有 cooldown_until"""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            symbol TEXT,
+            alert_type TEXT,
+            threshold REAL,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany('INSERT INTO alerts (user_id, symbol, alert_type, threshold, is_active) VALUES (?, ?, ?, ?, ?)', [
+        (1, 'AAPL', 'price_high', 200, 1),
+        (1, 'MSFT', 'price_low', 300, 0),  # 睡眠執行緒還沒恢復就重新啟動
+    ])
+    conn.commit()
+    conn.close()
+
+def test_upgrade_re_enables_alerts_stuck_by_old_cooldown_threads(db_path):
+    create_baseline(db_path)
+
+    db = database.Database()
+    try:
+        assert get_schema_version(db._get_connection()) == SCHEMA_VERSION
+        assert sorted(db.get_active_alerts()) == [(1, 'AAPL', 'price_high', 200), (1, 'MSFT', 'price_low', 300)]
+        assert db.get_alert_cooldowns() == []
+    finally:
+        db.close()
+
+def test_upgrade_keeps_alerts_in_cooldown(db):
+    db.add_alert(1, 'AAPL', 'price_high', 200)
+    db.start_alert_cooldown(1, 'AAPL', 'price_high', 2e9)
+    conn = db._get_connection()
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+
+    upgraded = database.Database()
+    try:
+        assert upgraded.get_active_alerts() == []
+        assert upgraded.get_alert_cooldowns() == [(1, 'AAPL', 'price_high', 2e9)]
+    finally:
+        upgraded.close()
@@ -0,0 +1,37 @@
+import numpy as np
+from downsample import bucket_size, bucket_bounds, bucket_centers, bucket_max, bucket_min, bucket_absmax, minmax_indices
+
+def test_minmax_keeps_each_bucket_extremes_and_endpoints():
+    y = np.random.default_rng(0).normal(0, 1, 10007).cumsum()
+    buckets = 500
+    indices = minmax_indices(y, buckets)
+
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert len(indices) <= 2 * buckets + 2
+    size = bucket_size(len(y), buckets)
+    for start in range(0, len(y), size):
+        bucket = y[start:start + size]
+        kept = y[indices[(indices >= start) & (indices < start + size)]]
+        assert kept.min() == bucket.min() and kept.max() == bucket.max()
+
+def test_short_series_are_not_reduced():
+    assert minmax_indices(np.arange(10.0), 10).tolist() == list(range(10))
+    assert minmax_indices(np.arange(20.0), 10).tolist() == list(range(20))  # 每桶兩點不必縮減
+
+def test_all_nan_bucket_keeps_a_gap():
+    y = np.arange(30.0)
+    y[10:20] = np.nan
+    indices = minmax_indices(y, 3)
+    assert np.isnan(y[indices]).sum() == 1
+    assert {0, 9, 20, 29} <= set(indices.tolist())
+
+def test_bucket_aggregates():
+    values = np.array([1.0, np.nan, 3.0, -5.0, 2.0, np.nan, 4.0])
+    assert bucket_size(len(values), 3) == 3
+    starts, ends = bucket_bounds(len(values), 3)
+    assert starts.tolist() == [0, 3, 6] and ends.tolist() == [2, 5, 6]
+    assert bucket_max(values, 3).tolist() == [3.0, 2.0, 4.0]
+    assert bucket_min(values, 3).tolist() == [1.0, -5.0, 4.0]
+    assert bucket_absmax(values, 3).tolist() == [3.0, -5.0, 4.0]
+    assert bucket_centers(np.arange(7.0), 3).tolist() == [1.0, 4.0, 6.0]
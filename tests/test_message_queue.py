@@ -0,0 +1,117 @@
+import time
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import RetryAfter, NetworkError
+from message_queue import AlertDeliveryQueue, TokenBucket
+
+class FakeBot:
+    """記錄送出的訊息；errors 依序在每次發送時拋出（None 表示成功）"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        self.sent.append((chat_id, text, parse_mode))
+
+def make_queue(bot, **kwargs):
+    # 速率極高，測試直接驅動 _next_batch 與 _deliver 幾乎不必等待
+    return AlertDeliveryQueue(bot, global_rate=1e9, per_chat_rate=1e9, **kwargs)
+
+def deliver_next(queue):
+    batch, wait = queue._next_batch()
+    while batch is None and wait is not None and wait < 0.01:
+        time.sleep(wait)
+        batch, wait = queue._next_batch()
+    assert batch, f'nothing deliverable, wait {wait}'
+    queue._deliver(*batch)
+    return batch
+
+def test_token_bucket_waits_for_the_next_token():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated_at
+    assert bucket.wait_time(now) == 0
+    bucket.consume()
+    assert bucket.wait_time(now) == 0.5
+    assert bucket.wait_time(now + 0.5) == 0
+
+def test_alerts_for_one_chat_are_merged_up_to_the_message_limit():
+    bot = FakeBot()
+    queue = make_queue(bot)
+    chunk = 'x' * 1500
+    for _ in range(3):
+        queue.enqueue(1, chunk)
+    queue.enqueue(1, 'plain', parse_mode=None)
+    queue.enqueue(2, 'other chat')
+
+    # 前兩則合併（1500 + 2 + 1500），第三則會超過 MAX_MESSAGE_LENGTH
+    chat_id, items = deliver_next(queue)
+    assert (chat_id, len(items)) == (1, 2)
+    assert len(bot.sent[0][1]) <= MAX_MESSAGE_LENGTH
+    # 處理過的聊天室移到最後，其他聊天室不會被搶先
+    assert deliver_next(queue)[0] == 2
+    # parse_mode 不同的訊息不合併
+    assert [len(items) for _, items in (deliver_next(queue), deliver_next(queue))] == [1, 1]
+    assert [text for _, text, _ in bot.sent[2:]] == [chunk, 'plain']
+    assert queue.sent_alerts == 5 and queue.sent_messages == 4
+
+def test_retry_after_pauses_all_chats_and_requeues_first():
+    bot = FakeBot([RetryAfter(5)])
+    queue = make_queue(bot)
+    queue.enqueue(1, 'first')
+    queue.enqueue(2, 'second')
+
+    deliver_next(queue)
+    assert bot.sent == []
+    assert queue.retry_after_count == 1
+    batch, wait = queue._next_batch()
+    assert batch is None and 4 < wait <= 5
+    assert list(queue._pending) == [1, 2]
+
+    queue._paused_until = 0.0  # 暫停結束
+    deliver_next(queue)
+    deliver_next(queue)
+    assert [text for _, text, _ in bot.sent] == ['first', 'second']
+
+def test_network_errors_are_retried_then_dropped():
+    bot = FakeBot([NetworkError('reset')] * 4 + [None])
+    queue = make_queue(bot, max_retries=3)
+    queue.enqueue(1, 'lost')
+
+    for _ in range(4):
+        deliver_next(queue)
+    assert queue.dropped_alerts == 1
+    assert queue._pending == {} and queue._attempts == {}
+
+    # 丟棄後同一聊天室的新警報照常發送
+    queue.enqueue(1, 'delivered')
+    deliver_next(queue)
+    assert [text for _, text, _ in bot.sent] == ['delivered']
+
+def test_network_error_counter_resets_after_success():
+    bot = FakeBot([NetworkError('reset')] * 3 + [None, NetworkError('reset'), None])
+    queue = make_queue(bot, max_retries=3)
+    queue.enqueue(1, 'a')
+    for _ in range(4):
+        deliver_next(queue)
+    queue.enqueue(1, 'b')
+    deliver_next(queue)
+    deliver_next(queue)
+    assert [text for _, text, _ in bot.sent] == ['a', 'b']
+    assert queue.dropped_alerts == 0
+
+def test_background_thread_delivers_and_stop_drains():
+    bot = FakeBot()
+    queue = AlertDeliveryQueue(bot)
+    queue.start()
+    try:
+        queue.enqueue(1, 'one')
+        queue.enqueue(1, 'two')
+        queue.enqueue(2, 'three')
+    finally:
+        queue.stop(timeout=5)
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) in ([1, 2], [1, 1, 2])
+    assert queue.sent_alerts == 3
+    assert queue.get_stats()['queue_depth'] == 0
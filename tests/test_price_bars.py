@@ -0,0 +1,45 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+
+START = datetime(2026, 1, 5, 9, 0, 0)
+RESOLUTIONS = (60, 300, 3600, 14400, 86400)
+
+@pytest.fixture
+def ticks(db):
+    """約九天、兩萬筆不規則間隔的報價，回傳最後一筆的時間"""
+    rng = random.Random(1)
+    price = 100.0
+    rows = []
+    for i in range(20000):
+        timestamp = START + timedelta(seconds=i * 37 + rng.randint(0, 30))
+        price += rng.gauss(0, 0.1)
+        rows.append(('AAPL', price, 1000 + i, 0.0, timestamp.strftime('%Y-%m-%d %H:%M:%S')))
+    conn = db._get_connection()
+    conn.executemany('''
+        INSERT INTO price_history (symbol, price, volume, change_percent, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    return datetime.strptime(rows[-1][4], '%Y-%m-%d %H:%M:%S')
+
+def bars(db, end):
+    return {resolution: db.get_price_bars('AAPL', START, end, resolution) for resolution in RESOLUTIONS}
+
+def test_bars_unchanged_by_compaction(db, ticks):
+    end = ticks + timedelta(seconds=1)
+    before = bars(db, end)
+    assert all(before.values())
+
+    db.compact_price_history(now=ticks + timedelta(minutes=30))
+    assert bars(db, end) == before
+
+def test_coarse_bars_unchanged_after_finer_levels_pruned(db, ticks):
+    end = ticks + timedelta(seconds=1)
+    before = bars(db, end)
+
+    # 超過報價與1分鐘K線的保留期限，只剩1小時K線以上
+    db.compact_price_history(now=ticks + timedelta(days=40))
+    assert db._get_connection().execute('SELECT COUNT(*) FROM price_history').fetchone()[0] == 0
+    for resolution in (3600, 14400, 86400):
+        assert db.get_price_bars('AAPL', START, end, resolution) == before[resolution]
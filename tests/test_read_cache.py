@@ -0,0 +1,49 @@
+import database
+from database import ReadThroughCache
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ReadThroughCache(max_entries=2)
+    loads = []
+    def loader(value):
+        return lambda: loads.append(value) or value
+
+    cache.get_or_load('a', loader(1))
+    cache.get_or_load('b', loader(2))
+    cache.get_or_load('a', loader(None))  # 命中，a 成為最近使用
+    cache.get_or_load('c', loader(3))
+    assert cache.get_or_load('a', loader(None)) == 1
+    assert cache.get_or_load('b', loader(4)) == 4
+    assert loads == [1, 2, 3, 4]
+    assert (cache.hits, cache.misses) == (2, 4)
+
+def test_value_loaded_across_an_invalidation_is_not_cached():
+    cache = ReadThroughCache(max_entries=10)
+    def stale_load():
+        cache.invalidate('key')  # 查詢期間另一個執行緒寫入
+        return 'stale'
+
+    assert cache.get_or_load('key', stale_load) == 'stale'
+    assert cache.get_or_load('key', lambda: 'fresh') == 'fresh'
+    assert cache.get_or_load('key', lambda: 'unused') == 'fresh'
+
+def test_writes_invalidate_cached_reads(db):
+    assert db.get_user_watchlist(1) == []
+    db.add_stock_to_watchlist(1, 'aapl', 'Apple')
+    assert [row[0] for row in db.get_user_watchlist(1)] == ['AAPL']
+
+    db.add_alert(1, 'AAPL', 'price_high', 200)
+    assert db.get_user_alerts(1) == [('AAPL', 'price_high', 200.0, 1)]
+    db.start_alert_cooldown(1, 'AAPL', 'price_high', 2e9)
+    assert db.get_user_alerts(1) == [('AAPL', 'price_high', 200.0, 0)]
+
+    assert db.get_user(1) is None
+
+    # 同一資料庫的其他 Database 實例寫入也會失效
+    other = database.Database()
+    try:
+        other.remove_stock_from_watchlist(1, 'AAPL')
+        other.update_investment_personality(1, '長線投資者')
+    finally:
+        other.close()
+    assert db.get_user_watchlist(1) == []
+    assert db.get_user(1)[4] == '長線投資者'
@@ -0,0 +1,47 @@
+import time
+import pandas as pd
+import pytest
+from config import ALERT_API_BUDGET_PER_HOUR
+from stock_data import StockDataManager
+
+@pytest.fixture
+def manager(monkeypatch):
+    manager = StockDataManager()
+    manager.downloads = []
+    def download(symbols, period, interval):
+        manager.downloads.append(list(symbols))
+        manager.request_count += len(symbols)
+        index = pd.bdate_range(end='2026-10-16', periods=5)
+        histories = {symbol: pd.DataFrame({'Close': range(5)}, index=index) for symbol in symbols}
+        for symbol, hist in histories.items():
+            manager._set_cache(manager._get_cache_key(symbol, "history", period=period, interval=interval), hist)
+        return histories
+    monkeypatch.setattr(manager, '_download_histories', download)
+    monkeypatch.setattr(manager, 'get_archived_history', lambda symbol, **kwargs: None)
+    return manager
+
+def test_available_requests_reserves_the_alert_budget(manager):
+    manager.hourly_reset_time = time.time() + 3600
+    assert manager.available_requests() == manager.max_requests_per_hour - ALERT_API_BUDGET_PER_HOUR
+
+    # 整點前 15 分鐘只需保留四分之一的警報預算
+    manager.request_count = 5
+    manager.hourly_reset_time = time.time() + 900
+    assert manager.available_requests() == manager.max_requests_per_hour - 5 - ALERT_API_BUDGET_PER_HOUR // 4
+
+    manager.request_count = manager.max_requests_per_hour
+    assert manager.available_requests() == 0
+
+def test_batch_download_stays_within_the_request_budget(manager):
+    symbols = [f'S{i}' for i in range(40)]
+    allowed = manager.available_requests()
+    histories = manager.get_historical_data_batch(symbols, period='3mo')
+
+    assert manager.downloads == [symbols[:allowed]]
+    assert [symbol for symbol, df in histories.items() if df is not None] == symbols[:allowed]
+    assert manager.request_count < manager.max_requests_per_hour
+
+    # 額度用完後只讀快取與封存，不再下載
+    histories = manager.get_historical_data_batch(symbols, period='3mo')
+    assert len(manager.downloads) == 1
+    assert sum(df is not None for df in histories.values()) == allowed
@@ -0,0 +1,55 @@
+import time
+from datetime import datetime
+from tick_recorder import TickRecorder
+
+def quote(price, volume, second=0, symbol='aapl'):
+    return {'symbol': symbol, 'price': price, 'volume': volume, 'change_percent': 0.5,
+            'timestamp': datetime(2026, 10, 16, 10, 0, second)}
+
+def test_repeated_quotes_are_skipped(db):
+    recorder = TickRecorder(db)
+    recorder.record(quote(100.0, 10, 0))
+    recorder.record(quote(100.0, 10, 1))  # 價格與成交量都沒變
+    recorder.record(quote(100.5, 10, 2))
+    recorder.record(quote(100.5, 20, 3))
+    recorder.flush()
+
+    assert recorder.skipped_count == 1 and recorder.recorded_count == 3
+    assert db.get_price_history('AAPL') == [
+        (100.5, 20, 0.5, '2026-10-16 10:00:03'),
+        (100.5, 10, 0.5, '2026-10-16 10:00:02'),
+        (100.0, 10, 0.5, '2026-10-16 10:00:00'),
+    ]
+
+def test_background_thread_flushes_when_batch_is_full(db):
+    recorder = TickRecorder(db, flush_size=3, flush_interval=3600)
+    recorder.start()
+    try:
+        for second in range(3):
+            recorder.record(quote(100.0 + second, 10, second))
+        deadline = time.time() + 5
+        while recorder.recorded_count < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert recorder.recorded_count == 3
+
+        # 未滿一批的報價在停止時寫入
+        recorder.record(quote(200.0, 10, 4))
+    finally:
+        recorder.stop()
+    assert len(db.get_price_history('AAPL')) == 4
+
+def test_failed_flush_keeps_ticks_in_order(db, monkeypatch):
+    recorder = TickRecorder(db)
+    recorder.record(quote(100.0, 10, 0))
+
+    save = db.save_price_data_batch
+    def fail_once(rows):
+        monkeypatch.setattr(db, 'save_price_data_batch', save)
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(db, 'save_price_data_batch', fail_once)
+    recorder.flush()
+    recorder.record(quote(101.0, 10, 1))
+    assert [row[1] for row in recorder._pending] == [100.0, 101.0]
+
+    recorder.flush()
+    assert [row[0] for row in db.get_price_history('AAPL')] == [101.0, 100.0]
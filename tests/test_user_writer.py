@@ -0,0 +1,58 @@
+import pytest
+from user_writer import UserWriteBehind
+
+@pytest.fixture
+def writer(db, monkeypatch):
+    writer = UserWriteBehind(db)
+    writer.batches = []
+    save = db.save_user_writes
+    def record(writes):
+        writer.batches.append({user_id: dict(entry, preferences=dict(entry['preferences'])) for user_id, entry in writes.items()})
+        save(writes)
+    monkeypatch.setattr(db, 'save_user_writes', record)
+    return writer
+
+def test_writes_for_one_user_are_coalesced(db, writer):
+    writer.upsert_user(1, 'old', 'Ann', 'Lee')
+    writer.update_preferences(1, chart_style='mobile')
+    writer.upsert_user(1, 'new', 'Ann', 'Lee')
+    writer.update_preferences(1, timezone='UTC')
+    writer.touch(2)  # 尚未 /start 的用戶沒有資料列，只更新 updated_at 不會新增
+    writer.flush()
+
+    batch, = writer.batches
+    assert set(batch) == {1, 2}
+    assert batch[1]['profile'] == ('new', 'Ann', 'Lee')
+    assert batch[1]['preferences'] == {'chart_style': 'mobile', 'timezone': 'UTC'}
+    assert db.get_user(1)[1] == 'new'
+    assert db.get_user_preferences(1)[2:] == ('mobile', 'UTC')
+    assert db.get_user(2) is None
+
+    writer.flush()  # 沒有待寫入的資料時不寫入
+    assert len(writer.batches) == 1
+
+def test_failed_flush_is_requeued_and_merged_with_newer_writes(db, writer, monkeypatch):
+    writer.upsert_user(1, 'first', 'Ann', 'Lee')
+    writer.update_preferences(1, chart_style='mobile', timezone='UTC')
+    first_touch = writer._pending[1]['updated_at']
+
+    save = db.save_user_writes
+    def fail_once(writes):
+        monkeypatch.setattr(db, 'save_user_writes', save)
+        # 寫入失敗前，處理命令的執行緒又排入比較新的資料
+        writer.upsert_user(1, 'second', 'Ann', 'Lee')
+        writer.update_preferences(1, chart_style='hi-res')
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(db, 'save_user_writes', fail_once)
+    writer.flush()
+    assert db.get_user(1) is None
+
+    entry = writer._pending[1]
+    assert entry['profile'] == ('second', 'Ann', 'Lee')
+    assert entry['preferences'] == {'chart_style': 'hi-res', 'timezone': 'UTC'}
+    assert entry['updated_at'] >= first_touch
+
+    writer.flush()
+    assert db.get_user(1)[1] == 'second'
+    assert db.get_user_preferences(1)[2:] == ('hi-res', 'UTC')
+    assert writer._pending == {}
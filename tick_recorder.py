@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from config import TICK_FLUSH_SIZE, TICK_FLUSH_INTERVAL
+
+class TickRecorder:
+    """報價記錄器
+
+    StockDataManager 取得的每筆報價先放進記憶體佇列，由背景執行緒在累積到
+    一定數量或超過時間間隔時以 executemany 一次寫入 price_history，
+    寫入成本不會落在使用者請求的路徑上。
+    """
+
+    def __init__(self, db, flush_size=TICK_FLUSH_SIZE, flush_interval=TICK_FLUSH_INTERVAL):
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._pending = []
+        self._last_tick = {}  # symbol -> (price, volume)，用於略過重複報價
+        self._condition = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+        # 統計
+        self.recorded_count = 0
+        self.skipped_count = 0
+
+    def start(self):
+        """啟動背景寫入執行緒"""
+        with self._condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        self._thread = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止並寫入剩餘的報價"""
+        with self._condition:
+            self.is_running = False
+            self._condition.notify()
+
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+        self.flush()
+
+    def record(self, quote):
+        """記錄一筆報價（不阻塞呼叫端）"""
+        symbol = quote['symbol'].upper()
+        tick = (quote['price'], quote['volume'])
+
+        with self._condition:
+            # 價格與成交量都沒變就不重複寫入
+            if self._last_tick.get(symbol) == tick:
+                self.skipped_count += 1
+                return
+            self._last_tick[symbol] = tick
+
+            timestamp = quote.get('timestamp')
+            self._pending.append((
+                symbol,
+                quote['price'],
+                quote['volume'],
+                quote.get('change_percent'),
+                timestamp.isoformat(sep=' ') if timestamp else None
+            ))
+
+            if len(self._pending) >= self.flush_size:
+                self._condition.notify()
+
+    def flush(self):
+        """立即寫入佇列中的報價"""
+        with self._condition:
+            rows, self._pending = self._pending, []
+
+        if not rows:
+            return
+
+        try:
+            self.db.save_price_data_batch(rows)
+            self.recorded_count += len(rows)
+        except Exception as e:
+            self.logger.error(f"Error flushing {len(rows)} ticks: {e}")
+            # 放回佇列等下次寫入
+            with self._condition:
+                self._pending = rows + self._pending
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.time() + self.flush_interval
+                while self.is_running and len(self._pending) < self.flush_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                if not self.is_running:
+                    return
+
+            self.flush()
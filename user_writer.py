@@ -0,0 +1,109 @@
+import logging
+import threading
+from datetime import datetime
+from config import USER_WRITE_FLUSH_INTERVAL
+
+# 可經由寫入佇列更新的偏好設定欄位
+PREFERENCE_FIELDS = ('update_frequency', 'alert_enabled', 'chart_style', 'timezone')
+
+class UserWriteBehind:
+    """用戶資料的延遲寫入佇列
+
+    /start 的用戶資料、偏好設定與 updated_at 這類低優先度的寫入先在記憶體中
+    依用戶合併（同一用戶多次寫入只保留最新值），由背景執行緒定期以單一交易
+    寫入，處理命令的執行緒不必等待 commit。停止時會寫入剩餘資料。
+    """
+
+    def __init__(self, db, flush_interval=USER_WRITE_FLUSH_INTERVAL):
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self.flush_interval = flush_interval
+
+        self._pending = {}  # user_id -> {'profile', 'preferences', 'updated_at'}
+        self._condition = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+        # 統計
+        self.queued_count = 0
+        self.written_count = 0
+
+    def start(self):
+        """啟動背景寫入執行緒"""
+        with self._condition:
+            if self.is_running:
+                return
+            self.is_running = True
+
+        self._thread = threading.Thread(target=self._run, name="user-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止並寫入剩餘的資料"""
+        with self._condition:
+            self.is_running = False
+            self._condition.notify()
+
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+        self.flush()
+
+    def _entry(self, user_id):
+        self.queued_count += 1
+        return self._pending.setdefault(user_id, {'profile': None, 'preferences': {}, 'updated_at': None})
+
+    def upsert_user(self, user_id, username=None, first_name=None, last_name=None):
+        """新增或更新用戶基本資料（保留 created_at 與投資人格）"""
+        with self._condition:
+            entry = self._entry(user_id)
+            entry['profile'] = (username, first_name, last_name)
+            entry['updated_at'] = datetime.now()
+
+    def update_preferences(self, user_id, **preferences):
+        """更新偏好設定，例如 update_preferences(user_id, chart_style='candle')"""
+        unknown = set(preferences) - set(PREFERENCE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown preference fields: {', '.join(sorted(unknown))}")
+
+        with self._condition:
+            self._entry(user_id)['preferences'].update(preferences)
+
+    def touch(self, user_id):
+        """更新用戶的 updated_at"""
+        with self._condition:
+            self._entry(user_id)['updated_at'] = datetime.now()
+
+    def flush(self):
+        """立即寫入佇列中的資料"""
+        with self._condition:
+            writes, self._pending = self._pending, {}
+
+        if not writes:
+            return
+
+        try:
+            self.db.save_user_writes(writes)
+            self.written_count += len(writes)
+        except Exception as e:
+            self.logger.error(f"Error flushing writes for {len(writes)} users: {e}")
+            # 放回佇列，期間新進的寫入比較新，合併時優先
+            with self._condition:
+                for user_id, entry in writes.items():
+                    newer = self._pending.get(user_id)
+                    if newer:
+                        entry['profile'] = newer['profile'] or entry['profile']
+                        entry['preferences'].update(newer['preferences'])
+                        entry['updated_at'] = newer['updated_at'] or entry['updated_at']
+                    self._pending[user_id] = entry
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self.is_running:
+                    self._condition.wait(self.flush_interval)
+                if not self.is_running:
+                    return
+
+            self.flush()